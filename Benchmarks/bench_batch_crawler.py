@@ -0,0 +1,32 @@
+"""
+批量爬虫吞吐量压测：启动本地替身服务器，用模拟基金代码离线测试 Batch_Get_Fund_History_Data
+python Benchmarks/bench_batch_crawler.py [基金数量] [每秒请求数(0为不限速)] [服务器延迟秒]
+"""
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Scrapy_Data.batch_crawler import Batch_Get_Fund_History_Data
+from Scrapy_Data.local_eastmoney_server import start_local_server
+
+
+def bench_batch_crawler(num_funds=200, requests_per_second=None, max_workers=16, per=20, latency=0.0):
+    server, base_url = start_local_server(start_date='2021-01-04', end_date='2025-12-31', latency=latency)
+    fund_codes = ['%06d' % (100000 + i) for i in range(num_funds)]
+    try:
+        with tempfile.TemporaryDirectory() as output_dir:
+            result = Batch_Get_Fund_History_Data(fund_codes, '1999-02-01', '2025-12-31', output_dir, per=per,
+                                                 max_workers=max_workers, requests_per_second=requests_per_second,
+                                                 base_url=base_url)
+    finally:
+        server.shutdown()
+    print(f"基金数: {num_funds}, 页数: {result['pages']}, 耗时: {result['elapsed']:.2f}s")
+    print(f"吞吐量: {result['pages'] / result['elapsed']:.1f} 页/秒, {num_funds / result['elapsed']:.2f} 只基金/秒")
+    return result
+
+
+if __name__ == '__main__':
+    num_funds = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rps = float(sys.argv[2]) if len(sys.argv) > 2 and float(sys.argv[2]) > 0 else None
+    latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    bench_batch_crawler(num_funds, rps, latency=latency)
@@ -0,0 +1,61 @@
+"""
+窗口数据集的加载速度：逐个样本 __getitem__ + 默认拼接、__getitems__ 一次取出整个批次、
+序列常驻设备的 DeviceWindowLoader（在设备上按下标 gather，没有CUDA时在CPU上）
+python Benchmarks/bench_dataloader.py [批次大小,批次大小,...] [交易日数] [加载进程数]
+默认约20年（5000个交易日）、32个特征、context_length=60、prediction_length=10，报告每秒样本数
+"""
+import os
+import sys
+import time
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utlis.FundTimeSeriesDataset import DeviceWindowLoader, FundTimeSeriesDataset, create_window_loader, \
+    valid_window_starts
+
+
+class PerSampleDataset(FundTimeSeriesDataset):
+    """去掉 __getitems__，DataLoader 逐个样本取出"""
+    __getitems__ = None
+
+
+def synthetic_series(days=5000, num_features=32, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.standard_normal((days, num_features)).astype(np.float32), \
+        rng.standard_normal(days).astype(np.float32)
+
+
+def samples_per_second(loader, epochs=2):
+    samples = 0
+    start = time.perf_counter()
+    for _ in range(epochs):
+        for batch in loader:
+            samples += len(batch['past_values'])
+    return samples / (time.perf_counter() - start)
+
+
+def bench_dataloader(batch_sizes=(32, 64, 128, 256, 512, 1024), days=5000, num_workers=0,
+                     context_length=60, prediction_length=10):
+    features, targets = synthetic_series(days)
+    starts = valid_window_starts(features, targets, context_length, prediction_length)
+    results = []
+    print(f"交易日数: {days}, 窗口数: {len(starts)}, 加载进程数: {num_workers}")
+    for batch_size in batch_sizes:
+        speeds = {}
+        for name, dataset_class in (('逐个样本', PerSampleDataset), ('整批取出', FundTimeSeriesDataset)):
+            dataset = dataset_class(features, targets, context_length=context_length,
+                                    prediction_length=prediction_length, window_starts=starts)
+            loader = create_window_loader(dataset, batch_size=batch_size, shuffle=True, num_workers=num_workers)
+            speeds[name] = samples_per_second(loader)
+        speeds['常驻设备'] = samples_per_second(DeviceWindowLoader(dataset, batch_size=batch_size, shuffle=True))
+        print(f"  batch_size={batch_size}: 逐个样本 {speeds['逐个样本']:,.0f} 样本/秒，"
+              f"整批取出 {speeds['整批取出']:,.0f} 样本/秒，常驻设备 {speeds['常驻设备']:,.0f} 样本/秒，"
+              f"加速比 {speeds['整批取出'] / speeds['逐个样本']:.1f}x / {speeds['常驻设备'] / speeds['逐个样本']:.1f}x")
+        results.append((batch_size, speeds['逐个样本'], speeds['整批取出'], speeds['常驻设备']))
+    return results
+
+
+if __name__ == '__main__':
+    sizes = tuple(int(n) for n in sys.argv[1].split(',')) if len(sys.argv) > 1 else (32, 64, 128, 256, 512, 1024)
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    bench_dataloader(sizes, days, workers)
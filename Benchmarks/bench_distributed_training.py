@@ -0,0 +1,72 @@
+"""
+FlowState CPU 训练：单进程与 N 个数据并行进程（gloo）的每 epoch 耗时和结果差异
+python Benchmarks/bench_distributed_training.py [进程数,进程数,...] [epoch数] [批大小]
+单进程使用全部核心的 intra-op 线程；N 个进程时每个进程绑定 1/N 的核心。
+报告每种设置的平均 epoch 耗时，以及训练/验证损失与单进程的最大差异（应在浮点误差内）。
+默认使用约 4 年的合成净值和缩小的模型（上下文 128、预测 32）。
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+import torch
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Model'))
+from Model.train_model import FlowStateForPrediction, build_config, train_distributed, train_model
+from utlis.FundTimeSeriesDataset import process_fund_data_for_flowstate
+
+
+def synthetic_fund(days=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({'净值日期': pd.bdate_range('2020-01-01', periods=days),
+                         '单位净值': np.cumprod(1 + rng.normal(0.0003, 0.012, days))})
+
+
+def small_config():
+    config = build_config(context_length=128, prediction_length=32)
+    config.embedding_feature_dim = 32
+    config.encoder_state_dim = 32
+    config.encoder_num_layers = 2
+    config.encoder_num_hippo_blocks = 2
+    config.decoder_dim = 16
+    config.decoder_patch_len = 32
+    return config
+
+
+def bench_distributed_training(worker_counts=(1, 2, 4), epochs=2, batch_size=64):
+    df = synthetic_fund()
+    config = small_config()
+    torch.manual_seed(0)
+    initial_state = FlowStateForPrediction(config).state_dict()
+    print(f"CPU 核心数: {len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()}, "
+          f"epoch 数: {epochs}, 批大小: {batch_size}")
+    reference, results = None, []
+    for workers in worker_counts:
+        model = FlowStateForPrediction(config)
+        model.load_state_dict(initial_state)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            if workers == 1:
+                data = process_fund_data_for_flowstate(df, config, batch_size=batch_size, device='cpu')
+                losses = train_model(model, data['train_loader'], data['test_loader'], epochs=epochs,
+                                     config=config, device=torch.device('cpu'))
+            else:
+                losses = train_distributed(model, df, workers, batch_size=batch_size, epochs=epochs, config=config)
+        epoch_time = (time.perf_counter() - start) / epochs
+        reference = reference or losses
+        diff = max(np.abs(np.array(losses[0]) - reference[0]).max(), np.abs(np.array(losses[1]) - reference[1]).max())
+        # 多进程的耗时包含启动进程和构建窗口
+        print(f"  {workers} 个进程: 每 epoch {epoch_time:.2f}s，相对单进程加速 "
+              f"{results[0][1] / epoch_time if results else 1.0:.2f}x，损失最大差异 {diff:.2e}")
+        results.append((workers, epoch_time, diff))
+    return results
+
+
+if __name__ == '__main__':
+    counts = tuple(int(n) for n in sys.argv[1].split(',')) if len(sys.argv) > 1 else (1, 2, 4)
+    epochs = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    batch_size = int(sys.argv[3]) if len(sys.argv) > 3 else 64
+    bench_distributed_training(counts, epochs, batch_size)
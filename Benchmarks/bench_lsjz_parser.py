@@ -0,0 +1,70 @@
+"""
+lsjz 页面解析速度对比：BeautifulSoup逐单元格解析(parse_page_records + records_to_dataframe)
+与 lsjz_parser 的正则按列解析
+python Benchmarks/bench_lsjz_parser.py [页面目录(*.html)|页数]
+不指定页面目录时用本地替身服务器的模拟净值生成页面
+"""
+import glob
+import os
+import sys
+import time
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Scrapy_Data.get_funds_history_data import parse_heads, parse_page_records, records_to_dataframe
+from Scrapy_Data.local_eastmoney_server import FundHistorySource
+from Scrapy_Data.lsjz_parser import parse_lsjz_columns, concat_lsjz_columns, lsjz_columns_to_dataframe
+
+
+def generate_pages(num_pages=3000, per=20):
+    """按基金生成连续的页面，每只基金 100 页左右"""
+    source = FundHistorySource(start_date='2017-01-02', end_date='2025-12-31')
+    pages, code = [], 100000
+    while len(pages) < num_pages:
+        for page in range(1, 101):
+            pages.append(source.page(str(code), page, per=per))
+            if len(pages) == num_pages:
+                break
+        code += 1
+    return pages
+
+
+def load_pages(page_dir):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(page_dir, '**', '*.html'), recursive=True)):
+        with open(path, 'r', encoding='utf-8') as f:
+            pages.append(f.read())
+    return pages
+
+
+def bench_lsjz_parser(pages):
+    heads = parse_heads(pages[0])
+    start = time.perf_counter()
+    records = [row for html in pages for row in parse_page_records(html)]
+    old_df = records_to_dataframe(heads, records)
+    old_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    new_df = lsjz_columns_to_dataframe(concat_lsjz_columns(parse_lsjz_columns(html) for html in pages))
+    new_time = time.perf_counter() - start
+
+    # 结果一致性检查（多只基金的日期会重复，先按日期和净值排序再比较）
+    assert len(old_df) == len(new_df)
+    old_df = old_df.sort_values(['净值日期', '单位净值', '日增长率']).reset_index(drop=True)
+    new_df = new_df.sort_values(['净值日期', '单位净值', '日增长率']).reset_index(drop=True)
+    assert (old_df['净值日期'].values == new_df['净值日期'].values).all()
+    assert np.allclose(old_df['单位净值'].values, new_df['单位净值'].values)
+    assert np.allclose(old_df['日增长率'].values, new_df['日增长率'].values, equal_nan=True)
+
+    print(f"页数: {len(pages)}, 行数: {len(new_df)}")
+    print(f"BeautifulSoup: {old_time:.3f}s ({old_time / len(pages) * 1000:.3f} ms/页)")
+    print(f"lsjz_parser:   {new_time:.3f}s ({new_time / len(pages) * 1000:.3f} ms/页)")
+    print(f"加速比: {old_time / new_time:.1f}x")
+    return old_time, new_time
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and os.path.isdir(sys.argv[1]):
+        pages = load_pages(sys.argv[1])
+    else:
+        pages = generate_pages(int(sys.argv[1]) if len(sys.argv) > 1 else 3000)
+    bench_lsjz_parser(pages)
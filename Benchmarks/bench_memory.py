@@ -0,0 +1,181 @@
+"""
+单只基金特征计算的内存对比：仓库原来的实现、当前的默认模式与 low_memory 模式（float32 特征块 + int8 状态列，不复制中间DataFrame）
+python Benchmarks/bench_memory.py [交易日数,交易日数,...]
+每种模式在一个新的子进程里处理一只基金，报告处理过程中峰值RSS的增量（减去读入数据后的峰值）和结果DataFrame的大小；
+默认约20年（5000个交易日）和放大的 50000 行（让峰值高于解释器本身的内存波动）
+“原始实现”为仓库最初的 create_fund_features 的冻结副本（逐行循环的 Price_Rank / 最大回撤，50000 行时较慢），
+输入与其它模式相同（当前 load_and_clean_data 的结果）；“默认”为当前注册表驱动的默认路径
+"""
+import contextlib
+import io
+import multiprocessing
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# None 表示原始实现
+MODES = {
+    '原始实现': None,
+    '默认': {},
+    'low_memory': {'low_memory': True},
+    'low_memory + fused_rolling': {'low_memory': True, 'fused_rolling': True},
+}
+
+
+def peak_rss_mb():
+    """当前进程的峰值RSS（MB）"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 单位为KB，macOS 为字节
+        return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 1024 / 1024
+
+
+def original_create_fund_features(df_data):
+    """仓库最初的 FundDataProcessor.create_fund_features（冻结的副本，只去掉了打印），返回 (df, feature_columns)"""
+    import numpy as np
+    import pandas as pd
+    df = df_data.copy()
+
+    df['MA_5'] = df['单位净值'].rolling(window=5).mean()
+    df['MA_10'] = df['单位净值'].rolling(window=10).mean()
+    df['MA_20'] = df['单位净值'].rolling(window=20).mean()
+    df['MA_30'] = df['单位净值'].rolling(window=30).mean()
+    df['Volatility_5'] = df['日增长率'].rolling(window=5).std()
+    df['Volatility_20'] = df['日增长率'].rolling(window=20).std()
+
+    df['Momentum_5'] = (df['单位净值'] / df['单位净值'].shift(5) - 1).fillna(0)
+    df['Momentum_10'] = (df['单位净值'] / df['单位净值'].shift(10) - 1).fillna(0)
+
+    def calculate_rsi(prices, window=14):
+        delta = prices.diff()
+        gain = (delta.where(delta > 0, 0)).rolling(window=window).mean()
+        loss = (-delta.where(delta < 0, 0)).rolling(window=window).mean()
+        rs = gain / loss
+        rsi = 100 - (100 / (1 + rs))
+        return rsi.fillna(50)
+
+    df['RSI_14'] = calculate_rsi(df['单位净值'])
+
+    df['BB_Middle'] = df['单位净值'].rolling(window=20).mean()
+    bb_std = df['单位净值'].rolling(window=20).std()
+    df['BB_Upper'] = df['BB_Middle'] + 2 * bb_std
+    df['BB_Lower'] = df['BB_Middle'] - 2 * bb_std
+    bb_range = df['BB_Upper'] - df['BB_Lower']
+    df['BB_Position'] = (df['单位净值'] - df['BB_Lower']) / bb_range.where(bb_range != 0, 1)
+
+    def calculate_price_rank(series, window=20):
+        ranks = []
+        for i in range(len(series)):
+            if i < window - 1:
+                ranks.append(0.5)
+            else:
+                window_data = series.iloc[i - window + 1:i + 1]
+                min_val = window_data.min()
+                max_val = window_data.max()
+                current_val = series.iloc[i]
+                if max_val != min_val:
+                    rank = (current_val - min_val) / (max_val - min_val)
+                else:
+                    rank = 0.5
+                ranks.append(rank)
+        return pd.Series(ranks, index=series.index)
+
+    df['Price_Rank_20'] = calculate_price_rank(df['单位净值'], window=20)
+
+    df['day_of_week'] = df['净值日期'].dt.dayofweek
+    df['month'] = df['净值日期'].dt.month
+    df['quarter'] = df['净值日期'].dt.quarter
+    df['is_month_end'] = df['净值日期'].dt.is_month_end.astype(int)
+    df['is_quarter_end'] = df['净值日期'].dt.is_quarter_end.astype(int)
+
+    df['trading_status'] = df['申购状态'] + df['赎回状态']
+
+    rolling_mean = df['日增长率'].abs().rolling(20).mean()
+    rolling_std = df['日增长率'].abs().rolling(20).std()
+    df['abnormal_move'] = ((df['日增长率'].abs() > rolling_mean + 2 * rolling_std) |
+                           (df['日增长率'].abs() > 5)).astype(int)
+
+    df['return_1d'] = df['日增长率'] / 100
+    df['return_5d'] = df['return_1d'].rolling(5).sum()
+    df['return_20d'] = df['return_1d'].rolling(20).sum()
+
+    df['volatility_5d'] = df['return_1d'].rolling(5).std()
+    df['volatility_20d'] = df['return_1d'].rolling(20).std()
+
+    def calculate_max_drawdown(series, window=20):
+        drawdowns = []
+        for i in range(len(series)):
+            if i < window - 1:
+                drawdowns.append(0)
+            else:
+                window_data = series.iloc[i - window + 1:i + 1]
+                peak = window_data.expanding().max()
+                drawdown = (window_data - peak) / peak
+                drawdowns.append(drawdown.min())
+        return pd.Series(drawdowns, index=series.index)
+
+    df['max_drawdown_20'] = calculate_max_drawdown(df['单位净值'], window=20)
+
+    df = df.ffill().bfill()
+    feature_columns = [
+        '单位净值', '累计净值', '日增长率', '申购状态', '赎回状态', '分红送配',
+        'MA_5', 'MA_10', 'MA_20', 'MA_30', 'Volatility_5', 'Volatility_20', 'Momentum_5', 'Momentum_10',
+        'RSI_14', 'BB_Middle', 'BB_Upper', 'BB_Lower', 'BB_Position',
+        'Price_Rank_20', 'trading_status', 'abnormal_move',
+        'return_1d', 'return_5d', 'return_20d', 'volatility_5d', 'volatility_20d',
+        'max_drawdown_20'
+    ]
+
+    dates = df['净值日期']
+    time_features = pd.DataFrame(index=dates.index)
+    time_features['day_sin'] = np.sin(2 * np.pi * dates.dt.dayofweek / 6)
+    time_features['day_cos'] = np.cos(2 * np.pi * dates.dt.dayofweek / 6)
+    time_features['month_sin'] = np.sin(2 * np.pi * dates.dt.month / 12)
+    time_features['month_cos'] = np.cos(2 * np.pi * dates.dt.month / 12)
+    df = pd.concat([df, time_features], axis=1)
+    feature_columns.extend(time_features.columns.tolist())
+    return df, feature_columns
+
+
+def _create_features(raw_df, options):
+    from utlis.FundDataProcessor import FundDataProcessor
+    with contextlib.redirect_stdout(io.StringIO()):
+        processor = FundDataProcessor(raw_df, None, **(options or {}))
+        df = processor.load_and_clean_data()
+        if options is None:
+            return original_create_fund_features(df)
+        return processor.create_fund_features(df)
+
+
+def measure(days, options):
+    """在子进程中运行：返回 (峰值RSS增量MB, 结果DataFrame大小MB)；options 为 None 时运行原始实现"""
+    from Benchmarks.bench_panel_features import CODE_COLUMN, synthetic_universe
+    raw_df = synthetic_universe(1, days).drop(columns=[CODE_COLUMN])
+    # 先做一次小规模的计算，让导入和首次调用分配的内存不计入峰值
+    _create_features(raw_df.head(100), options)
+    baseline = peak_rss_mb()
+    df, _ = _create_features(raw_df, options)
+    return peak_rss_mb() - baseline, df.memory_usage(deep=True).sum() / 1024 / 1024
+
+
+def bench_memory(day_counts=(5000, 50000)):
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for days in day_counts:
+        print(f"交易日数: {days}")
+        for mode, options in MODES.items():
+            # 每次一个新进程，峰值RSS互不影响
+            with context.Pool(1) as pool:
+                peak, frame_size = pool.apply(measure, (days, options))
+            print(f"  {mode}: 峰值RSS增量 {peak:.1f}MB，结果 {frame_size:.2f}MB")
+            results.append((days, mode, peak, frame_size))
+    return results
+
+
+if __name__ == '__main__':
+    counts = tuple(int(n) for n in sys.argv[1].split(',')) if len(sys.argv) > 1 else (5000, 50000)
+    bench_memory(counts)
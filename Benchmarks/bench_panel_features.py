@@ -0,0 +1,76 @@
+"""
+多基金特征计算速度对比：逐只基金调用 FundDataProcessor 与 PanelFeatures 的面板计算
+python Benchmarks/bench_panel_features.py [基金数,基金数,...] [每只基金的交易日数] [逐只循环实测的基金数]
+默认 1000 和 10000 只基金、每只约2年（500个交易日，部分基金成立较晚）；
+逐只循环只实测前若干只基金再按基金数线性推算，避免10000只时跑太久
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utlis.FundDataProcessor import FundDataProcessor
+from utlis.PanelFeatures import CODE_COLUMN, process_panel
+
+
+def synthetic_universe(num_funds, days=500, seed=0):
+    """生成 num_funds 只基金的原始数据长表，约1/4的基金历史较短"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end='2025-12-31', periods=days)
+    lengths = np.where(rng.random(num_funds) < 0.25, rng.integers(40, days, num_funds), days)
+    growth = np.round(rng.normal(0.03, 1.2, (days, num_funds)), 2)
+    nav = np.round(np.cumprod(1 + growth / 100, axis=0), 4)
+    keep = np.arange(days)[:, None] >= (days - lengths)[None, :]
+    fund_index, day_index = np.nonzero(keep.T)
+    df = pd.DataFrame({
+        CODE_COLUMN: np.char.zfill(fund_index.astype(str), 6),
+        '净值日期': dates.values[day_index],
+        '单位净值': nav.T[keep.T],
+        '累计净值': nav.T[keep.T],
+        '日增长率': growth.T[keep.T],
+        '申购状态': np.int8(1),
+        '赎回状态': np.int8(1),
+        '分红送配': np.int8(0),
+    })
+    return df
+
+
+def run_loop(long_df, codes):
+    with contextlib.redirect_stdout(io.StringIO()):
+        for code, group in long_df[long_df[CODE_COLUMN].isin(codes)].groupby(CODE_COLUMN, sort=False):
+            processor = FundDataProcessor(group.drop(columns=[CODE_COLUMN]), None)
+            processor.create_fund_features(processor.load_and_clean_data())
+
+
+def bench_panel_features(fund_counts=(1000, 10000), days=500, loop_sample=300):
+    results = []
+    for num_funds in fund_counts:
+        long_df = synthetic_universe(num_funds, days)
+        codes = long_df[CODE_COLUMN].unique()
+        print(f"基金数: {num_funds}, 行数: {len(long_df)}")
+
+        sample = codes[:min(loop_sample, len(codes))]
+        start = time.perf_counter()
+        run_loop(long_df, sample)
+        loop_time = (time.perf_counter() - start) * len(codes) / len(sample)
+
+        start = time.perf_counter()
+        process_panel(long_df)
+        panel_time = time.perf_counter() - start
+
+        note = '' if len(sample) == len(codes) else f'（按 {len(sample)} 只实测推算）'
+        print(f"  逐只循环: {loop_time:.2f}s{note}")
+        print(f"  面板计算: {panel_time:.2f}s")
+        print(f"  加速比: {loop_time / panel_time:.1f}x")
+        results.append((num_funds, loop_time, panel_time))
+    return results
+
+
+if __name__ == '__main__':
+    counts = tuple(int(n) for n in sys.argv[1].split(',')) if len(sys.argv) > 1 else (1000, 10000)
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    loop_sample = int(sys.argv[3]) if len(sys.argv) > 3 else 300
+    bench_panel_features(counts, days, loop_sample)
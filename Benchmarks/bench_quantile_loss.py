@@ -0,0 +1,85 @@
+"""
+分位数损失的速度对比：train_model 原来逐个分位数循环的 quantile_loss 与 QuantileMetrics.pinball_loss 的一次广播计算
+python Benchmarks/bench_quantile_loss.py [批次大小,批次大小,...] [预测长度] [重复次数]
+默认9个分位数、预测长度96（与 train_model 的配置相同），计时包括反向传播。对比两个循环版本：
+- 原始循环：仓库最初的实现，targets.unsqueeze(1) 与 [B, H] 的预测广播成 [B, B, H]，损失的定义不同，只比较耗时
+- 修正后的循环：去掉 unsqueeze(1)（训练代码中的修正早于 pinball_loss），与 pinball_loss 的定义相同，检查损失和梯度一致
+"""
+import os
+import sys
+import time
+import torch
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utlis.QuantileMetrics import pinball_loss
+
+QUANTILES = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9]
+# 原始循环的中间张量为 [B, B, H]，更大的批次只计时另外两种
+ORIGINAL_MAX_BATCH = 256
+
+
+def original_loop_quantile_loss(predictions, targets, quantiles):
+    """仓库最初的实现（原样保留）：targets.unsqueeze(1) 使每个分位数的误差为 [B, B, H]"""
+    predictions = predictions.squeeze(-1)
+    losses = []
+    for i, q in enumerate(quantiles):
+        error = targets.unsqueeze(1) - predictions[:, i, :]
+        loss = torch.max((q - 1) * error, q * error)
+        losses.append(loss.mean())
+    return torch.stack(losses).mean()
+
+
+def loop_quantile_loss(predictions, targets, quantiles):
+    """修正广播后的循环：predictions squeeze 成 (batch, quantiles, horizon)，逐个分位数计算"""
+    predictions = predictions.squeeze(-1)
+    losses = []
+    for i, q in enumerate(quantiles):
+        error = targets - predictions[:, i, :]
+        loss = torch.max((q - 1) * error, q * error)
+        losses.append(loss.mean())
+    return torch.stack(losses).mean()
+
+
+def time_loss(loss_fn, predictions, targets, quantiles, repeat):
+    for _ in range(3):
+        loss_fn(predictions, targets, quantiles).backward()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        predictions.grad = None
+        loss_fn(predictions, targets, quantiles).backward()
+    return (time.perf_counter() - start) / repeat
+
+
+def bench_quantile_loss(batch_sizes=(32, 256, 1024), horizon=96, repeat=200):
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    quantiles = torch.tensor(QUANTILES, device=device)
+    results = []
+    print(f"分位数: {len(QUANTILES)}, 预测长度: {horizon}, 设备: {device}")
+    for batch_size in batch_sizes:
+        predictions = torch.randn(batch_size, len(QUANTILES), horizon, 1, device=device, requires_grad=True)
+        targets = torch.randn(batch_size, horizon, device=device)
+
+        loop_loss = loop_quantile_loss(predictions, targets, QUANTILES)
+        loop_grad, = torch.autograd.grad(loop_loss, predictions)
+        loss = pinball_loss(predictions, targets, quantiles)
+        grad, = torch.autograd.grad(loss, predictions)
+        loss_error = abs(loss.item() - loop_loss.item())
+        grad_error = (grad - loop_grad).abs().max().item()
+
+        original_time = None
+        if batch_size <= ORIGINAL_MAX_BATCH:
+            original_time = time_loss(original_loop_quantile_loss, predictions, targets, QUANTILES, repeat)
+        loop_time = time_loss(loop_quantile_loss, predictions, targets, QUANTILES, repeat)
+        fused_time = time_loss(pinball_loss, predictions, targets, quantiles, repeat)
+        original = (f"原始循环 {original_time * 1e3:.3f}ms（加速比 {original_time / fused_time:.1f}x），"
+                    if original_time is not None else "原始循环 跳过（[B, B, H] 过大），")
+        print(f"  batch_size={batch_size}: {original}修正后的循环 {loop_time * 1e3:.3f}ms，广播 {fused_time * 1e3:.3f}ms，"
+              f"加速比 {loop_time / fused_time:.1f}x，与修正后的循环的损失差 {loss_error:.1e}，梯度差 {grad_error:.1e}")
+        results.append((batch_size, original_time, loop_time, fused_time))
+    return results
+
+
+if __name__ == '__main__':
+    sizes = tuple(int(n) for n in sys.argv[1].split(',')) if len(sys.argv) > 1 else (32, 256, 1024)
+    horizon = int(sys.argv[2]) if len(sys.argv) > 2 else 96
+    repeat = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    bench_quantile_loss(sizes, horizon, repeat)
@@ -0,0 +1,80 @@
+"""
+Price_Rank / max_drawdown 计算速度对比：原来的逐行 iloc 循环与 RollingKernels 的O(n)向量化计算
+python Benchmarks/bench_rolling_kernels.py [年数] [窗口,窗口,...]
+默认用20年（约5000个交易日）的模拟净值，窗口 20,60,120,250
+"""
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Scrapy_Data.fund_schema import normalize_fund_frame
+from Scrapy_Data.local_eastmoney_server import synthetic_history
+from utlis.RollingKernels import price_rank, max_drawdown
+
+
+def loop_price_rank(series, window=20):
+    """原 create_fund_features 中的逐行实现"""
+    ranks = []
+    for i in range(len(series)):
+        if i < window - 1:
+            ranks.append(0.5)
+        else:
+            window_data = series.iloc[i - window + 1:i + 1]
+            min_val = window_data.min()
+            max_val = window_data.max()
+            current_val = series.iloc[i]
+            if max_val != min_val:
+                rank = (current_val - min_val) / (max_val - min_val)
+            else:
+                rank = 0.5
+            ranks.append(rank)
+    return pd.Series(ranks, index=series.index)
+
+
+def loop_max_drawdown(series, window=20):
+    """原 create_fund_features 中的逐行实现"""
+    drawdowns = []
+    for i in range(len(series)):
+        if i < window - 1:
+            drawdowns.append(0)
+        else:
+            window_data = series.iloc[i - window + 1:i + 1]
+            peak = window_data.expanding().max()
+            drawdown = (window_data - peak) / peak
+            drawdowns.append(drawdown.min())
+    return pd.Series(drawdowns, index=series.index)
+
+
+def bench_rolling_kernels(years=20, windows=(20, 60, 120, 250)):
+    end_date = pd.Timestamp('2025-12-31')
+    start_date = end_date - pd.DateOffset(years=years)
+    df = normalize_fund_frame(synthetic_history('000001', start_date.strftime('%Y-%m-%d'), '2025-12-31'))
+    series = df['单位净值']
+    print(f"序列长度: {len(series)} 行（{years} 年）")
+
+    results = []
+    for window in windows:
+        start = time.perf_counter()
+        old_rank = loop_price_rank(series, window)
+        old_drawdown = loop_max_drawdown(series, window)
+        old_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        new_rank = price_rank(series.values, window)
+        new_drawdown = max_drawdown(series.values, window)
+        new_time = time.perf_counter() - start
+
+        assert np.allclose(old_rank.values, new_rank, atol=1e-12)
+        assert np.allclose(old_drawdown.values, new_drawdown, atol=1e-12)
+        print(f"窗口 {window:>4}: 逐行循环 {old_time:.3f}s, 向量化 {new_time * 1000:.2f}ms, "
+              f"加速比 {old_time / new_time:.0f}x")
+        results.append((window, old_time, new_time))
+    return results
+
+
+if __name__ == '__main__':
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    windows = tuple(int(w) for w in sys.argv[2].split(',')) if len(sys.argv) > 2 else (20, 60, 120, 250)
+    bench_rolling_kernels(years, windows)
@@ -3,8 +3,12 @@ import pandas as pd
 import plotly.graph_objects as go
 from utlis.Get_Lately_Data import Get_Lately_Data
 
-def show_MA(data_path,Lately_time):
-    df = Get_Lately_Data(data_path,Lately_time)
+# 均线图只需要读取这几列
+MA_COLUMNS = ['净值日期', '单位净值', 'MA_5', 'MA_10', 'MA_20', 'MA_30']
+
+def show_MA(data_path,Lately_time,code=None):
+    # data_path 为 MultiFundStore 时需要指定基金代码，只读取时间范围内的数据
+    df = Get_Lately_Data(data_path,Lately_time,columns=MA_COLUMNS,code=code)
     df['净值日期'] = pd.to_datetime(df['净值日期'])
     fig2 = go.Figure()
     fig2.add_trace(go.Scatter(
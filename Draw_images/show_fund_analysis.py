@@ -7,12 +7,26 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from utlis.FundDataProcessor import FundDataProcessor
+from utlis.FeatureRegistry import ensure_features
+
+# 每种分析需要从基金数据中读取的列（列投影）
+ANALYSIS_COLUMNS = {
+    "移动平均线": ['净值日期', '单位净值', 'MA_5', 'MA_10', 'MA_20', 'MA_30'],
+    "布林带分析": ['净值日期', '单位净值', 'BB_Upper', 'BB_Lower', 'BB_Middle', 'BB_Position'],
+    "RSI指标": ['净值日期', '单位净值', 'RSI_14'],
+    "波动率分析": ['净值日期', '单位净值', 'Volatility_20', 'volatility_20d'],
+    "动量分析": ['净值日期', '单位净值', 'Momentum_5', 'Momentum_10'],
+    "综合技术分析": ['净值日期', '单位净值', 'MA_5', 'MA_10', 'MA_20', 'MA_30', 'BB_Upper', 'BB_Lower', 'BB_Middle',
+                'RSI_14', 'Momentum_10'],
+}
 
 def show_fund_analysis(df,analysis_type="移动平均线",detail=None):
     """
     基金综合分析图表
     """
     df['净值日期'] = pd.to_datetime(df['净值日期'])
+    # 只有原始列时，只计算这种分析需要的特征
+    df = ensure_features(df, ANALYSIS_COLUMNS.get(analysis_type, []))
     if analysis_type == "移动平均线":
         show_MA_analysis(df,detail)
     elif analysis_type == "布林带分析":
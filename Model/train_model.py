@@ -1,103 +1,159 @@
-from utlis.FundTimeSeriesDataset import process_fund_data_for_training
+"""
+FlowState 模型训练
+python Model/train_model.py --data <基金数据文件> [--checkpoint-dir <目录>] [--epochs 100] [--patience 10] [--workers N] ...
+每 checkpoint_every 个 epoch 保存一次完整的训练状态，再次运行同一个 checkpoint_dir 时从最近的检查点继续
+（--no-resume 从头训练）；验证损失连续 patience 个 epoch 没有改善时提前停止，结束后模型恢复为验证损失最好的参数；
+每个 epoch 的指标写入 <checkpoint_dir>/metrics.csv
+--workers N（N > 1）在 CPU 上启动 N 个数据并行进程（gloo），每个全局批次分给各进程计算后 all_reduce 梯度，
+结果与单进程训练在浮点误差内一致，见 utlis/DistributedTraining.py
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'flowstate'))
+from utlis.DistributedTraining import (all_reduce_gradients, all_reduce_sum, barrier, broadcast_parameters,
+                                       get_world_size, init_worker, is_main_process, launch_workers,
+                                       pin_worker_threads)
+from utlis.FundTimeSeriesDataset import process_fund_data_for_flowstate
+from utlis.QuantileMetrics import interval_coverage, pinball_loss
+from utlis.TrainingCheckpoint import (METRICS_FILE, EarlyStopping, MetricsLogger, load_best_model,
+                                      load_checkpoint, save_best_model, save_checkpoint)
 from flowstate.configuration_flowstate import FlowStateConfig
 from Model.flowstate.modeling_flowstate import FlowStateForPrediction
+import torch.distributed as dist
 import torch.optim as optim
 from torch.optim.lr_scheduler import CosineAnnealingLR
 import torch
-# 模型配置
-config = FlowStateConfig(
-    context_length=512,           # 上下文长度
-    prediction_length=96,         # 预测长度
-    embedding_feature_dim=128,    # 嵌入维度
-    encoder_state_dim=256,        # 编码器状态维度
-    encoder_num_layers=4,         # 编码器层数
-    encoder_num_hippo_blocks=4,   # Hippo块数量
-    decoder_type="legs",          # 解码器类型: "legs", "hlegs", "four"
-    decoder_dim=64,               # 解码器维度
-    decoder_patch_len=96,         # 解码器补丁长度
-    quantiles=[0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9],  # 分位数
-    prediction_type="quantile",   # 预测类型
-    with_missing=False,           # 是否处理缺失值
-    batch_first=True,             # 批次维度在前
-    scale_factor=1.0,             # 缩放因子
-)
-
-# 初始化模型
-model = FlowStateForPrediction(config)
-
-
-def train_model(model, train_loader, val_loader, epochs=100, learning_rate=1e-3):
+
+
+def build_config(context_length=512, prediction_length=96):
+    """模型配置"""
+    return FlowStateConfig(
+        context_length=context_length,          # 上下文长度
+        prediction_length=prediction_length,    # 预测长度
+        embedding_feature_dim=128,    # 嵌入维度
+        encoder_state_dim=256,        # 编码器状态维度
+        encoder_num_layers=4,         # 编码器层数
+        encoder_num_hippo_blocks=4,   # Hippo块数量
+        decoder_type="legs",          # 解码器类型: "legs", "hlegs", "four"
+        decoder_dim=64,               # 解码器维度
+        decoder_patch_len=96,         # 解码器补丁长度
+        quantiles=[0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9],  # 分位数
+        prediction_type="quantile",   # 预测类型
+        with_missing=False,           # 是否处理缺失值
+        batch_first=True,             # 批次维度在前
+        scale_factor=1.0,             # 缩放因子
+    )
+
+
+def _set_epoch(loader, epoch):
+    """DeviceWindowLoader / 带 set_epoch 的采样器按 epoch 决定打乱顺序，续训时与不中断的训练一致"""
+    for target in (loader, getattr(loader, 'sampler', None)):
+        if hasattr(target, 'set_epoch'):
+            target.set_epoch(epoch)
+
+
+def train_model(model, train_loader, val_loader, epochs=100, learning_rate=1e-3, config=None, device=None,
+                checkpoint_dir=None, resume=True, checkpoint_every=1, patience=None, min_delta=0.0):
     """
     训练FlowState模型
+    config：默认使用 model.config
+    checkpoint_dir：保存检查点、最好的模型和 metrics.csv 的目录，None 时不保存（也不能续训）
+    resume：checkpoint_dir 中有检查点时从检查点继续
+    patience / min_delta：早停，None 表示训练满 epochs
+    在数据并行的进程组中调用时（train_distributed），每个进程只计算自己那段批次，梯度和验证指标在进程间求和，
+    只有 rank 0 打印和写检查点
+    返回 (train_losses, val_losses)，包含续训之前的 epoch
     """
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    config = config if config is not None else model.config
+    world_size = get_world_size()
+    main_process = is_main_process()
+    log = print if main_process else (lambda *args, **kwargs: None)
+    device = device if device is not None else torch.device("cuda" if torch.cuda.is_available() else "cpu")
     model.to(device)
 
     # 优化器
     optimizer = optim.AdamW(model.parameters(), lr=learning_rate, weight_decay=1e-4)
     scheduler = CosineAnnealingLR(optimizer, T_max=epochs)
+    early_stopping = EarlyStopping(patience, min_delta)
+
+    # 损失函数 - 分位数损失（所有分位数一次广播计算，见 utlis/QuantileMetrics.py）
+    quantiles = torch.tensor(config.quantiles, device=device)
+
+    start_epoch, history = 0, {}
+    metrics_logger = None
+    if checkpoint_dir is not None:
+        if resume:
+            start_epoch, history = load_checkpoint(checkpoint_dir, model, optimizer, scheduler, early_stopping,
+                                                   map_location=device)
+        if main_process:
+            metrics_logger = MetricsLogger(os.path.join(checkpoint_dir, METRICS_FILE))
+            metrics_logger.truncate(start_epoch)
+    train_losses = history.get('train_losses', [])
+    val_losses = history.get('val_losses', [])
 
-    # 损失函数 - 分位数损失
-    def quantile_loss(predictions, targets, quantiles):
-        """
-        分位数损失函数
-        predictions: (batch_size, num_quantiles, pred_length)
-        targets: (batch_size, pred_length)
-        """
-        losses = []
-        for i, q in enumerate(quantiles):
-            error = targets.unsqueeze(1) - predictions[:, i, :]
-            loss = torch.max((q - 1) * error, q * error)
-            losses.append(loss.mean())
-        return torch.stack(losses).mean()
-
-    train_losses = []
-    val_losses = []
-
-    for epoch in range(epochs):
+    for epoch in range(start_epoch, epochs):
+        if early_stopping.should_stop:
+            break
+        epoch_start = time.perf_counter()
+        _set_epoch(train_loader, epoch)
         # 训练阶段
         model.train()
         train_loss = 0.0
 
-        for batch_idx, (past_values, future_values) in enumerate(train_loader):
-            past_values = past_values.to(device)
-            future_values = future_values.to(device)
+        # 批次为 dict：past_values [B, context_length, 1]、future_values [B, prediction_length]
+        for batch_idx, batch in enumerate(train_loader):
+            past_values = batch['past_values'].to(device, non_blocking=True)
+            future_values = batch['future_values'].to(device, non_blocking=True)
+            # 数据并行时本进程分到的样本可能为 0（最后一个批次比进程数小）
+            count = len(past_values)
 
             optimizer.zero_grad()
 
-            # 前向传播
-            outputs = model(
-                past_values=past_values,
-                future_values=future_values,
-                prediction_length=config.prediction_length,
-                scale_factor=1.0,
-                return_loss=True
-            )
-
-            # 计算损失
-            loss = quantile_loss(
-                outputs.prediction_outputs.squeeze(-1),
-                future_values.squeeze(-1),
-                config.quantiles
-            )
-
-            loss.backward()
+            loss = None
+            if count:
+                # 前向传播
+                outputs = model(
+                    past_values=past_values,
+                    future_values=future_values,
+                    prediction_length=config.prediction_length,
+                    scale_factor=1.0,
+                    return_loss=True
+                )
+
+                # 计算损失，prediction_outputs 为 (batch, quantiles, horizon, 1)
+                loss = pinball_loss(outputs.prediction_outputs, future_values, quantiles)
+
+                loss.backward()
+            if world_size > 1:
+                # 各进程的梯度按样本数加权平均，等于整个全局批次的平均损失的梯度
+                loss_value, _ = all_reduce_gradients(model.parameters(), loss, count)
+            else:
+                loss_value = loss.item()
             torch.nn.utils.clip_grad_norm_(model.parameters(), max_norm=1.0)
             optimizer.step()
 
-            train_loss += loss.item()
+            train_loss += loss_value
 
             if batch_idx % 100 == 0:
-                print(f'Epoch: {epoch}, Batch: {batch_idx}, Loss: {loss.item():.4f}')
+                log(f'Epoch: {epoch}, Batch: {batch_idx}, Loss: {loss_value:.4f}')
 
         # 验证阶段
         model.eval()
-        val_loss = 0.0
+        # 每个批次的 [损失, 覆盖率, 区间宽度] * 样本数 和样本数，数据并行时在进程间求和后再按批次平均
+        val_sums = []
 
         with torch.no_grad():
-            for past_values, future_values in val_loader:
-                past_values = past_values.to(device)
-                future_values = future_values.to(device)
+            for batch in val_loader:
+                past_values = batch['past_values'].to(device, non_blocking=True)
+                future_values = batch['future_values'].to(device, non_blocking=True)
+                count = len(past_values)
+                if not count:
+                    val_sums.append([0.0, 0.0, 0.0, 0])
+                    continue
 
                 outputs = model(
                     past_values=past_values,
@@ -105,27 +161,142 @@ def train_model(model, train_loader, val_loader, epochs=100, learning_rate=1e-3)
                     scale_factor=1.0
                 )
 
-                loss = quantile_loss(
-                    outputs.prediction_outputs.squeeze(-1),
-                    future_values.squeeze(-1),
-                    config.quantiles
-                )
-                val_loss += loss.item()
+                loss = pinball_loss(outputs.prediction_outputs, future_values, quantiles)
+                # 10%-90% 预测区间的覆盖率
+                coverage, width = interval_coverage(outputs.prediction_outputs, future_values, config.quantiles)
+                val_sums.append([loss.item() * count, coverage.item() * count, width.item() * count, count])
+
+        val_sums = all_reduce_sum(val_sums).reshape(-1, 4)
+        val_loss, val_coverage, val_width = (val_sums[:, :3] / val_sums[:, 3:]).sum(dim=0).tolist()
 
         avg_train_loss = train_loss / len(train_loader)
         avg_val_loss = val_loss / len(val_loader)
+        learning_rate_used = scheduler.get_last_lr()[0]
 
         train_losses.append(avg_train_loss)
         val_losses.append(avg_val_loss)
 
         scheduler.step()
+        improved = early_stopping.step(avg_val_loss, epoch + 1)
+
+        log(f'Epoch {epoch + 1}/{epochs}')
+        log(f'Train Loss: {avg_train_loss:.4f}, Val Loss: {avg_val_loss:.4f}, '
+            f'Val Coverage(10%-90%): {val_coverage / len(val_loader):.2%}')
+        log(f'Learning Rate: {scheduler.get_last_lr()[0]:.6f}')
 
-        print(f'Epoch {epoch + 1}/{epochs}')
-        print(f'Train Loss: {avg_train_loss:.4f}, Val Loss: {avg_val_loss:.4f}')
-        print(f'Learning Rate: {scheduler.get_last_lr()[0]:.6f}')
-        print('-' * 50)
+        # 各进程的参数相同，只有 rank 0 写文件
+        if checkpoint_dir is not None and main_process:
+            if improved:
+                save_best_model(checkpoint_dir, model, epoch + 1, avg_val_loss)
+                log(f'验证损失改善，保存最好的模型（epoch {epoch + 1}）')
+            metrics_logger.log({
+                'epoch': epoch + 1,
+                'train_loss': avg_train_loss,
+                'val_loss': avg_val_loss,
+                'val_coverage': val_coverage / len(val_loader),
+                'val_width': val_width / len(val_loader),
+                'learning_rate': learning_rate_used,
+                'best_val_loss': early_stopping.best_loss,
+                'epoch_seconds': time.perf_counter() - epoch_start,
+            })
+            # 最后一个 epoch 和早停时也保存，续训时不会重复训练已经完成的 epoch
+            if (epoch + 1) % checkpoint_every == 0 or epoch + 1 == epochs or early_stopping.should_stop:
+                save_checkpoint(checkpoint_dir, model, optimizer, scheduler, epoch + 1, early_stopping,
+                                {'train_losses': train_losses, 'val_losses': val_losses})
+        log('-' * 50)
+
+    if early_stopping.should_stop:
+        log(f'验证损失连续 {early_stopping.patience} 个 epoch 没有改善，提前停止')
+    # 恢复验证损失最好的参数（等 rank 0 写完 best.pt）
+    if checkpoint_dir is not None:
+        barrier()
+        best = load_best_model(checkpoint_dir, model, map_location=device)
+        if best is not None:
+            log(f'使用 epoch {best[0]} 的模型，验证损失 {best[1]:.4f}')
 
     return train_losses, val_losses
 
-data_processor = process_fund_data_for_training(r"F:\PyCharm_Project\FundStock_Prediction_Website\Data\Funds\050026.csv")
-print(data_processor)
\ No newline at end of file
+
+def _distributed_worker(rank, world_size, port, config, state_dict, data, batch_size, test_size, seed, result_path,
+                        train_options):
+    """数据并行的一个进程：绑定核心、建立 gloo 进程组、只加载本进程那段批次的 loader，然后运行 train_model"""
+    pin_worker_threads(rank, world_size)
+    init_worker(rank, world_size, port)
+    try:
+        torch.manual_seed(seed)
+        # 模型中有 lambda 不能 pickle，各进程按配置重建后载入初始参数
+        model = FlowStateForPrediction(config)
+        model.load_state_dict(state_dict)
+        broadcast_parameters(model)
+        loaders = process_fund_data_for_flowstate(data, config, batch_size=batch_size, test_size=test_size,
+                                                  device=torch.device('cpu'), seed=seed, rank=rank,
+                                                  world_size=world_size)
+        losses = train_model(model, loaders['train_loader'], loaders['test_loader'], device=torch.device('cpu'),
+                             **train_options)
+        if rank == 0:
+            torch.save({'model': model.state_dict(), 'losses': losses}, result_path)
+    finally:
+        dist.destroy_process_group()
+
+
+def train_distributed(model, data, world_size, batch_size=32, test_size=0.2, seed=0, **train_options):
+    """
+    在本机 CPU 上用 world_size 个进程数据并行训练 model（gloo），train_options 为 train_model 的参数
+    data：基金数据文件或 DataFrame，各进程各自构建窗口，每个全局批次 batch_size 个样本分给各进程
+    训练结束后 model 载入 rank 0 的最终参数，返回 (train_losses, val_losses)
+    """
+    with tempfile.TemporaryDirectory() as result_dir:
+        result_path = os.path.join(result_dir, 'result.pt')
+        launch_workers(_distributed_worker, world_size,
+                       (model.config, model.state_dict(), data, batch_size, test_size, seed, result_path,
+                        train_options))
+        result = torch.load(result_path, weights_only=False)
+    model.load_state_dict(result['model'])
+    return result['losses']
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='训练 FlowState 基金净值预测模型')
+    parser.add_argument('--data', default=r"F:\PyCharm_Project\FundStock_Prediction_Website\Data\Funds\050026.parquet",
+                        help='基金数据文件（parquet/csv）')
+    parser.add_argument('--checkpoint-dir', default=r"F:\PyCharm_Project\FundStock_Prediction_Website\Model\checkpoints",
+                        help='检查点、最好的模型和 metrics.csv 的目录')
+    parser.add_argument('--epochs', type=int, default=100)
+    parser.add_argument('--learning-rate', type=float, default=1e-3)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--context-length', type=int, default=512)
+    parser.add_argument('--prediction-length', type=int, default=96)
+    parser.add_argument('--test-size', type=float, default=0.2)
+    parser.add_argument('--checkpoint-every', type=int, default=1, help='每多少个 epoch 保存一次检查点')
+    parser.add_argument('--patience', type=int, default=10, help='早停的 epoch 数，0 表示不早停')
+    parser.add_argument('--min-delta', type=float, default=0.0, help='验证损失至少下降多少才算改善')
+    parser.add_argument('--no-resume', action='store_true', help='忽略已有的检查点，从头训练')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--device', default=None, help='默认有 CUDA 时使用 cuda')
+    parser.add_argument('--workers', type=int, default=1, help='大于 1 时在 CPU 上启动多个数据并行进程')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    torch.manual_seed(args.seed)
+    device = torch.device(args.device) if args.device else \
+        torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    config = build_config(args.context_length, args.prediction_length)
+    # 初始化模型
+    model = FlowStateForPrediction(config)
+    train_options = dict(epochs=args.epochs, learning_rate=args.learning_rate, config=config,
+                         checkpoint_dir=args.checkpoint_dir, resume=not args.no_resume,
+                         checkpoint_every=args.checkpoint_every, patience=args.patience or None,
+                         min_delta=args.min_delta)
+    if args.workers > 1:
+        return train_distributed(model, args.data, args.workers, batch_size=args.batch_size,
+                                 test_size=args.test_size, seed=args.seed, **train_options)
+    # 单变量窗口，长度与模型配置一致；序列常驻训练设备，批次在设备上组装
+    data = process_fund_data_for_flowstate(args.data, config, batch_size=args.batch_size,
+                                           test_size=args.test_size, device=device, seed=args.seed)
+    return train_model(model, data['train_loader'], data['test_loader'], device=device, **train_options)
+
+
+if __name__ == '__main__':
+    main()
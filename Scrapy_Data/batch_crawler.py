@@ -0,0 +1,256 @@
+"""
+批量爬取多只基金的历史净值
+所有基金的页面共用一个线程池和一个keep-alive的Session，全局按每秒请求数限速，失败按指数退避重试；
+每完成一页就记录到检查点文件，中断后重新运行会从中断处继续；每只基金完成后立即写出一个文件（默认 parquet，见 utlis/FundStore.py），
+先写临时文件再替换，中断不会留下写了一半、却被检查点标记为完成的文件；一只基金失败不影响其他基金
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from Scrapy_Data.get_funds_history_data import (BASE_URL, check_transport_base_url, create_session, get_html,
+                                                parse_total_pages, parse_heads, parse_page_records,
+                                                records_to_dataframe)
+from utlis.FundStore import STORE_SUFFIX, save_fund_frame
+
+
+class RateLimiter:
+    """线程安全的全局限速器，保证请求间隔不小于 1 / requests_per_second 秒"""
+
+    def __init__(self, requests_per_second=None):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self.next_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            wait_time = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+
+class CrawlCheckpoint:
+    """
+    爬取检查点
+    checkpoint_path 为 JSON Lines 文件，记录每页的完成情况和每只基金的完成情况；
+    页面数据追加写入 <checkpoint_path>.parts/<code>.jsonl，基金完成后删除
+    """
+
+    def __init__(self, checkpoint_path, start_date, end_date, per):
+        self.checkpoint_path = checkpoint_path
+        self.parts_dir = checkpoint_path + '.parts'
+        self.params = {'start_date': start_date, 'end_date': end_date, 'per': per}
+        self.finished = set()
+        self.done_pages = {}
+        os.makedirs(self.parts_dir, exist_ok=True)
+        if os.path.exists(checkpoint_path):
+            self._load()
+        else:
+            with open(checkpoint_path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps({'params': self.params}) + '\n')
+        self.file = open(checkpoint_path, 'a', encoding='utf-8')
+
+    def _load(self):
+        with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # 中断时最后一行可能没有写完整
+                    continue
+                if 'params' in entry:
+                    if entry['params'] != self.params:
+                        raise ValueError(f"检查点参数不一致: {entry['params']} != {self.params}")
+                elif entry.get('finished'):
+                    self.finished.add(entry['code'])
+                    self.done_pages.pop(entry['code'], None)
+                else:
+                    self.done_pages.setdefault(entry['code'], set()).add(entry['page'])
+
+    def restore(self, code):
+        """恢复一只基金已完成的页面，返回 (总页数, 表头, {页码: 记录})"""
+        pages, heads, records = None, None, {}
+        done = self.done_pages.get(code, set())
+        path = os.path.join(self.parts_dir, f'{code}.jsonl')
+        if not done or not os.path.exists(path):
+            return pages, heads, records
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry['page'] in done:
+                    pages, records[entry['page']] = entry['pages'], entry['records']
+                    heads = entry.get('heads') or heads
+        if heads is None:
+            # 没有第一页的表头时从头开始
+            return None, None, {}
+        return pages, heads, records
+
+    def page_done(self, code, page, pages, heads, records):
+        # 先写页面数据，再写检查点记录
+        with open(os.path.join(self.parts_dir, f'{code}.jsonl'), 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'page': page, 'pages': pages, 'heads': heads, 'records': records},
+                               ensure_ascii=False) + '\n')
+        self.file.write(json.dumps({'code': code, 'page': page, 'pages': pages}) + '\n')
+        self.file.flush()
+
+    def fund_done(self, code):
+        self.file.write(json.dumps({'code': code, 'finished': True}) + '\n')
+        self.file.flush()
+        self.finished.add(code)
+        path = os.path.join(self.parts_dir, f'{code}.jsonl')
+        if os.path.exists(path):
+            os.remove(path)
+
+    def close(self):
+        self.file.close()
+
+
+def fetch_page_with_retry(code, page, start_date, end_date, per, session, limiter, retries, backoff_factor,
+                          base_url, transport=None):
+    """获取并解析一页，失败时按 backoff_factor * 2^n 秒指数退避重试"""
+    for attempt in range(retries + 1):
+        limiter.acquire()
+        try:
+            html = get_html(code, start_date, end_date, page, per, session=session, base_url=base_url,
+                            transport=transport)
+            pages = parse_total_pages(html)
+            heads = parse_heads(html) if page == 1 else None
+            records = parse_page_records(html) if pages else []
+            return pages, heads, records
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(backoff_factor * 2 ** attempt)
+
+
+def Batch_Get_Fund_History_Data(codes, start_date, end_date, output_dir, checkpoint_path=None, per=20,
+                                max_workers=16, requests_per_second=20, retries=3, backoff_factor=0.5,
+                                max_active_funds=None, base_url=BASE_URL, process_features=False, transport=None,
+                                file_suffix=STORE_SUFFIX):
+    """
+    批量获取基金历史净值，每只基金完成后写出 output_dir/<code><file_suffix>（默认 .parquet，'.csv' 为不带索引的csv）
+    checkpoint_path：检查点文件，默认 output_dir/crawl_checkpoint.jsonl，中断后用相同参数重新运行即可续爬
+    requests_per_second：全局限速，None 表示不限速
+    max_active_funds：同时在爬的基金数，默认 max_workers * 2，让基金尽快完成并写出
+    process_features：为 True 时用 FundDataProcessor 计算特征后再保存
+    transport：live/record/replay 传输层（见 Scrapy_Data/transport.py），与不同的 base_url 同时指定时抛出 ValueError
+    返回 {'finished': [...], 'failed': {code: 错误信息}, 'pages': 请求页数, 'elapsed': 耗时秒}
+    """
+    check_transport_base_url(base_url, transport)
+    if process_features:
+        from utlis.FundDataProcessor import FundDataProcessor
+    os.makedirs(output_dir, exist_ok=True)
+    if checkpoint_path is None:
+        checkpoint_path = os.path.join(output_dir, 'crawl_checkpoint.jsonl')
+    if max_active_funds is None:
+        max_active_funds = max_workers * 2
+    checkpoint = CrawlCheckpoint(checkpoint_path, start_date, end_date, per)
+    session = create_session(max_connections_per_host=max_workers, retries=0)
+    limiter = RateLimiter(requests_per_second)
+
+    pending = deque(code for code in dict.fromkeys(codes) if code not in checkpoint.finished)
+    total_funds = len(pending)
+    active = {}  # code -> {'pages': 总页数, 'heads': 表头, 'records': {页码: 记录}}
+    futures = {}  # future -> (code, page)
+    finished, failed = [], {}
+    page_count = 0
+    start_time = time.time()
+
+    def fail_fund(code, error, message):
+        """记录失败并取消该基金还没开始的页面（已经在运行的页面完成后被忽略）"""
+        failed[code] = repr(error)
+        active.pop(code, None)
+        for future in [f for f, (f_code, _) in futures.items() if f_code == code]:
+            if future.cancel():
+                futures.pop(future)
+        print(f"失败 {code} {message}: {error!r}")
+
+    def finish_fund(code):
+        state = active.pop(code)
+        try:
+            records = [row for page in sorted(state['records']) for row in state['records'][page]]
+            fund_df = records_to_dataframe(state['heads'], records)
+            save_path = os.path.join(output_dir, f'{code}{file_suffix}')
+            if process_features and not fund_df.empty:
+                FundDataProcessor(fund_df, save_path).all_process()
+            else:
+                save_fund_frame(fund_df, save_path)
+        except Exception as e:
+            # 解析或特征计算出错只让这只基金失败，不中断整个批次
+            fail_fund(code, e, '写出')
+            return
+        checkpoint.fund_done(code)
+        finished.append(code)
+        print(f"完成 {code} ({len(finished)}/{total_funds})，共 {len(fund_df)} 行")
+
+    def schedule(executor, code):
+        """提交一只基金还没完成的页面，全部完成时直接写出"""
+        state = active[code]
+        if state['pages'] is None:
+            missing = [1]
+        else:
+            missing = [p for p in range(1, state['pages'] + 1) if p not in state['records']]
+        for page in missing:
+            future = executor.submit(fetch_page_with_retry, code, page, start_date, end_date, per, session,
+                                     limiter, retries, backoff_factor, base_url, transport)
+            futures[future] = (code, page)
+        if not missing:
+            finish_fund(code)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while pending or futures:
+                while pending and len(active) < max_active_funds:
+                    code = pending.popleft()
+                    pages, heads, records = checkpoint.restore(code)
+                    active[code] = {'pages': pages, 'heads': heads, 'records': records}
+                    schedule(executor, code)
+                if not futures:
+                    continue
+                done, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+                for future in done:
+                    code, page = futures.pop(future)
+                    if code not in active:
+                        # 该基金已失败，忽略剩余页面
+                        continue
+                    try:
+                        pages, heads, records = future.result()
+                    except Exception as e:
+                        fail_fund(code, e, f'第{page}页')
+                        continue
+                    page_count += 1
+                    state = active[code]
+                    checkpoint.page_done(code, page, pages, heads, records)
+                    if page == 1 and state['pages'] is None:
+                        state['pages'], state['heads'] = pages, heads
+                        state['records'][1] = records
+                        schedule(executor, code)
+                    else:
+                        state['records'][page] = records
+                        if len(state['records']) >= state['pages']:
+                            finish_fund(code)
+    finally:
+        checkpoint.close()
+        session.close()
+
+    elapsed = time.time() - start_time
+    print(f"共完成 {len(finished)} 只基金，失败 {len(failed)} 只，请求 {page_count} 页，耗时 {elapsed:.1f}s")
+    return {'finished': finished, 'failed': failed, 'pages': page_count, 'elapsed': elapsed}
+
+
+if __name__ == '__main__':
+    from datetime import datetime
+
+    formatted_date = datetime.now().strftime("%Y-%m-%d")
+    fund_codes = ['050026', '110011', '161725', '005827']
+    Batch_Get_Fund_History_Data(fund_codes, '1999-02-01', formatted_date,
+                                r'F:\PyCharm_Project\FundStock_Prediction_Website\Data\Funds', process_features=True)
@@ -0,0 +1,66 @@
+"""
+基金净值数据的字段定义和统一的类型转换
+所有类型转换只在 normalize_fund_frame 中做一次（向量化），之后的代码拿到的都是已转换类型的数据，不再解析字符串：
+净值日期 -> datetime64，单位净值/累计净值 -> float64，日增长率 -> float64（百分数，去掉%），
+申购状态/赎回状态 -> int8（开放=1，其它=0），分红送配 -> int8（有分红送配=1）
+"""
+import numpy as np
+import pandas as pd
+
+# 未知状态记为 default
+SUBSCRIBE_STATUS = {'开放申购': 1, '暂停申购': 0}
+REDEEM_STATUS = {'开放赎回': 1, '暂停赎回': 0}
+
+FUND_SCHEMA = {
+    '净值日期': {'type': 'date', 'format': '%Y-%m-%d'},
+    '单位净值': {'type': 'float'},
+    '累计净值': {'type': 'float'},
+    '日增长率': {'type': 'percent'},
+    '申购状态': {'type': 'enum', 'mapping': SUBSCRIBE_STATUS, 'default': 0},
+    '赎回状态': {'type': 'enum', 'mapping': REDEEM_STATUS, 'default': 0},
+    '分红送配': {'type': 'flag'},
+}
+FUND_COLUMNS = list(FUND_SCHEMA)
+
+
+def _convert_column(values, spec):
+    """按字段定义转换一列，已经是目标类型的列直接返回"""
+    kind = spec['type']
+    if kind == 'date':
+        if pd.api.types.is_datetime64_any_dtype(values):
+            return values.astype('datetime64[ns]')
+        return pd.to_datetime(values, format=spec.get('format'), errors='coerce')
+    if kind == 'float':
+        if pd.api.types.is_float_dtype(values):
+            return values
+        return pd.to_numeric(values, errors='coerce').astype(np.float64)
+    if kind == 'percent':
+        if pd.api.types.is_numeric_dtype(values):
+            return values.astype(np.float64)
+        return pd.to_numeric(values.astype(str).str.rstrip('%'), errors='coerce').astype(np.float64)
+    if kind == 'enum':
+        if pd.api.types.is_numeric_dtype(values):
+            return values.fillna(spec['default']).astype(np.int8)
+        return values.map(spec['mapping']).fillna(spec['default']).astype(np.int8)
+    if kind == 'flag':
+        if pd.api.types.is_numeric_dtype(values):
+            return values.fillna(0).astype(np.int8)
+        # 空单元格可能是 NaN、空字符串或被转成字符串的 'nan'
+        text = values.astype(str).str.strip()
+        return (values.notna() & (text != '') & (text != 'nan')).astype(np.int8)
+    raise ValueError(f"未知的字段类型: {kind}")
+
+
+def normalize_fund_frame(df, schema=FUND_SCHEMA):
+    """
+    按 schema 一次性转换所有字段的类型，按日期升序排列并重置索引
+    不修改传入的DataFrame；schema 以外的列原样保留
+    """
+    df = df.copy(deep=False)
+    for column, spec in schema.items():
+        if column in df.columns:
+            df[column] = _convert_column(df[column], spec)
+    date_column = next((c for c, spec in schema.items() if spec['type'] == 'date' and c in df.columns), None)
+    if date_column is not None and not df[date_column].is_monotonic_increasing:
+        df = df.sort_values(date_column, kind='stable')
+    return df.reset_index(drop=True)
@@ -1,6 +1,12 @@
 # 导入需要的模块
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+from Scrapy_Data.lsjz_parser import parse_lsjz_columns, concat_lsjz_columns, lsjz_columns_to_dataframe
+from Scrapy_Data.fund_schema import FUND_COLUMNS, normalize_fund_frame
+import os
 import re
 import numpy as np
 import pandas as pd
@@ -9,31 +15,6 @@ warnings.filterwarnings('ignore')
 pd.set_option('display.max_colwidth', None)
 pd.set_option('display.max_columns', None)  # 显示所有列
 pd.set_option('display.width', None)  # 不限制显示宽度
-def convert_date_column(df, date_column='净值日期',date_format='%Y-%m-%d'):
-    """
-    通用日期列转换函数，处理各种输入类型
-    """
-    # 检查当前类型
-    current_dtype = df[date_column].dtype
-    print(f"当前数据类型: {current_dtype}")
-    # 根据不同类型进行处理
-    if df['净值日期'].dtype == 'object':  # 字符串类型
-        df['净值日期'] = pd.to_datetime(df['净值日期']).dt.strftime(date_format)
-    elif 'datetime' in str(df['净值日期'].dtype):  # 已经是datetime类型
-        df['净值日期'] = df['净值日期'].dt.strftime(date_format)
-    else:
-        # 其他类型（如整数时间戳）
-        df['净值日期'] = pd.to_datetime(df['净值日期']).dt.strftime(date_format)
-    # 转换为datetime类型（自动推断格式）
-    df[date_column] = pd.to_datetime(df[date_column], errors='coerce')
-    # 检查转换是否成功
-    null_count = df[date_column].isnull().sum()
-    if null_count > 0:
-        print(f"警告: {null_count} 个日期转换失败")
-    # 格式化为目标格式
-    df[date_column] = df[date_column].dt.strftime(date_format)
-    return df
-
 """
 其中，每个参数的意义是：
 type：lsjz表示历史净值
@@ -43,97 +24,194 @@ per：表示获取的数据每页显示的条数
 sdate：表示开始时间
 edate：表示结束时间
 """
-def get_html(code, start_date, end_date, page=1, per=20):
-    url = 'http://fund.eastmoney.com/f10/F10DataApi.aspx?type=lsjz&code={0}&page={1}&sdate={2}&edate={3}&per={4}'.format(
+def create_session(max_connections_per_host=4, retries=3, backoff_factor=0.5):
+    """
+    创建复用连接(keep-alive)的Session
+    max_connections_per_host：每个主机的最大并发连接数，连接池满时阻塞等待
+    retries：失败重试次数
+    backoff_factor：重试退避系数，第n次重试等待 backoff_factor * 2^(n-1) 秒
+    """
+    session = requests.Session()
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=['GET'],
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections_per_host,
+                          pool_block=True, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+BASE_URL = 'http://fund.eastmoney.com/f10/F10DataApi.aspx'
+
+
+def check_transport_base_url(base_url, transport):
+    """transport 使用自己的 base_url（见 transport.create_transport），同时指定不同的 base_url 时报错，而不是静默忽略"""
+    if transport is not None and base_url != BASE_URL and base_url != getattr(transport, 'base_url', None):
+        raise ValueError(f"指定了 transport 时 base_url 不生效，请用 create_transport(..., base_url={base_url!r}) 创建传输层")
+
+
+def get_html(code, start_date, end_date, page=1, per=20, session=None, base_url=BASE_URL, transport=None):
+    # transport 为 Scrapy_Data.transport 中的传输层（录制/回放），不指定时直接请求
+    if transport is not None:
+        check_transport_base_url(base_url, transport)
+        return transport.get_html(code, start_date, end_date, page, per, session=session)
+    url = base_url + '?type=lsjz&code={0}&page={1}&sdate={2}&edate={3}&per={4}'.format(
         code, page, start_date, end_date, per)
-    rsp = requests.get(url)
+    if session is None:
+        rsp = requests.get(url)
+    else:
+        rsp = session.get(url)
     html = rsp.text
     return html
 
 
-def Get_Fund_History_Data(code, start_date, end_date, page=1, per=20):
-    # 获取html
-    html = get_html(code, start_date, end_date, page, per)
-    soup = BeautifulSoup(html, 'html.parser')
-    # 获取总页数
+def parse_total_pages(html):
+    """获取总页数"""
     pattern = re.compile('pages:(.*),')
     result = re.search(pattern, html).group(1)
-    total_page = int(result)
-    # 获取表头信息
+    return int(result)
+
+
+def parse_heads(html):
+    """获取表头信息"""
+    soup = BeautifulSoup(html, 'html.parser')
     heads = []
     # for head in soup.findAll("th"):
     for head in soup.find_all("th"):
         heads.append(head.contents[0])
-    # print(heads)
-    # 数据存取列表
+    return heads
+
+
+def parse_page_records(html):
+    """解析一页html中的表格数据"""
+    soup = BeautifulSoup(html, 'html.parser')
     records = []
-    # 获取每一页的数据
-    current_page = 1
-    while current_page <= total_page:
-        html = get_html(code, start_date, end_date, current_page, per)
-        soup = BeautifulSoup(html, 'html.parser')
-        # print(soup)
-        # print(soup.find_all("tbody")[0].find_all("tr"))
-        # 获取数据
-        for row in soup.find_all("tbody")[0].find_all("tr"):
-            row_records = []
-            for record in row.find_all('td'):
-                val = record.contents
-                # 处理空值
-                if val == []:
-                    row_records.append(np.nan)
-                else:
-                    row_records.append(val[0])
-            # 记录数据
-            records.append(row_records)
-        # 下一页
-        current_page = current_page + 1
-    # 将数据转换为Dataframe对象
-    np_records = np.array(records)
-    fund_df = pd.DataFrame()
-    for col, col_name in enumerate(heads):
-        fund_df[col_name] = np_records[:, col]
-    # 使用示例
-    fund_df = convert_date_column(fund_df, '净值日期')
-    # 按照日期排序
-    fund_df['净值日期'] = pd.to_datetime(fund_df['净值日期'], format='%Y-%m-%d')
+    for row in soup.find_all("tbody")[0].find_all("tr"):
+        row_records = []
+        for record in row.find_all('td'):
+            val = record.contents
+            # 处理空值
+            if val == []:
+                row_records.append(np.nan)
+            else:
+                row_records.append(str(val[0]))
+        # 记录数据
+        records.append(row_records)
+    return records
+
+
+def Get_Fund_History_Data(code, start_date, end_date, page=1, per=20, concurrent=False, max_workers=8,
+                          max_connections_per_host=4, retries=3, backoff_factor=0.5, base_url=BASE_URL,
+                          parser='bs4', transport=None):
     """
-        by='净值日期': 指定按照"净值日期"这一列进行排序
-        axis=0: 按行排序（默认值，通常可以省略）
-        ascending=True: 升序排列（从早到晚）
-        .reset_index(drop=True)
-        reset_index(): 重置索引，将原来的索引变成普通列
-        drop=True: 不保留原来的索引，直接丢弃
-    
-        将"净值日期"列设置为新的索引
-        fund_df = fund_df.set_index('净值日期')
-        数据类型处理
+    获取基金历史净值
+    concurrent=True 时，第一页之后的页面由线程池并发获取，所有线程共用一个keep-alive的Session，
+    并发连接数受 max_connections_per_host 限制，失败按 retries/backoff_factor 退避重试
+    返回已转换类型的DataFrame（见 Scrapy_Data/fund_schema.py）
+    parser='fast' 时使用 lsjz_parser 的正则解析，直接得到按列的数组（见 Scrapy_Data/lsjz_parser.py）
+    transport：live/record/replay 传输层（见 Scrapy_Data/transport.py），使用传输层自己的 base_url，
+    同时指定不同的 base_url 时抛出 ValueError
     """
-    fund_df = fund_df.sort_values(by='净值日期', axis=0, ascending=True).reset_index(drop=True)
-    fund_df['单位净值'] = fund_df['单位净值'].astype(float)
-    fund_df['累计净值'] = fund_df['累计净值'].astype(float)
-    # fund_df['日增长率'] = fund_df['日增长率'].str.strip('%').astype(float)
-    # fund_df = fund_df.rename(columns={'日增长率': '日增长率(%)'})
-    # 按指定列顺序重新索引
-    desired_columns = ['净值日期', '单位净值', "累计净值", '日增长率', '申购状态',"赎回状态","分红送配"]
-    fund_df = fund_df.reindex(columns=desired_columns)
-
-    # 如果有些列不存在，使用fill_value参数
-    fund_df = fund_df.reindex(columns=desired_columns, fill_value=0)
-    return fund_df
+    check_transport_base_url(base_url, transport)
+    fast = parser == 'fast'
+    parse_page = parse_lsjz_columns if fast else parse_page_records
+    session = None
+    if concurrent:
+        session = create_session(max_connections_per_host, retries, backoff_factor)
 
-if __name__ == '__main__':
-    from datetime import datetime
+    def fetch_page(current_page):
+        return parse_page(get_html(code, start_date, end_date, current_page, per,
+                                   session=session, base_url=base_url, transport=transport))
+
+    try:
+        # 获取html
+        html = get_html(code, start_date, end_date, page, per, session=session, base_url=base_url,
+                        transport=transport)
+        # 获取总页数
+        total_page = parse_total_pages(html)
+        # 获取表头信息
+        heads = None if fast else parse_heads(html)
+        # 每页的解析结果，第一页直接复用已获取的html
+        pages_data = [parse_page(html)] if page == 1 and total_page >= 1 else []
+        first_page = 2 if pages_data else 1
+        remaining_pages = range(first_page, total_page + 1)
+        # 获取每一页的数据
+        if concurrent:
+            # executor.map按提交顺序返回结果，保证数据按页码排列
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                pages_data.extend(executor.map(fetch_page, remaining_pages))
+        else:
+            for current_page in remaining_pages:
+                pages_data.append(fetch_page(current_page))
+    finally:
+        # 任意一页失败时也要关闭连接池
+        if session is not None:
+            session.close()
+    if fast:
+        return lsjz_columns_to_dataframe(concat_lsjz_columns(pages_data))
+    records = [row for page_records in pages_data for row in page_records]
+    return records_to_dataframe(heads, records)
 
-    now = datetime.now()
 
-    # 格式化为字符串
-    formatted_date = now.strftime("%Y-%m-%d")
+def records_to_dataframe(heads, records):
+    """把表头和逐行记录转换为按日期升序、已转换类型的DataFrame（类型转换见 fund_schema.normalize_fund_frame）"""
+    # 查询区间内没有数据（如增量同步时没有新净值）
+    if not records:
+        return normalize_fund_frame(pd.DataFrame(columns=FUND_COLUMNS))
+    # 将数据转换为Dataframe对象
+    fund_df = pd.DataFrame(records, columns=heads)
+    # 按指定列顺序重新索引，缺少的列为空值
+    fund_df = fund_df.reindex(columns=FUND_COLUMNS)
+    return normalize_fund_frame(fund_df)
+
+
+def Sync_Fund_History_Data(code, data_dir, end_date=None, store=None, **fetch_kwargs):
+    """
+    增量同步基金净值
+    读取 data_dir/<code>.parquet 中最后一个净值日期，只请求之后的数据，
+    追加新行并只重新计算受新数据影响的特征行；文件不存在时获取全部历史，只有旧的csv时先转换为parquet
+    store：utlis.MultiFundStore.MultiFundStore，有新数据时同步更新合并存储
+    fetch_kwargs：透传给 Get_Fund_History_Data（如 concurrent=True）
+    返回新增的行数
+    """
+    from datetime import datetime
     from utlis.FundDataProcessor import FundDataProcessor
-    fund_df = Get_Fund_History_Data('050026', start_date='1999-02-01', end_date=formatted_date)
-    funddataprocessor = FundDataProcessor(fund_df,r'F:\PyCharm_Project\FundStock_Prediction_Website\Data\FundS\050026.csv')
-    df, columns = funddataprocessor.all_process()
-    print(df)
+    from utlis.FundStore import STORE_SUFFIX, import_csv, load_fund_frame
+    if end_date is None:
+        end_date = datetime.now().strftime("%Y-%m-%d")
+    save_path = os.path.join(data_dir, f'{code}{STORE_SUFFIX}')
+    csv_path = os.path.join(data_dir, f'{code}.csv')
+    if not os.path.exists(save_path) and os.path.exists(csv_path):
+        import_csv(csv_path, save_path)
+    if not os.path.exists(save_path):
+        fund_df = Get_Fund_History_Data(code, start_date='1999-02-01', end_date=end_date, **fetch_kwargs)
+        if fund_df.empty:
+            return 0
+        df, _ = FundDataProcessor(fund_df, save_path).all_process()
+        if store is not None:
+            store.write_fund(code, df)
+        return len(fund_df)
+    # 只读取日期列获取最后的净值日期
+    last_date = load_fund_frame(save_path, columns=['净值日期'])['净值日期'].max()
+    start_date = (last_date + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+    if start_date > end_date:
+        return 0
+    fund_df = Get_Fund_History_Data(code, start_date=start_date, end_date=end_date, **fetch_kwargs)
+    if fund_df.empty:
+        print(f"{code} 没有新的净值数据")
+        return 0
+    df, _ = FundDataProcessor(fund_df, save_path).incremental_process()
+    if store is not None:
+        store.write_fund(code, df)
+    return len(fund_df)
+
+if __name__ == '__main__':
+    new_rows = Sync_Fund_History_Data('050026', r'F:\PyCharm_Project\FundStock_Prediction_Website\Data\Funds')
+    print(f"新增 {new_rows} 行")
     # print(fund_df)
     # fig, axes = plt.subplots(nrows=2, ncols=1)
     # fund_df[['单位净值', '累计净值']].plot(ax=axes[0])
@@ -0,0 +1,183 @@
+"""
+本地的 eastmoney 替身服务器
+返回与 http://fund.eastmoney.com/f10/F10DataApi.aspx?type=lsjz 相同格式的响应，
+用于在没有网络的情况下测试爬虫以及压测吞吐量
+数据来源：指定 cache_dir 时返回 Scrapy_Data.transport 录制的页面；
+否则 data_dir 下存在该基金的数据文件（parquet/csv）时使用其中的净值，再否则按基金代码生成确定性的模拟净值
+"""
+import math
+import os
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+import pandas as pd
+from Scrapy_Data.transport import cache_path
+
+LSJZ_PATH = '/f10/F10DataApi.aspx'
+
+
+def build_lsjz_page(rows, records, pages, curpage):
+    """
+    按 F10DataApi 的格式拼接一页响应
+    rows：[(净值日期, 单位净值, 累计净值, 日增长率, 申购状态, 赎回状态, 分红送配), ...]，已按日期倒序
+    """
+    head = ("<thead><tr><th class='first'>净值日期</th><th>单位净值</th><th>累计净值</th><th>日增长率</th>"
+            "<th>申购状态</th><th>赎回状态</th><th class='tor last'>分红送配</th></tr></thead>")
+    if rows:
+        body = ''.join(
+            "<tr><td>{0}</td><td class='tor bold'>{1}</td><td class='tor bold'>{2}</td>"
+            "<td class='tor bold'>{3}</td><td>{4}</td><td>{5}</td><td class='red unbold'>{6}</td></tr>".format(*row)
+            for row in rows)
+    else:
+        body = "<tr><td colspan='7' align='center'>暂无数据!</td></tr>"
+    return ('var apidata={ content:"' + "<table class='w782 comm lsjz'>" + head + '<tbody>' + body +
+            '</tbody></table>",records:{0},pages:{1},curpage:{2}}};'.format(records, pages, curpage))
+
+
+def synthetic_history(code, start_date='2010-01-04', end_date='2025-12-31'):
+    """按基金代码生成确定性的模拟净值（工作日），返回与页面单元格一致的字符串列"""
+    dates = pd.bdate_range(start_date, end_date)
+    rng = np.random.default_rng(int(code) if str(code).isdigit() else abs(hash(code)) % (2 ** 32))
+    growth = np.round(rng.normal(0.03, 1.2, len(dates)), 2)
+    growth[0] = 0.0
+    nav = np.round(np.cumprod(1 + growth / 100), 4)
+    df = pd.DataFrame({
+        '净值日期': dates.strftime('%Y-%m-%d'),
+        '单位净值': ['%.4f' % v for v in nav],
+        '累计净值': ['%.4f' % v for v in nav],
+        '日增长率': ['%.2f%%' % v for v in growth],
+        '申购状态': '开放申购',
+        '赎回状态': '开放赎回',
+        '分红送配': '',
+    })
+    df.loc[0, '日增长率'] = ''
+    return df
+
+
+def stored_history(path):
+    """把 Data/Funds 下处理过的基金数据还原成页面单元格格式"""
+    from utlis.FundStore import load_fund_frame
+    df = load_fund_frame(path, columns=['净值日期', '单位净值', '累计净值', '日增长率', '申购状态', '赎回状态'])
+    return pd.DataFrame({
+        '净值日期': pd.to_datetime(df['净值日期']).dt.strftime('%Y-%m-%d'),
+        '单位净值': df['单位净值'].map('{:.4f}'.format),
+        '累计净值': df['累计净值'].map('{:.4f}'.format),
+        '日增长率': df['日增长率'].map('{:.2f}%'.format),
+        '申购状态': np.where(df['申购状态'] == 1, '开放申购', '暂停申购'),
+        '赎回状态': np.where(df['赎回状态'] == 1, '开放赎回', '暂停赎回'),
+        '分红送配': '',
+    })
+
+
+class FundHistorySource:
+    """按基金代码提供净值数据，结果缓存在内存中"""
+
+    def __init__(self, data_dir=None, start_date='2010-01-04', end_date='2025-12-31'):
+        self.data_dir = data_dir
+        self.start_date = start_date
+        self.end_date = end_date
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def get(self, code):
+        with self._lock:
+            if code not in self._cache:
+                path = None
+                if self.data_dir:
+                    from utlis.FundStore import fund_store_path
+                    path = fund_store_path(self.data_dir, code)
+                if path and os.path.exists(path):
+                    df = stored_history(path)
+                else:
+                    df = synthetic_history(code, self.start_date, self.end_date)
+                # 与网站一致：最新的日期排在最前
+                self._cache[code] = df.sort_values('净值日期', ascending=False).reset_index(drop=True)
+            return self._cache[code]
+
+    def page(self, code, page=1, sdate='', edate='', per=20):
+        df = self.get(code)
+        if sdate:
+            df = df[df['净值日期'] >= sdate]
+        if edate:
+            df = df[df['净值日期'] <= edate]
+        records = len(df)
+        pages = math.ceil(records / per)
+        rows = list(df.iloc[(page - 1) * per: page * per].itertuples(index=False, name=None))
+        return build_lsjz_page(rows, records, pages, page)
+
+
+class RecordedPageSource:
+    """返回 RecordTransport 录制到 cache_dir 的原始页面，没有录制的页面返回 None"""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def page(self, code, page=1, sdate='', edate='', per=20):
+        path = cache_path(self.cache_dir, code, page, sdate, edate, per)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+
+class LsjzRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # 支持keep-alive
+    disable_nagle_algorithm = True  # 响应头和响应体分开发送，避免keep-alive时的延迟确认等待
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path != LSJZ_PATH or query.get('type') != 'lsjz' or 'code' not in query:
+            self.send_error(404)
+            return
+        # 模拟网络延迟
+        delay = self.server.latency + random.uniform(0, self.server.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        html = self.server.source.page(query['code'], int(query.get('page', 1)), query.get('sdate', ''),
+                                       query.get('edate', ''), int(query.get('per', 20)))
+        if html is None:
+            self.send_error(404)
+            return
+        body = html.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_local_server(host='127.0.0.1', port=0, data_dir=None, start_date='2010-01-04', end_date='2025-12-31',
+                       cache_dir=None, latency=0.0, jitter=0.0):
+    """
+    在后台线程启动替身服务器
+    cache_dir：返回录制的页面（见 Scrapy_Data/transport.py），不指定时生成页面
+    latency / jitter：每个请求额外等待 latency + [0, jitter) 秒，模拟真实网站的响应时间
+    返回 (server, base_url)，base_url 可直接传给 get_html / Get_Fund_History_Data，用 server.shutdown() 停止
+    """
+    server = ThreadingHTTPServer((host, port), LsjzRequestHandler)
+    server.daemon_threads = True
+    if cache_dir:
+        server.source = RecordedPageSource(cache_dir)
+    else:
+        server.source = FundHistorySource(data_dir, start_date, end_date)
+    server.latency = latency
+    server.jitter = jitter
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = 'http://{0}:{1}{2}'.format(host, server.server_address[1], LSJZ_PATH)
+    return server, base_url
+
+
+if __name__ == '__main__':
+    server, base_url = start_local_server(port=8765, data_dir=os.path.join(os.path.dirname(__file__), '..', 'Data', 'Funds'))
+    print(f"本地服务器已启动: {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
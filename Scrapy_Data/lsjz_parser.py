@@ -0,0 +1,98 @@
+"""
+F10DataApi 历史净值(lsjz)表格的快速解析
+表格是固定的7列，用一个预编译正则匹配整行，直接输出按列的numpy数组，不经过BeautifulSoup和逐单元格的列表：
+净值日期 -> datetime64[D]，单位净值/累计净值 -> float64，日增长率 -> float64（去掉%），
+申购状态/赎回状态 -> int8（开放=1，其它=0），分红送配 -> int8（有分红送配=1），与 fund_schema 的类型一致
+正则匹配的行数与表格中的数据行数不一致时（单元格里有嵌套标签、<tr> 带属性等），整页改用 BeautifulSoup 解析，
+'--' 等无法转换的值与 BeautifulSoup 的路径相同记为 NaN/NaT
+"""
+import re
+import numpy as np
+import pandas as pd
+from Scrapy_Data.fund_schema import FUND_COLUMNS as LSJZ_COLUMNS, SUBSCRIBE_STATUS, REDEEM_STATUS
+
+_CELL = r"<td[^>]*>([^<]*)</td>\s*"
+ROW_PATTERN = re.compile(r"<tr>\s*" + _CELL * 7 + r"</tr>")
+# 表格中的数据行：第一个单元格为不带 colspan 的 <td>（不包括表头和“暂无数据”行）
+DATA_ROW_PATTERN = re.compile(r"<tr[^>]*>\s*<td(?![^>]*colspan)")
+
+
+def _to_float(values, suffix=''):
+    """字符串列转float，空值为nan，'--' 等占位符也为nan"""
+    if suffix:
+        values = [v.strip()[:-len(suffix)] if v.strip().endswith(suffix) else (v.strip() or 'nan') for v in values]
+    else:
+        values = [v.strip() or 'nan' for v in values]
+    try:
+        return np.array(values, dtype=np.float64)
+    except ValueError:
+        return pd.to_numeric(pd.Series(values), errors='coerce').values.astype(np.float64)
+
+
+def _to_date(values):
+    try:
+        return np.array(values, dtype='datetime64[D]')
+    except ValueError:
+        return pd.to_datetime(pd.Series(values), errors='coerce').values.astype('datetime64[D]')
+
+
+def _bs4_rows(html):
+    """BeautifulSoup 取出每个7列数据行的单元格文本（包括嵌套标签中的文本），保持页面中的顺序"""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    rows = []
+    for row in soup.find_all('tr'):
+        cells = row.find_all('td')
+        if len(cells) == len(LSJZ_COLUMNS):
+            rows.append(tuple(cell.get_text(strip=True) for cell in cells))
+    return rows
+
+
+def parse_lsjz_columns(html):
+    """解析一页，返回 {列名: numpy数组}"""
+    rows = ROW_PATTERN.findall(html)
+    expected = len(DATA_ROW_PATTERN.findall(html))
+    if len(rows) != expected:
+        print(f"lsjz 页面有 {expected} 行数据，正则只匹配到 {len(rows)} 行，改用 BeautifulSoup 解析")
+        rows = _bs4_rows(html)
+    if not rows:
+        return empty_lsjz_columns()
+    dates, navs, acc_navs, growths, subscribes, redeems, dividends = zip(*rows)
+    return {
+        '净值日期': _to_date([v.strip() for v in dates]),
+        '单位净值': _to_float(navs),
+        '累计净值': _to_float(acc_navs),
+        '日增长率': _to_float(growths, '%'),
+        '申购状态': np.array([SUBSCRIBE_STATUS.get(v.strip(), 0) for v in subscribes], dtype=np.int8),
+        '赎回状态': np.array([REDEEM_STATUS.get(v.strip(), 0) for v in redeems], dtype=np.int8),
+        '分红送配': np.array([1 if v.strip() else 0 for v in dividends], dtype=np.int8),
+    }
+
+
+def empty_lsjz_columns():
+    return {
+        '净值日期': np.array([], dtype='datetime64[D]'),
+        '单位净值': np.array([], dtype=np.float64),
+        '累计净值': np.array([], dtype=np.float64),
+        '日增长率': np.array([], dtype=np.float64),
+        '申购状态': np.array([], dtype=np.int8),
+        '赎回状态': np.array([], dtype=np.int8),
+        '分红送配': np.array([], dtype=np.int8),
+    }
+
+
+def concat_lsjz_columns(pages_columns):
+    """把多页的列拼接起来并按日期升序排列"""
+    pages_columns = list(pages_columns)
+    if not pages_columns:
+        return empty_lsjz_columns()
+    columns = {name: np.concatenate([page[name] for page in pages_columns]) for name in LSJZ_COLUMNS}
+    order = np.argsort(columns['净值日期'], kind='stable')
+    return {name: values[order] for name, values in columns.items()}
+
+
+def lsjz_columns_to_dataframe(columns):
+    """列数组直接构造DataFrame（不复制数据）"""
+    df = pd.DataFrame({name: columns[name] for name in LSJZ_COLUMNS}, copy=False)
+    df['净值日期'] = df['净值日期'].astype('datetime64[ns]')
+    return df
@@ -0,0 +1,69 @@
+"""
+get_html 的可替换传输层
+live：直接请求网站；record：请求网站并把响应保存到磁盘缓存；replay：只从磁盘缓存读取，不访问网络
+缓存按 (code, page, sdate, edate, per) 保存为 <cache_dir>/<code>/<sdate>_<edate>_<per>_<page>.html，
+录制的页面也可以由 local_eastmoney_server 对外提供
+"""
+import os
+import threading
+from Scrapy_Data.get_funds_history_data import BASE_URL, get_html
+
+
+def cache_path(cache_dir, code, page, start_date, end_date, per):
+    return os.path.join(cache_dir, str(code), f'{start_date}_{end_date}_{per}_{page}.html')
+
+
+class LiveTransport:
+    """直接请求网站"""
+
+    def __init__(self, base_url=BASE_URL):
+        self.base_url = base_url
+
+    def get_html(self, code, start_date, end_date, page=1, per=20, session=None):
+        return get_html(code, start_date, end_date, page, per, session=session, base_url=self.base_url)
+
+
+class RecordTransport(LiveTransport):
+    """请求网站，并把每个响应写入磁盘缓存"""
+
+    def __init__(self, cache_dir, base_url=BASE_URL):
+        super().__init__(base_url)
+        self.cache_dir = cache_dir
+
+    def get_html(self, code, start_date, end_date, page=1, per=20, session=None):
+        html = super().get_html(code, start_date, end_date, page, per, session=session)
+        path = cache_path(self.cache_dir, code, page, start_date, end_date, per)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再替换，并发录制时不会读到写了一半的文件
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(html)
+        os.replace(tmp_path, path)
+        return html
+
+
+class ReplayTransport:
+    """只从磁盘缓存读取，缓存中没有的页面抛出 FileNotFoundError"""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def get_html(self, code, start_date, end_date, page=1, per=20, session=None):
+        path = cache_path(self.cache_dir, code, page, start_date, end_date, per)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"缓存中没有该页面: {path}")
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+
+def create_transport(mode='live', cache_dir=None, base_url=BASE_URL):
+    """按模式创建传输层，结果可作为 transport 参数传给 get_html / Get_Fund_History_Data"""
+    if mode == 'live':
+        return LiveTransport(base_url)
+    if cache_dir is None:
+        raise ValueError(f"{mode} 模式需要指定 cache_dir")
+    if mode == 'record':
+        return RecordTransport(cache_dir, base_url)
+    if mode == 'replay':
+        return ReplayTransport(cache_dir)
+    raise ValueError(f"未知的传输模式: {mode}，可选 'live', 'record', 'replay'")
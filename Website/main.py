@@ -5,6 +5,12 @@ from Draw_images.show_dashboard import show_MA
 from Draw_images.show_fund_analysis import show_fund_analysis
 from utlis.Get_fund_code_name import get_fund_code_name
 from utlis.Get_Lately_Data import Get_Lately_Data
+from utlis.FundStore import fund_store_path, load_fund_frame
+from utlis.MultiFundStore import MultiFundStore
+from utlis.FeatureCache import FeatureCache
+from utlis.FeatureRegistry import RAW_COLUMNS
+from utlis.FundDataProcessor import FundDataProcessor
+from Draw_images.show_fund_analysis import ANALYSIS_COLUMNS
 import yaml
 import streamlit as st
 from yaml.loader import SafeLoader
@@ -14,9 +20,16 @@ import pandas as pd
 matplotlib.use('TkAgg')  # 在导入pyplot之前设置后端
 import re
 
+# 多基金合并存储目录（见 utlis/MultiFundStore.py），存在时优先从这里按日期范围读取
+FUND_STORE_DIR = "../Data/FundStore"
+# 特征缓存目录（见 utlis/FeatureCache.py），原始数据或特征代码变化后只重新计算过期的基金
+FEATURE_CACHE_DIR = "../Data/FeatureCache"
+
 class FundStockApp:
     def __init__(self):
         self.config_path = 'config.yaml'
+        self.fund_store = MultiFundStore(FUND_STORE_DIR)
+        self.feature_cache = FeatureCache(FEATURE_CACHE_DIR)
         self.setup_page()
         self.authenticator = self.setup_auth()
 
@@ -80,7 +93,10 @@ class FundStockApp:
 
     def show_dashboard(self):
 
-        show_MA(r"F:\PyCharm_Project\FundStock_Prediction_Website\Data\Funds\050026.csv",'近1年')
+        if '050026' in self.fund_store.codes():
+            show_MA(self.fund_store, '近1年', code='050026')
+        else:
+            show_MA(fund_store_path(r"F:\PyCharm_Project\FundStock_Prediction_Website\Data\Funds", '050026'),'近1年')
     def show_prediction(self):
         st.title("智能预测")
         st.write("这里是智能预测页面")
@@ -101,16 +117,16 @@ class FundStockApp:
             st.info("请选择你需要观看的基金")
             st.stop()
         fund_code = fund_code_name.split("(代码:")[-1].replace(')','').strip()
-        fund_data_path = rf"../Data/Funds/{fund_code}.csv"
-        processed_df = pd.read_csv(fund_data_path)
-        max_value = processed_df['单位净值'].max()
-        min_value = processed_df['单位净值'].min()
-        now_value = processed_df['单位净值'].iloc[-1]
+        fund_data_path = fund_store_path("../Data/Funds", fund_code)
 
         analysis_type = st.selectbox(
             "选择分析类型",
             ["移动平均线", "布林带分析", "RSI指标", "波动率分析", "动量分析", "综合技术分析"]
         )
+        processed_df = self.load_analysis_frame(fund_code, fund_data_path, ANALYSIS_COLUMNS[analysis_type])
+        max_value = processed_df['单位净值'].max()
+        min_value = processed_df['单位净值'].min()
+        now_value = processed_df['单位净值'].iloc[-1]
         date_select = st.selectbox(
             "时间类型选择",
             ['自定义开始和结束','给定时间选择']
@@ -142,6 +158,16 @@ class FundStockApp:
         show_fund_analysis(filtered_df,analysis_type=analysis_type,detail=f"最大净值:{max_value},最小净值:{min_value},当前净值:{now_value}")
 
 
+    def load_analysis_frame(self, fund_code, fund_data_path, columns):
+        """读取原始列，特征从特征缓存中取（缓存过期时重新计算），只返回当前分析需要的列"""
+        if fund_code in self.fund_store.codes():
+            raw_df = self.fund_store.read_fund(fund_code, columns=RAW_COLUMNS)
+        else:
+            raw_df = load_fund_frame(fund_data_path, columns=RAW_COLUMNS)
+        processor = FundDataProcessor(raw_df, None, feature_cache=self.feature_cache, code=fund_code)
+        processed_df, _ = processor.cached_process(columns=columns)
+        return processed_df
+
     def show_settings(self):
         st.title("系统设置")
 
@@ -0,0 +1,63 @@
+"""
+面板特征与单只基金的 create_fund_features 一致（包括修改注册表中的窗口之后）
+"""
+import contextlib
+import io
+import numpy as np
+import pandas as pd
+import pytest
+from Benchmarks.bench_panel_features import synthetic_universe
+from utlis.FeatureRegistry import find_feature
+from utlis.FundDataProcessor import FundDataProcessor
+from utlis.PanelFeatures import CODE_COLUMN, build_panel, compute_panel_features, panel_to_frame
+
+
+def per_fund_features(long_df, columns=None):
+    frames = {}
+    for code, group in long_df.groupby(CODE_COLUMN):
+        processor = FundDataProcessor(group.drop(columns=[CODE_COLUMN]), None)
+        with contextlib.redirect_stdout(io.StringIO()):
+            frames[code], _ = processor.create_fund_features(processor.load_and_clean_data(), columns)
+    return frames
+
+
+def panel_features(long_df, columns=None):
+    panel = build_panel(long_df)
+    df = panel_to_frame(panel, compute_panel_features(panel, columns=columns))
+    return {code: group.drop(columns=[CODE_COLUMN]).reset_index(drop=True)
+            for code, group in df.groupby(CODE_COLUMN)}
+
+
+def assert_same_features(long_df, columns=None):
+    expected, actual = per_fund_features(long_df, columns), panel_features(long_df, columns)
+    assert sorted(actual) == sorted(expected)
+    for code, frame in expected.items():
+        pd.testing.assert_frame_equal(actual[code], frame, check_exact=True)
+
+
+@pytest.fixture(scope='module')
+def long_df():
+    # 约1/4的基金历史较短，面板顶部有补齐的格子
+    return synthetic_universe(12, 160, seed=3)
+
+
+def test_default_columns_match_per_fund(long_df):
+    assert_same_features(long_df)
+
+
+def test_requested_windows_match_per_fund(long_df):
+    assert_same_features(long_df, ['MA_7', 'Volatility_9', 'Momentum_3', 'RSI_6', 'Price_Rank_60',
+                                   'max_drawdown_45', 'return_3d', 'volatility_12d', 'BB_Position'])
+
+
+def test_changed_registered_window_matches_per_fund(long_df, monkeypatch):
+    # 布林带和异常波动的窗口写在注册表的输入里，改成10日后面板结果仍与单只基金一致
+    for name in ('BB_Middle', 'BB_Upper', 'BB_Lower', 'abnormal_move'):
+        spec, _ = find_feature(name)
+        monkeypatch.setattr(spec, 'inputs', [column.replace('_20', '_10') for column in spec.inputs])
+    changed = panel_features(long_df, ['BB_Position', 'abnormal_move'])
+    assert_same_features(long_df, ['BB_Position', 'abnormal_move'])
+    monkeypatch.undo()
+    original = panel_features(long_df, ['BB_Position', 'abnormal_move'])
+    code = next(iter(original))
+    assert not np.allclose(changed[code]['BB_Position'], original[code]['BB_Position'])
@@ -0,0 +1,125 @@
+"""
+批量重建基金特征
+对 Data/Funds 目录（或指定的基金代码）逐只调用 FundDataProcessor.all_process，用进程池并行（默认进程数为CPU核数）；
+<output_dir>/_batch_manifest.json 记录每只基金上次处理时输入文件的哈希、特征参数和特征定义的哈希
+（FeatureCache.feature_definition_hash，特征代码修改后全部重建），都没有变化的基金直接跳过；
+结果由 save_fund_frame 先写临时文件再替换，进程崩溃也不会留下写了一半的文件
+"""
+import contextlib
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from utlis.FundStore import STORE_SUFFIX, fund_store_path, list_fund_codes, load_fund_frame
+from utlis.FeatureCache import feature_definition_hash
+from utlis.FeatureRegistry import RAW_COLUMNS
+
+MANIFEST_FILE = '_batch_manifest.json'
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """文件内容的 sha1"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def process_one_fund(code, input_path, output_path, price_rank_windows=(20,), drawdown_windows=(20,)):
+    """
+    在子进程中处理一只基金，返回 (基金代码, 行数, 耗时秒, 输出文件哈希)；FundDataProcessor 的打印不输出
+    只读取原始列重新计算，已处理过的文件也可以作为输入
+    """
+    from utlis.FundDataProcessor import FundDataProcessor
+    start = time.perf_counter()
+    raw_df = load_fund_frame(input_path, columns=RAW_COLUMNS)
+    with contextlib.redirect_stdout(io.StringIO()):
+        df, _ = FundDataProcessor(raw_df, output_path, price_rank_windows, drawdown_windows).all_process()
+    return code, len(df), time.perf_counter() - start, file_digest(output_path)
+
+
+def Batch_Process_Funds(data_dir, codes=None, output_dir=None, max_workers=None, force=False,
+                        price_rank_windows=(20,), drawdown_windows=(20,), suffix=STORE_SUFFIX):
+    """
+    批量重新计算特征
+    data_dir：输入目录（每只基金一个 parquet/csv），codes：基金代码列表，None 表示目录下全部基金
+    output_dir：输出目录，默认与 data_dir 相同（原地重建）
+    max_workers：进程数，默认CPU核数；force：为 True 时不跳过未变化的基金
+    返回 {'processed': [...], 'skipped': [...], 'failed': {code: 错误信息}, 'timings': {code: 耗时秒}, 'elapsed': 耗时秒}
+    """
+    output_dir = output_dir or data_dir
+    os.makedirs(output_dir, exist_ok=True)
+    if codes is None:
+        codes = list_fund_codes(data_dir)
+    max_workers = max_workers or os.cpu_count() or 1
+    config = {'price_rank_windows': list(price_rank_windows), 'drawdown_windows': list(drawdown_windows)}
+    # 特征定义（FeatureRegistry 等的源码）改变时旧的输出都过期
+    config['feature_hash'] = feature_definition_hash(dict(config))
+    manifest = load_manifest(output_dir)
+
+    tasks, skipped, failed = {}, [], {}
+    for code in dict.fromkeys(codes):
+        input_path = fund_store_path(data_dir, code)
+        output_path = os.path.join(output_dir, f'{code}{suffix}')
+        if not os.path.exists(input_path):
+            failed[code] = f"找不到输入文件: {input_path}"
+            continue
+        digest = file_digest(input_path)
+        entry = manifest.get(code)
+        # 输入与上次处理后的输出相同（原地重建）或与上次的输入相同，且参数和特征定义未变时跳过
+        if not force and entry is not None and entry.get('config') == config and os.path.exists(output_path) and \
+                digest in (entry.get('input_sha1'), entry.get('output_sha1')):
+            skipped.append(code)
+            continue
+        tasks[code] = (input_path, output_path, digest)
+
+    processed, timings = [], {}
+    start_time = time.time()
+    print(f"共 {len(tasks) + len(skipped)} 只基金，跳过未变化的 {len(skipped)} 只，使用 {max_workers} 个进程")
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(process_one_fund, code, input_path, output_path,
+                                   price_rank_windows, drawdown_windows): code
+                   for code, (input_path, output_path, _) in tasks.items()}
+        for future in as_completed(futures):
+            code = futures[future]
+            try:
+                _, rows, seconds, output_digest = future.result()
+            except Exception as e:
+                failed[code] = repr(e)
+                print(f"失败 {code}: {e!r}")
+                continue
+            processed.append(code)
+            timings[code] = seconds
+            manifest[code] = {'input_sha1': tasks[code][2], 'output_sha1': output_digest, 'config': config,
+                              'rows': rows, 'seconds': round(seconds, 4), 'processed_at': time.time()}
+            # 每完成一只就保存，进程中断后已完成的基金不会重复处理
+            save_manifest(output_dir, manifest)
+            print(f"完成 {code} ({len(processed)}/{len(tasks)})，{rows} 行，耗时 {seconds:.2f}s")
+
+    elapsed = time.time() - start_time
+    print(f"共处理 {len(processed)} 只基金，跳过 {len(skipped)} 只，失败 {len(failed)} 只，耗时 {elapsed:.1f}s")
+    return {'processed': processed, 'skipped': skipped, 'failed': failed, 'timings': timings, 'elapsed': elapsed}
+
+
+if __name__ == '__main__':
+    Batch_Process_Funds(r"F:\PyCharm_Project\FundStock_Prediction_Website\Data\Funds")
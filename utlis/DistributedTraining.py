@@ -0,0 +1,120 @@
+"""
+多进程 CPU 数据并行训练（torch.distributed，gloo 后端）
+- launch_workers 在本机启动 world_size 个进程，每个进程用 pin_worker_threads 绑定一段互不重叠的 CPU 核心，
+  intra-op 线程数等于分到的核心数（FlowState 的 FFT/einsum 在小批次上多线程的收益很小，多进程各算一部分样本更快）
+- 每个全局批次按窗口下标切成 world_size 段（DeviceWindowLoader 的 rank / world_size），各进程只 gather 自己的一段
+- all_reduce_gradients 把各进程的梯度按样本数加权求和后除以全局样本数，等于单进程在整个批次上的平均损失的梯度，
+  梯度、损失和样本数拼成一个缓冲区只做一次 all_reduce
+"""
+import os
+import socket
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+
+def get_rank():
+    return dist.get_rank() if dist.is_available() and dist.is_initialized() else 0
+
+
+def get_world_size():
+    return dist.get_world_size() if dist.is_available() and dist.is_initialized() else 1
+
+
+def is_main_process():
+    return get_rank() == 0
+
+
+def shard_bounds(count, rank, world_size):
+    """count 个样本中第 rank 段的 [start, end)，各段长度最多相差 1"""
+    return count * rank // world_size, count * (rank + 1) // world_size
+
+
+def worker_cores(rank, world_size, cores=None):
+    """第 rank 个进程分到的 CPU 核心；核心数少于进程数时多个进程共用一个核心"""
+    if cores is None:
+        cores = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count()))
+    if len(cores) < world_size:
+        return [cores[rank % len(cores)]]
+    start, end = shard_bounds(len(cores), rank, world_size)
+    return cores[start:end]
+
+
+def pin_worker_threads(rank, world_size, cores=None):
+    """把当前进程绑定到分到的核心（支持时），intra-op 线程数等于核心数，返回核心列表"""
+    cores = worker_cores(rank, world_size, cores)
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(len(cores))
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # 已经有并行任务运行过时不能再修改
+        pass
+    return cores
+
+
+def find_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def init_worker(rank, world_size, port):
+    os.environ['MASTER_ADDR'] = '127.0.0.1'
+    os.environ['MASTER_PORT'] = str(port)
+    dist.init_process_group('gloo', rank=rank, world_size=world_size)
+
+
+def broadcast_parameters(model):
+    """所有进程使用 rank 0 的初始参数"""
+    for tensor in list(model.parameters()) + list(model.buffers()):
+        dist.broadcast(tensor.data, src=0)
+
+
+def all_reduce_gradients(parameters, loss, count):
+    """
+    loss 为本进程 count 个样本的平均损失（count 为 0 时为 None，本进程没有做反向传播）
+    把各进程的梯度和损失按样本数加权求和后除以全局样本数，结果写回 .grad（所有进程都没有梯度的参数仍为 None），
+    返回 (全局平均损失, 全局样本数)
+    """
+    parameters = [p for p in parameters if p.requires_grad]
+    # 梯度、是否有梯度的标记、损失和样本数在同一次通信中求和，用 float64 累加，样本数精确
+    pieces = [p.grad.reshape(-1).double() * count if p.grad is not None
+              else torch.zeros(p.numel(), dtype=torch.float64) for p in parameters]
+    has_grad = [1.0 if p.grad is not None else 0.0 for p in parameters]
+    loss_sum = loss.item() * count if loss is not None else 0.0
+    pieces.append(torch.tensor(has_grad + [loss_sum, float(count)], dtype=torch.float64))
+    packed = torch.cat(pieces)
+    dist.all_reduce(packed)
+    total = packed[-1].item()
+    flags = packed[-2 - len(parameters):-2].tolist()
+    offset = 0
+    for p, flag in zip(parameters, flags):
+        if flag > 0:
+            p.grad = (packed[offset:offset + p.numel()] / total).to(p.dtype).view_as(p)
+        else:
+            p.grad = None
+        offset += p.numel()
+    return packed[-2].item() / total, int(total)
+
+
+def all_reduce_sum(values):
+    """各进程的 float64 张量逐元素求和（单进程时原样返回）"""
+    values = torch.as_tensor(values, dtype=torch.float64)
+    if get_world_size() > 1:
+        dist.all_reduce(values)
+    return values
+
+
+def launch_workers(worker, world_size, args=()):
+    """
+    启动 world_size 个进程运行 worker(rank, world_size, port, *args)，进程组在 worker 中用 init_worker 建立
+    """
+    port = find_free_port()
+    mp.spawn(worker, args=(world_size, port) + tuple(args), nprocs=world_size, join=True)
+
+
+def barrier():
+    if get_world_size() > 1:
+        dist.barrier()
@@ -0,0 +1,222 @@
+"""
+带版本的特征缓存
+每个缓存文件对应 (基金代码, 原始数据的键, 特征定义的哈希)：
+- 原始数据的键：原始列内容的哈希（默认），或最后日期+行数（raw_key='last_date'，不读全部数据也能判断，但发现不了历史数据的修订）
+- 特征定义的哈希：FeatureRegistry 中每个特征的名字模式/输入/计算函数源码、RollingKernels/RollingStats 的源码、
+  FundDataProcessor 的特征计算代码以及窗口等参数，任何一项改变都会得到新的版本
+<cache_dir>/_feature_cache.json 为清单，记录每个缓存文件的键、最后日期、行数、特征列、大小和最后访问时间；
+键不匹配的缓存不会被使用（需要重建），旧版本按最近最少使用淘汰：每只基金最多保留 max_versions_per_fund 个版本，
+全部缓存不超过 max_bytes
+同一个 FeatureCache 可以被多个线程共用（如网页的多个会话）：写缓存文件和清单时持有线程锁和清单的文件锁
+（多个进程共用目录时互斥），清单每次在锁内重新读取后再修改；命中缓存只在内存中记录访问时间，
+在下一次 put / evict / flush 时写入清单
+"""
+import contextlib
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+import pandas as pd
+from Scrapy_Data.fund_schema import normalize_fund_frame
+from utlis.FundStore import STORE_SUFFIX, file_lock, load_fund_frame, save_fund_frame
+from utlis import FeatureRegistry, RollingKernels, RollingStats
+
+MANIFEST_FILE = '_feature_cache.json'
+LOCK_FILE = '_feature_cache.lock'
+RAW_KEYS = ('hash', 'last_date')
+
+
+def feature_definition_hash(config=None):
+    """特征定义（以及 config 中的参数）的 sha1"""
+    from utlis.FundDataProcessor import FundDataProcessor
+    digest = hashlib.sha1()
+    for spec in FeatureRegistry.FEATURE_REGISTRY:
+        digest.update(repr((spec.pattern, spec.inputs, spec.rolling)).encode('utf-8'))
+        digest.update(inspect.getsource(spec.compute).encode('utf-8'))
+        if spec.panel is not None:
+            digest.update(inspect.getsource(spec.panel).encode('utf-8'))
+    for source in (RollingKernels, RollingStats, FeatureRegistry.compute_features,
+                   FeatureRegistry.compute_features_compact, FeatureRegistry._fill_column,
+                   FundDataProcessor.create_fund_features, FundDataProcessor._create_compact_features):
+        digest.update(inspect.getsource(source).encode('utf-8'))
+    digest.update(json.dumps(config or {}, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def raw_data_hash(raw_df):
+    """原始列内容的 sha1（先统一类型，csv 和 parquet 读出的相同数据哈希相同）"""
+    df = normalize_fund_frame(raw_df[[c for c in FeatureRegistry.RAW_COLUMNS if c in raw_df.columns]])
+    return hashlib.sha1(pd.util.hash_pandas_object(df, index=False).values.tobytes()).hexdigest()
+
+
+class FeatureCache:
+    """特征缓存目录，get_or_build 返回最新的特征数据，缓存过期或不存在时重建"""
+
+    def __init__(self, cache_dir, max_versions_per_fund=2, max_bytes=None, raw_key='hash'):
+        if raw_key not in RAW_KEYS:
+            raise ValueError(f"未知的 raw_key: {raw_key}，可选 {RAW_KEYS}")
+        self.cache_dir = cache_dir
+        self.max_versions_per_fund = max_versions_per_fund
+        self.max_bytes = max_bytes
+        self.raw_key = raw_key
+        self._definition_hashes = {}
+        # 命中缓存后还没有写入清单的访问时间 {entry_id: 时间}
+        self._pending_access = {}
+        self._lock = threading.RLock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # ---------------- 清单 ----------------
+    @property
+    def manifest_path(self):
+        return os.path.join(self.cache_dir, MANIFEST_FILE)
+
+    def load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save_manifest(self, manifest):
+        tmp_path = f'{self.manifest_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    @contextlib.contextmanager
+    def locked(self):
+        """线程锁 + 清单的文件锁（fcntl / msvcrt，都不可用时只有线程锁），锁内可以安全地读-改-写清单"""
+        with self._lock, file_lock(os.path.join(self.cache_dir, LOCK_FILE)):
+            yield
+
+    def _apply_pending_access(self, manifest):
+        for entry_id, accessed in self._pending_access.items():
+            if entry_id in manifest:
+                manifest[entry_id]['last_access'] = max(manifest[entry_id]['last_access'], accessed)
+        self._pending_access.clear()
+
+    def flush(self):
+        """把内存中的访问时间写入清单"""
+        with self.locked():
+            if not self._pending_access:
+                return
+            manifest = self.load_manifest()
+            self._apply_pending_access(manifest)
+            self.save_manifest(manifest)
+
+    # ---------------- 键 ----------------
+    def definition_hash(self, config=None):
+        """同一进程中每种参数只计算一次"""
+        config_key = json.dumps(config or {}, sort_keys=True, ensure_ascii=False)
+        if config_key not in self._definition_hashes:
+            self._definition_hashes[config_key] = feature_definition_hash(config)
+        return self._definition_hashes[config_key]
+
+    def key(self, code, raw_df, config=None):
+        """返回 {'code', 'raw_key', 'last_date', 'feature_hash'}"""
+        last_date = str(pd.to_datetime(raw_df['净值日期']).max().date()) if len(raw_df) else ''
+        if self.raw_key == 'hash':
+            raw = raw_data_hash(raw_df)
+        else:
+            raw = f'{last_date}:{len(raw_df)}'
+        return {'code': str(code), 'raw_key': raw, 'last_date': last_date,
+                'feature_hash': self.definition_hash(config)}
+
+    @staticmethod
+    def entry_id(key):
+        # 文件名中的原始数据键去掉日期中的冒号等字符
+        raw = hashlib.sha1(key['raw_key'].encode('utf-8')).hexdigest()[:16]
+        return f"{key['code']}/{key['feature_hash'][:16]}_{raw}"
+
+    # ---------------- 读写 ----------------
+    def lookup(self, key, manifest=None):
+        """缓存中与 key 完全一致的条目（文件存在），没有时返回 None"""
+        manifest = self.load_manifest() if manifest is None else manifest
+        entry = manifest.get(self.entry_id(key))
+        if entry is None or entry['raw_key'] != key['raw_key'] or entry['feature_hash'] != key['feature_hash']:
+            return None
+        if not os.path.exists(os.path.join(self.cache_dir, entry['path'])):
+            return None
+        return entry
+
+    def is_stale(self, code, raw_df, config=None):
+        return self.lookup(self.key(code, raw_df, config)) is None
+
+    def put(self, key, df, feature_columns):
+        """写入缓存文件并更新清单（同时写入内存中的访问时间），然后淘汰旧版本"""
+        entry_id = self.entry_id(key)
+        path = entry_id + STORE_SUFFIX
+        with self.locked():
+            os.makedirs(os.path.dirname(os.path.join(self.cache_dir, path)), exist_ok=True)
+            save_fund_frame(df, os.path.join(self.cache_dir, path))
+            # 在锁内重新读取清单，不会丢掉其他线程/进程刚写入的条目
+            manifest = self.load_manifest()
+            now = time.time()
+            manifest[entry_id] = {
+                **key, 'path': path, 'rows': len(df), 'feature_columns': list(feature_columns),
+                'bytes': os.path.getsize(os.path.join(self.cache_dir, path)), 'created_at': now, 'last_access': now,
+            }
+            self._apply_pending_access(manifest)
+            self._evict(manifest)
+            self.save_manifest(manifest)
+            return manifest[entry_id]
+
+    def read(self, entry, columns=None):
+        return load_fund_frame(os.path.join(self.cache_dir, entry['path']), columns=columns)
+
+    def get_or_build(self, code, raw_df, build, config=None, columns=None):
+        """
+        返回 (特征数据, feature_columns)
+        build(raw_df) -> (特征数据, feature_columns)，只在缓存过期或不存在时调用
+        columns：只读取这些列（命中缓存时为列投影；重建时从结果中选取）
+        """
+        key = self.key(code, raw_df, config)
+        manifest = self.load_manifest()
+        entry = self.lookup(key, manifest)
+        if entry is not None:
+            # 只在内存中记录访问时间，不在每次命中时重写清单
+            with self._lock:
+                self._pending_access[self.entry_id(key)] = time.time()
+            return self.read(entry, columns), entry['feature_columns']
+        df, feature_columns = build(raw_df)
+        self.put(key, df, feature_columns)
+        return (df if columns is None else df[list(columns)]), feature_columns
+
+    # ---------------- 淘汰 ----------------
+    def evict(self):
+        """在锁内读取清单、写入内存中的访问时间并淘汰，返回被淘汰的条目"""
+        with self.locked():
+            manifest = self.load_manifest()
+            self._apply_pending_access(manifest)
+            removed = self._evict(manifest)
+            self.save_manifest(manifest)
+            return removed
+
+    def _evict(self, manifest):
+        """按最后访问时间淘汰：每只基金超过 max_versions_per_fund 的旧版本，以及超过 max_bytes 的最久未用的缓存"""
+        by_access = sorted(manifest, key=lambda entry_id: manifest[entry_id]['last_access'], reverse=True)
+        kept_per_fund, total_bytes, removed = {}, 0, []
+        for entry_id in by_access:
+            entry = manifest[entry_id]
+            kept = kept_per_fund.get(entry['code'], 0)
+            if (self.max_versions_per_fund is not None and kept >= self.max_versions_per_fund) or \
+                    (self.max_bytes is not None and total_bytes + entry['bytes'] > self.max_bytes):
+                removed.append(entry_id)
+                continue
+            kept_per_fund[entry['code']] = kept + 1
+            total_bytes += entry['bytes']
+        for entry_id in removed:
+            path = os.path.join(self.cache_dir, manifest.pop(entry_id)['path'])
+            if os.path.exists(path):
+                os.remove(path)
+        return removed
+
+
+if __name__ == '__main__':
+    from utlis.FundDataProcessor import FundDataProcessor
+    cache = FeatureCache(r"F:\PyCharm_Project\FundStock_Prediction_Website\Data\FeatureCache")
+    processor = FundDataProcessor(r"F:\PyCharm_Project\FundStock_Prediction_Website\Data\Funds\050026.parquet", None,
+                                  feature_cache=cache, code='050026')
+    df, feature_columns = processor.cached_process()
+    print(df.tail())
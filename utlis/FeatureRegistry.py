@@ -0,0 +1,549 @@
+"""
+特征注册表
+每个特征声明自己的输入列和计算函数（名字可以带窗口参数，例如 MA_<w>、Price_Rank_<w>），
+调用方只请求需要的列，compute_features 只计算这些列依赖闭包中的特征；
+中间结果（以 _ 开头，例如 20日滚动均值 _nav_mean_20）在一次计算中只算一次，MA_20 和 BB_Middle 共用
+滚动均值/标准差/求和类的特征同时声明 rolling=(源序列, 统计量, 系数)，fused=True 时同一源序列的所有窗口
+由 RollingStats 的前缀数组一次算出（float32块），不再逐列调用 pandas rolling
+compute_features_compact 为低内存模式：浮点特征直接写入预先分配的一个 float32 块，状态/标志列为 int8，
+中间结果在最后一次使用后立即释放，填充在块上原地进行
+每个特征同时声明逐行的流式计算（stream，见 utlis/StreamingKernels.py），StreamingFeatureEngine 按注册表逐行推进；
+依赖行顺序的非滚动特征声明多基金面板上的计算（panel，见 utlis/PanelFeatures.py），特征的定义只在这里维护一份
+"""
+import functools
+import re
+import numpy as np
+import pandas as pd
+from Scrapy_Data.fund_schema import FUND_COLUMNS as RAW_COLUMNS
+from utlis.RollingKernels import RANK_FILL, DRAWDOWN_FILL, price_rank, max_drawdown
+from utlis.RollingStats import rolling_stats_block
+from utlis.StreamingKernels import ROLLING_STATES, Diff, Lag, Pointwise, PriceRank, RollingDrawdown, RollingMean
+
+PRICE_RANK_WINDOWS = (20,)
+DRAWDOWN_WINDOWS = (20,)
+# stream=POINTWISE：计算函数对标量同样适用，流式计算时逐行调用
+POINTWISE = 'pointwise'
+
+
+class FeatureSpec:
+    """
+    一个（带参数的）特征：pattern 为名字的正则，命名分组作为整数参数；inputs 中的 {参数} 会被替换
+    rolling：(源序列, 统计量, 系数)，窗口为参数 w，用于合并计算
+    stream：逐行计算的状态，POINTWISE，或 stream(**参数) 返回有 update(*输入) 方法的状态对象；
+    None 时声明了 rolling 的特征使用对应的滚动状态（ROLLING_STATES）
+    panel：面板计算 panel(ctx, *输入 [行, 基金], **参数)，ctx 提供 mask、position（基金内行号）和
+    rolling(values, w, 统计量)（见 utlis/PanelFeatures.py）；None 时声明了 rolling 的特征用 ctx.rolling，
+    逐行的特征把面板展平后直接调用 compute
+    """
+
+    def __init__(self, pattern, inputs, compute, rolling=None, stream=None, panel=None):
+        self.pattern = pattern
+        self.regex = re.compile(pattern + '$')
+        self.inputs = inputs
+        self.compute = compute
+        self.rolling = rolling
+        self.stream = stream
+        self.panel = panel
+
+    @property
+    def pointwise(self):
+        """每行的结果只取决于同一行的输入"""
+        return self.stream == POINTWISE or (isinstance(self.stream, functools.partial)
+                                            and self.stream.func is Pointwise)
+
+    def match(self, name):
+        match = self.regex.match(name)
+        if match is None:
+            return None
+        return {key: int(value) for key, value in match.groupdict().items()}
+
+    def inputs_for(self, params):
+        return [column.format(**params) for column in self.inputs]
+
+    def stream_state(self, params):
+        """新的流式计算状态"""
+        if self.stream == POINTWISE:
+            return Pointwise(self.compute, **params)
+        if self.stream is not None:
+            return self.stream(**params)
+        if self.rolling is not None:
+            return ROLLING_STATES[self.rolling[1]](params['w'])
+        raise KeyError(f"特征 {self.pattern} 没有声明流式计算")
+
+
+FEATURE_REGISTRY = []
+
+
+def register_feature(pattern, inputs, rolling=None, stream=None, panel=None):
+    """注册特征的装饰器，计算函数按 inputs 的顺序接收输入列（Series），参数作为关键字参数"""
+    def decorator(compute):
+        FEATURE_REGISTRY.append(FeatureSpec(pattern, inputs, compute, rolling, stream, panel))
+        return compute
+    return decorator
+
+
+def find_feature(name):
+    for spec in FEATURE_REGISTRY:
+        params = spec.match(name)
+        if params is not None:
+            return spec, params
+    raise KeyError(f"未注册的特征: {name}")
+
+
+def _pointwise(compute):
+    """逐行计算用的标量函数（模块级函数，流式状态可以 pickle）"""
+    return functools.partial(Pointwise, compute)
+
+
+# ---------------- 中间结果 ----------------
+@register_feature(r'_nav_mean_(?P<w>\d+)', ['单位净值'], rolling=('单位净值', 'mean', 1.0))
+def _nav_mean(nav, w):
+    return nav.rolling(window=w).mean()
+
+
+@register_feature(r'_nav_std_(?P<w>\d+)', ['单位净值'], rolling=('单位净值', 'std', 1.0))
+def _nav_std(nav, w):
+    return nav.rolling(window=w).std()
+
+
+@register_feature(r'_abs_growth', ['日增长率'], stream=_pointwise(abs))
+def _abs_growth(growth):
+    return growth.abs()
+
+
+@register_feature(r'_abs_growth_mean_(?P<w>\d+)', ['_abs_growth'], rolling=('_abs_growth', 'mean', 1.0))
+def _abs_growth_mean(abs_growth, w):
+    return abs_growth.rolling(w).mean()
+
+
+@register_feature(r'_abs_growth_std_(?P<w>\d+)', ['_abs_growth'], rolling=('_abs_growth', 'std', 1.0))
+def _abs_growth_std(abs_growth, w):
+    return abs_growth.rolling(w).std()
+
+
+def _nav_delta_panel(ctx, nav):
+    delta = np.full(nav.shape, np.nan)
+    delta[1:] = nav[1:] - nav[:-1]
+    return delta
+
+
+@register_feature(r'_nav_delta', ['单位净值'], stream=Diff, panel=_nav_delta_panel)
+def _nav_delta(nav):
+    return nav.diff()
+
+
+# ---------------- 1. 技术指标 ----------------
+@register_feature(r'MA_(?P<w>\d+)', ['_nav_mean_{w}'], stream=POINTWISE)
+def _ma(nav_mean, w):
+    return nav_mean
+
+
+@register_feature(r'Volatility_(?P<w>\d+)', ['日增长率'], rolling=('日增长率', 'std', 1.0))
+def _volatility(growth, w):
+    return growth.rolling(window=w).std()
+
+
+# ---------------- 2. 动量指标 ----------------
+class _MomentumState:
+    """Momentum_<w> 的流式计算"""
+
+    def __init__(self, w):
+        self.lag = Lag(w)
+
+    def update(self, nav):
+        momentum = nav / self.lag.update(nav) - 1
+        return 0.0 if momentum != momentum else momentum
+
+
+def _momentum_panel(ctx, nav, w):
+    shifted = np.full(nav.shape, np.nan)
+    shifted[w:] = nav[:-w]
+    momentum = nav / shifted - 1
+    return np.where(np.isnan(momentum), 0.0, momentum)
+
+
+@register_feature(r'Momentum_(?P<w>\d+)', ['单位净值'], stream=_MomentumState, panel=_momentum_panel)
+def _momentum(nav, w):
+    return (nav / nav.shift(w) - 1).fillna(0)
+
+
+# ---------------- 3. 相对强弱指标 ----------------
+class _RSIState:
+    """RSI_<w> 的流式计算：涨幅和跌幅各一个滚动均值"""
+
+    def __init__(self, w):
+        self.gain = RollingMean(w)
+        self.loss = RollingMean(w)
+
+    def update(self, delta):
+        gain = self.gain.update(delta if delta > 0 else 0.0)
+        loss = self.loss.update(-(delta if delta < 0 else 0.0))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rsi = 100 - (100 / (1 + np.float64(gain) / np.float64(loss)))
+        return 50.0 if rsi != rsi else float(rsi)
+
+
+def _rsi_panel(ctx, delta, w):
+    # delta 为NaN时 gain/loss 为0（与单只基金相同），但补齐的格子不能算作观测值
+    gain = np.where(ctx.mask, np.where(delta > 0, delta, 0), np.nan)
+    loss = np.where(ctx.mask, -np.where(delta < 0, delta, 0), np.nan)
+    rsi = 100 - (100 / (1 + ctx.rolling(gain, w, 'mean') / ctx.rolling(loss, w, 'mean')))
+    return np.where(np.isnan(rsi), 50.0, rsi)
+
+
+@register_feature(r'RSI_(?P<w>\d+)', ['_nav_delta'], stream=_RSIState, panel=_rsi_panel)
+def _rsi(delta, w):
+    gain = (delta.where(delta > 0, 0)).rolling(window=w).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=w).mean()
+    rs = gain / loss
+    rsi = 100 - (100 / (1 + rs))
+    return rsi.fillna(50)  # 填充NaN为中性值50
+
+
+# ---------------- 4. 布林带 ----------------
+@register_feature(r'BB_Middle', ['_nav_mean_20'], stream=POINTWISE)
+def _bb_middle(nav_mean):
+    return nav_mean
+
+
+@register_feature(r'BB_Upper', ['BB_Middle', '_nav_std_20'], stream=POINTWISE)
+def _bb_upper(bb_middle, bb_std):
+    return bb_middle + 2 * bb_std
+
+
+@register_feature(r'BB_Lower', ['BB_Middle', '_nav_std_20'], stream=POINTWISE)
+def _bb_lower(bb_middle, bb_std):
+    return bb_middle - 2 * bb_std
+
+
+def _bb_position_value(nav, bb_upper, bb_lower):
+    bb_range = bb_upper - bb_lower
+    return (nav - bb_lower) / (bb_range if bb_range != 0 else 1)
+
+
+@register_feature(r'BB_Position', ['单位净值', 'BB_Upper', 'BB_Lower'], stream=_pointwise(_bb_position_value))
+def _bb_position(nav, bb_upper, bb_lower):
+    # 避免除零错误
+    bb_range = bb_upper - bb_lower
+    return (nav - bb_lower) / bb_range.where(bb_range != 0, 1)
+
+
+# ---------------- 5. 价格排名 ----------------
+def _price_rank_panel(ctx, nav, w):
+    # 面板中窗口不足的行会包含补齐的格子，按单只基金的默认值填充
+    return np.where(ctx.position < w - 1, RANK_FILL, price_rank(nav, w))
+
+
+@register_feature(r'Price_Rank_(?P<w>\d+)', ['单位净值'], stream=lambda w: PriceRank(w), panel=_price_rank_panel)
+def _price_rank(nav, w):
+    return pd.Series(price_rank(nav.values, w), index=nav.index)
+
+
+# ---------------- 6. 时间特征 ----------------
+# 流式计算时日期为 pd.Timestamp
+def _day_of_week_value(date):
+    return date.dayofweek
+
+
+def _month_value(date):
+    return date.month
+
+
+def _quarter_value(date):
+    return date.quarter
+
+
+def _is_month_end_value(date):
+    return int(date.is_month_end)
+
+
+def _is_quarter_end_value(date):
+    return int(date.is_quarter_end)
+
+
+@register_feature(r'day_of_week', ['净值日期'], stream=_pointwise(_day_of_week_value))
+def _day_of_week(dates):
+    return dates.dt.dayofweek
+
+
+@register_feature(r'month', ['净值日期'], stream=_pointwise(_month_value))
+def _month(dates):
+    return dates.dt.month
+
+
+@register_feature(r'quarter', ['净值日期'], stream=_pointwise(_quarter_value))
+def _quarter(dates):
+    return dates.dt.quarter
+
+
+@register_feature(r'is_month_end', ['净值日期'], stream=_pointwise(_is_month_end_value))
+def _is_month_end(dates):
+    return dates.dt.is_month_end.astype(int)
+
+
+@register_feature(r'is_quarter_end', ['净值日期'], stream=_pointwise(_is_quarter_end_value))
+def _is_quarter_end(dates):
+    return dates.dt.is_quarter_end.astype(int)
+
+
+# ---------------- 7. 交易状态组合特征 ----------------
+@register_feature(r'trading_status', ['申购状态', '赎回状态'], stream=POINTWISE)
+def _trading_status(subscribe, redeem):
+    return subscribe + redeem
+
+
+# ---------------- 8. 异常波动检测 ----------------
+def _abnormal_move_value(abs_growth, rolling_mean, rolling_std):
+    return int(abs_growth > rolling_mean + 2 * rolling_std or abs_growth > 5)
+
+
+@register_feature(r'abnormal_move', ['_abs_growth', '_abs_growth_mean_20', '_abs_growth_std_20'],
+                  stream=_pointwise(_abnormal_move_value))
+def _abnormal_move(abs_growth, rolling_mean, rolling_std):
+    # 或者绝对值大于5%
+    return ((abs_growth > rolling_mean + 2 * rolling_std) | (abs_growth > 5)).astype(int)
+
+
+# ---------------- 9. 收益率特征 ----------------
+@register_feature(r'return_1d', ['日增长率'], stream=POINTWISE)
+def _return_1d(growth):
+    return growth / 100  # 转换为小数
+
+
+@register_feature(r'return_(?P<w>\d+)d', ['return_1d'], rolling=('日增长率', 'sum', 0.01))
+def _return_nd(return_1d, w):
+    return return_1d.rolling(w).sum()
+
+
+# ---------------- 10. 波动率特征 ----------------
+@register_feature(r'volatility_(?P<w>\d+)d', ['return_1d'], rolling=('日增长率', 'std', 0.01))
+def _volatility_nd(return_1d, w):
+    return return_1d.rolling(w).std()
+
+
+# ---------------- 11. 最大回撤 ----------------
+def _max_drawdown_panel(ctx, nav, w):
+    return np.where(ctx.position < w - 1, DRAWDOWN_FILL, max_drawdown(nav, w))
+
+
+@register_feature(r'max_drawdown_(?P<w>\d+)', ['单位净值'], stream=lambda w: RollingDrawdown(w),
+                  panel=_max_drawdown_panel)
+def _max_drawdown(nav, w):
+    return pd.Series(max_drawdown(nav.values, w), index=nav.index)
+
+
+# ---------------- 周期性编码的时间特征 ----------------
+def _day_sin_value(date):
+    return float(np.sin(2 * np.pi * date.dayofweek / 6))
+
+
+def _day_cos_value(date):
+    return float(np.cos(2 * np.pi * date.dayofweek / 6))
+
+
+def _month_sin_value(date):
+    return float(np.sin(2 * np.pi * date.month / 12))
+
+
+def _month_cos_value(date):
+    return float(np.cos(2 * np.pi * date.month / 12))
+
+
+@register_feature(r'day_sin', ['净值日期'], stream=_pointwise(_day_sin_value))
+def _day_sin(dates):
+    return np.sin(2 * np.pi * dates.dt.dayofweek / 6)
+
+
+@register_feature(r'day_cos', ['净值日期'], stream=_pointwise(_day_cos_value))
+def _day_cos(dates):
+    return np.cos(2 * np.pi * dates.dt.dayofweek / 6)
+
+
+@register_feature(r'month_sin', ['净值日期'], stream=_pointwise(_month_sin_value))
+def _month_sin(dates):
+    return np.sin(2 * np.pi * dates.dt.month / 12)
+
+
+@register_feature(r'month_cos', ['净值日期'], stream=_pointwise(_month_cos_value))
+def _month_cos(dates):
+    return np.cos(2 * np.pi * dates.dt.month / 12)
+
+
+# ---------------- 特征列表 ----------------
+TIME_COLUMNS = ['day_of_week', 'month', 'quarter', 'is_month_end', 'is_quarter_end']
+CYCLIC_COLUMNS = ['day_sin', 'day_cos', 'month_sin', 'month_cos']
+
+
+def default_feature_columns(price_rank_windows=PRICE_RANK_WINDOWS, drawdown_windows=DRAWDOWN_WINDOWS):
+    """训练使用的特征列（默认窗口时为32列）"""
+    return [
+        '单位净值', '累计净值', '日增长率', '申购状态', '赎回状态', '分红送配',
+        'MA_5', 'MA_10', 'MA_20', 'MA_30', 'Volatility_5', 'Volatility_20', 'Momentum_5', 'Momentum_10',
+        'RSI_14', 'BB_Middle', 'BB_Upper', 'BB_Lower', 'BB_Position',
+        *[f'Price_Rank_{window}' for window in price_rank_windows], 'trading_status', 'abnormal_move',
+        'return_1d', 'return_5d', 'return_20d', 'volatility_5d', 'volatility_20d',
+        *[f'max_drawdown_{window}' for window in drawdown_windows],
+        *CYCLIC_COLUMNS,
+    ]
+
+
+def stored_feature_columns(price_rank_windows=PRICE_RANK_WINDOWS, drawdown_windows=DRAWDOWN_WINDOWS):
+    """保存到 Data/Funds 的派生列（按保存的列顺序，包括原始的时间特征）"""
+    columns = default_feature_columns(price_rank_windows, drawdown_windows)[len(RAW_COLUMNS) - 1:]
+    trading_index = columns.index('trading_status')
+    return columns[:trading_index] + TIME_COLUMNS + columns[trading_index:]
+
+
+FEATURE_COLUMNS = default_feature_columns()
+# 低内存模式下保存为 int8 的状态/标志/日期分量列，其余派生列为 float32
+COMPACT_INT_COLUMNS = ('申购状态', '赎回状态', '分红送配', 'trading_status', 'abnormal_move',
+                       'day_of_week', 'month', 'quarter', 'is_month_end', 'is_quarter_end')
+
+
+def _inputs(spec, params, fused):
+    if fused and spec.rolling is not None:
+        return [spec.rolling[0]]
+    return spec.inputs_for(params)
+
+
+def resolve_features(columns, available=(), fused=False):
+    """按依赖顺序返回计算 columns 需要的全部特征（不包括 available 中已有的列）"""
+    order, visiting = [], set()
+    done = set(available)
+
+    def visit(name):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"特征存在循环依赖: {name}")
+        visiting.add(name)
+        spec, params = find_feature(name)
+        for column in _inputs(spec, params, fused):
+            visit(column)
+        visiting.discard(name)
+        done.add(name)
+        order.append(name)
+
+    for column in columns:
+        visit(column)
+    return order
+
+
+def rolling_feature_block(source, names, dtype=np.float32):
+    """
+    同一源序列上的多个滚动特征（都声明了 rolling），一次算出，返回 [行, len(names)] 的 dtype 块
+    source：源序列的值
+    """
+    requests = []
+    for name in names:
+        spec, params = find_feature(name)
+        _, stat, scale = spec.rolling
+        requests.append((stat, params['w'], scale))
+    return rolling_stats_block(source, requests, dtype=dtype)
+
+
+def compute_features(df, columns, fill=True, fused=False):
+    """
+    只计算 columns 及其依赖，返回只包含 columns 的DataFrame（索引与 df 相同）
+    df 只需要包含原始列（RAW_COLUMNS）；fill 为 True 时与 create_fund_features 相同做 ffill().bfill()
+    fused：滚动均值/标准差/求和按源序列合并计算（float32，与 pandas rolling 的差别在 float32 精度以内）
+    """
+    cache = {column: df[column] for column in RAW_COLUMNS if column in df.columns}
+    order = resolve_features(columns, available=cache, fused=fused)
+    for name in order:
+        if name in cache:
+            continue
+        spec, params = find_feature(name)
+        if fused and spec.rolling is not None:
+            # 同一源序列的全部滚动特征一起算
+            source = spec.rolling[0]
+            names = [n for n in order if n not in cache and find_feature(n)[0].rolling is not None
+                     and find_feature(n)[0].rolling[0] == source]
+            block = rolling_feature_block(cache[source].values, names)
+            for i, block_name in enumerate(names):
+                cache[block_name] = pd.Series(block[:, i], index=df.index)
+            continue
+        cache[name] = spec.compute(*[cache[column] for column in spec.inputs_for(params)], **params)
+    result = pd.DataFrame({column: cache[column] for column in columns}, index=df.index)
+    if fill:
+        result = result.ffill().bfill()
+    return result
+
+
+def _fill_column(values):
+    """一维数组原地 ffill 再 bfill（与 Series.ffill().bfill() 相同）"""
+    valid = ~np.isnan(values)
+    if valid.all() or not valid.any():
+        return
+    index = np.where(valid, np.arange(len(values)), 0)
+    np.maximum.accumulate(index, out=index)
+    first = np.argmax(valid)
+    index[:first] = first
+    values[:] = values[index]
+
+
+def compute_features_compact(df, columns, fused=False):
+    """
+    低内存版本的 compute_features(df, columns, fill=True)：
+    columns 中的浮点特征写入一个预先分配的 [行, 列] float32 块（DataFrame 直接使用这个块，不再复制），
+    COMPACT_INT_COLUMNS 中的列为 int8；每个中间结果在最后一个使用它的特征算完后释放
+    """
+    cache = {column: df[column] for column in RAW_COLUMNS if column in df.columns}
+    order = resolve_features(columns, available=cache, fused=fused)
+    float_columns = [column for column in columns if column not in COMPACT_INT_COLUMNS]
+    float_index = {column: i for i, column in enumerate(float_columns)}
+    block = np.empty((len(df), len(float_columns)), dtype=np.float32)
+    int_values = {}
+
+    # 每个中间结果最后一次被使用的位置
+    last_use = {}
+    for step, name in enumerate(order):
+        spec, params = find_feature(name)
+        for column in _inputs(spec, params, fused):
+            last_use[column] = step
+    wanted = set(columns)
+
+    def store(name, values):
+        if name in float_index:
+            block[:, float_index[name]] = values
+        elif name in wanted:
+            int_values[name] = np.asarray(values).astype(np.int8)
+
+    for column in wanted.intersection(cache):
+        store(column, cache[column])
+    computed = set(cache)
+    for step, name in enumerate(order):
+        if name not in computed:
+            spec, params = find_feature(name)
+            if fused and spec.rolling is not None:
+                source = spec.rolling[0]
+                names = [n for n in order if n not in computed and find_feature(n)[0].rolling is not None
+                         and find_feature(n)[0].rolling[0] == source]
+                rolling_block = rolling_feature_block(cache[source].values, names)
+                for i, block_name in enumerate(names):
+                    cache[block_name] = pd.Series(rolling_block[:, i], index=df.index, copy=False)
+                    store(block_name, rolling_block[:, i])
+                computed.update(names)
+            else:
+                cache[name] = spec.compute(*[cache[column] for column in spec.inputs_for(params)], **params)
+                store(name, cache[name].values)
+                computed.add(name)
+        # 之后不再需要的中间结果立即释放（原始列由 df 持有）
+        for column in [c for c in cache if last_use.get(c, -1) <= step and c not in RAW_COLUMNS]:
+            del cache[column]
+
+    for i in range(block.shape[1]):
+        _fill_column(block[:, i])
+    result = pd.DataFrame(block, columns=float_columns, index=df.index, copy=False)
+    for position, column in enumerate(columns):
+        if column in int_values:
+            result.insert(position, column, int_values[column])
+    return result
+
+
+def ensure_features(df, columns):
+    """df 中缺少的 columns 从原始列计算补上（已有的列不重新计算）"""
+    missing = [column for column in columns if column not in df.columns]
+    if not missing:
+        return df
+    return pd.concat([df, compute_features(df, missing)], axis=1)
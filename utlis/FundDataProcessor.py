@@ -1,167 +1,100 @@
+import os
 import pandas as pd
 import numpy as np
 import torch
 from sklearn.preprocessing import StandardScaler
 import warnings
+from Scrapy_Data.fund_schema import normalize_fund_frame
+from utlis.FundStore import load_fund_frame, save_fund_frame
+from utlis.FeatureRegistry import RAW_COLUMNS, TIME_COLUMNS, compute_features, compute_features_compact, \
+    default_feature_columns, stored_feature_columns
+from utlis.StreamingFeatures import StreamingFeatureEngine
 
 warnings.filterwarnings('ignore')
 pd.set_option('display.max_colwidth', None)
 pd.set_option('display.max_columns', None)  # 显示所有列
 pd.set_option('display.width', None)  # 不限制显示宽度
 
+# 特征计算的最长回看窗口（MA_30），增量计算时需要保留的历史行数
+FEATURE_LOOKBACK = 30
+
+
 class FundDataProcessor:
-    def __init__(self,data_path_or_df,save_path):
+    def __init__(self,data_path_or_df,save_path,price_rank_windows=(20,),drawdown_windows=(20,),fused_rolling=False,
+                 low_memory=False,feature_cache=None,code=None):
         self.data_path_or_df = data_path_or_df
         self.save_path = save_path
+        # FeatureCache：all_process / cached_process 只在缓存过期时重新计算；code 默认取数据文件名
+        self.feature_cache = feature_cache
+        self.code = code
+        # 为 True 时滚动均值/标准差/求和由前缀数组合并计算（float32结果）
+        self.fused_rolling = fused_rolling
+        # 为 True 时不复制中间的DataFrame，派生特征保存在一个 float32 块中，状态/标志列为 int8
+        self.low_memory = low_memory
+        # Price_Rank_<w> / max_drawdown_<w> 的窗口，例如 (20, 60, 120, 250)
+        self.price_rank_windows = tuple(price_rank_windows)
+        self.drawdown_windows = tuple(drawdown_windows)
         # self.scaler = StandardScaler()
         self.feature_columns = []
 
-    def load_and_clean_data(self):
-        """加载和清洗数据"""
-        if isinstance(self.data_path_or_df, str):
-            df = pd.read_csv(self.data_path_or_df)
-        else:
-            df = self.data_path_or_df.copy()
+    @property
+    def feature_lookback(self):
+        """增量计算时需要保留的历史行数（包括更长的排名/回撤窗口）"""
+        return max(FEATURE_LOOKBACK, *self.price_rank_windows, *self.drawdown_windows)
+
+    def feature_config(self):
+        """影响特征结果的参数，作为特征缓存版本的一部分"""
+        return {'price_rank_windows': list(self.price_rank_windows), 'drawdown_windows': list(self.drawdown_windows),
+                'fused_rolling': self.fused_rolling, 'low_memory': self.low_memory}
 
-        # 确保日期格式
-        df['净值日期'] = pd.to_datetime(df['净值日期'])
-        df = df.sort_values('净值日期').reset_index(drop=True)
+    def load_raw_data(self):
+        if isinstance(self.data_path_or_df, str):
+            return load_fund_frame(self.data_path_or_df)
+        return self.data_path_or_df
 
-        # 处理数值字段
-        df['单位净值'] = df['单位净值'].astype(float)
-        df['累计净值'] = df['累计净值'].astype(float)
-        df['日增长率'] = df['日增长率'].str.rstrip('%').astype(float)
+    def load_and_clean_data(self, df=None):
+        """加载和清洗数据，df 为 None 时从 data_path_or_df 读取"""
+        if df is None:
+            df = self.load_raw_data()
 
-        # 处理分类变量
-        df['申购状态'] = df['申购状态'].map({'开放申购': 1, '暂停申购': 0}).fillna(0)
-        df['赎回状态'] = df['赎回状态'].map({'开放赎回': 1, '暂停赎回': 0}).fillna(0)
-        df['分红送配'] = df['分红送配'].notna().astype(int)  # 是否有分红
+        # 所有字段的类型转换和按日期排序只在这里做一次（不会修改传入的DataFrame）
+        df = normalize_fund_frame(df)
 
         # 检查缺失值
         print(f"数据总行数: {len(df)}")
         print(f"缺失值统计:\n{df.isnull().sum()}")
 
         # 填充可能的缺失值（使用前向填充）
-        df = df.ffill()
+        if self.low_memory:
+            # normalize_fund_frame 返回的是新的DataFrame，原地填充不会修改传入的数据
+            df.ffill(inplace=True)
+        else:
+            df = df.ffill()
 
         return df
 
-    def create_fund_features(self,df_data):
-        """创建基金特有的特征 - 修复版本"""
-        df = df_data.copy()
-
-        # 1. 技术指标 - 使用向量化操作避免索引问题
-        df['MA_5'] = df['单位净值'].rolling(window=5).mean()
-        df['MA_10'] = df['单位净值'].rolling(window=10).mean()
-        df['MA_20'] = df['单位净值'].rolling(window=20).mean()
-        df['MA_30'] = df['单位净值'].rolling(window=30).mean()
-        df['Volatility_5'] = df['日增长率'].rolling(window=5).std()
-        df['Volatility_20'] = df['日增长率'].rolling(window=20).std()
-
-        # 2. 动量指标 - 使用shift避免apply
-        df['Momentum_5'] = (df['单位净值'] / df['单位净值'].shift(5) - 1).fillna(0)
-        df['Momentum_10'] = (df['单位净值'] / df['单位净值'].shift(10) - 1).fillna(0)
-
-        # 3. 相对强弱指标 (RSI) - 修复版本
-        def calculate_rsi(prices, window=14):
-            delta = prices.diff()
-            gain = (delta.where(delta > 0, 0)).rolling(window=window).mean()
-            loss = (-delta.where(delta < 0, 0)).rolling(window=window).mean()
-            rs = gain / loss
-            rsi = 100 - (100 / (1 + rs))
-            return rsi.fillna(50)  # 填充NaN为中性值50
-
-        df['RSI_14'] = calculate_rsi(df['单位净值'])
-
-        # 4. 布林带
-        df['BB_Middle'] = df['单位净值'].rolling(window=20).mean()
-        bb_std = df['单位净值'].rolling(window=20).std()
-        df['BB_Upper'] = df['BB_Middle'] + 2 * bb_std
-        df['BB_Lower'] = df['BB_Middle'] - 2 * bb_std
-        # 避免除零错误
-        bb_range = df['BB_Upper'] - df['BB_Lower']
-        df['BB_Position'] = (df['单位净值'] - df['BB_Lower']) / bb_range.where(bb_range != 0, 1)
-
-        # 5. 价格排名特征 - 修复版本（避免使用apply和负索引）
-        def calculate_price_rank(series, window=20):
-            """计算价格在滚动窗口中的相对位置"""
-            ranks = []
-            for i in range(len(series)):
-                if i < window - 1:
-                    ranks.append(0.5)  # 窗口不足时使用中性值
-                else:
-                    window_data = series.iloc[i - window + 1:i + 1]
-                    min_val = window_data.min()
-                    max_val = window_data.max()
-                    current_val = series.iloc[i]
-
-                    if max_val != min_val:
-                        rank = (current_val - min_val) / (max_val - min_val)
-                    else:
-                        rank = 0.5
-                    ranks.append(rank)
-            return pd.Series(ranks, index=series.index)
-
-        df['Price_Rank_20'] = calculate_price_rank(df['单位净值'], window=20)
-
-        # 6. 时间特征
-        df['day_of_week'] = df['净值日期'].dt.dayofweek
-        df['month'] = df['净值日期'].dt.month
-        df['quarter'] = df['净值日期'].dt.quarter
-        df['is_month_end'] = df['净值日期'].dt.is_month_end.astype(int)
-        df['is_quarter_end'] = df['净值日期'].dt.is_quarter_end.astype(int)
-
-        # 7. 交易状态组合特征
-        df['trading_status'] = df['申购状态'] + df['赎回状态']
-
-        # 8. 异常波动检测 - 修复版本
-        rolling_mean = df['日增长率'].abs().rolling(20).mean()
-        rolling_std = df['日增长率'].abs().rolling(20).std()
-        df['abnormal_move'] = ((df['日增长率'].abs() > rolling_mean + 2 * rolling_std) |
-                               (df['日增长率'].abs() > 5)).astype(int)  # 或者绝对值大于5%
-
-        # 9. 收益率特征
-        df['return_1d'] = df['日增长率'] / 100  # 转换为小数
-        df['return_5d'] = df['return_1d'].rolling(5).sum()
-        df['return_20d'] = df['return_1d'].rolling(20).sum()
-
-        # 10. 波动率特征
-        df['volatility_5d'] = df['return_1d'].rolling(5).std()
-        df['volatility_20d'] = df['return_1d'].rolling(20).std()
-
-        # 11. 最大回撤
-        def calculate_max_drawdown(series, window=20):
-            """计算滚动最大回撤"""
-            drawdowns = []
-            for i in range(len(series)):
-                if i < window - 1:
-                    drawdowns.append(0)
-                else:
-                    window_data = series.iloc[i - window + 1:i + 1]
-                    peak = window_data.expanding().max()
-                    drawdown = (window_data - peak) / peak
-                    max_drawdown = drawdown.min()
-                    drawdowns.append(max_drawdown)
-            return pd.Series(drawdowns, index=series.index)
-
-        df['max_drawdown_20'] = calculate_max_drawdown(df['单位净值'], window=20)
-
-        # 填充NaN值
-        df = df.ffill().bfill()
-        # 选择最终特征列
-        feature_columns = [
-            '单位净值', '累计净值', '日增长率', '申购状态', '赎回状态', '分红送配',
-            'MA_5','MA_10', 'MA_20', 'MA_30', 'Volatility_5', 'Volatility_20', 'Momentum_5', 'Momentum_10',
-            'RSI_14', 'BB_Middle', 'BB_Upper', 'BB_Lower', 'BB_Position',
-            'Price_Rank_20', 'trading_status', 'abnormal_move',
-            'return_1d', 'return_5d', 'return_20d', 'volatility_5d', 'volatility_20d',
-            'max_drawdown_20'
-        ]
-
-        # 添加周期性编码的时间特征
-        time_features = self.create_cyclic_time_features(df['净值日期'])
-        df = pd.concat([df, time_features], axis=1)
-        feature_columns.extend(time_features.columns.tolist())
+    def create_fund_features(self,df_data,columns=None):
+        """
+        创建基金特有的特征
+        columns：只计算这些特征列（及其依赖），None 表示全部特征（保存到 Data/Funds 的完整列）
+        """
+        if columns is None:
+            output_columns = stored_feature_columns(self.price_rank_windows, self.drawdown_windows)
+            feature_columns = default_feature_columns(self.price_rank_windows, self.drawdown_windows)
+        else:
+            output_columns = [c for c in columns if c not in RAW_COLUMNS]
+            feature_columns = list(columns)
+
+        # 已处理过的数据再次计算时先去掉旧的派生列
+        df = df_data.drop(columns=[c for c in output_columns if c in df_data.columns])
+        if self.low_memory:
+            df = self._create_compact_features(df, output_columns)
+        else:
+            features = compute_features(df, output_columns, fill=False, fused=self.fused_rolling)
+            df = pd.concat([df, features], axis=1)
+
+            # 填充NaN值
+            df = df.ffill().bfill()
 
         self.feature_columns = feature_columns
 
@@ -171,20 +104,92 @@ class FundDataProcessor:
         # return df
         return df, feature_columns
 
-    def create_cyclic_time_features(self, dates):
-        """创建周期性的时间特征"""
-        features = pd.DataFrame(index=dates.index)
-
-        # 周期性编码
-        features['day_sin'] = np.sin(2 * np.pi * dates.dt.dayofweek / 6)
-        features['day_cos'] = np.cos(2 * np.pi * dates.dt.dayofweek / 6)
-        features['month_sin'] = np.sin(2 * np.pi * dates.dt.month / 12)
-        features['month_cos'] = np.cos(2 * np.pi * dates.dt.month / 12)
-
+    def _create_compact_features(self, df, output_columns):
+        """低内存模式：特征块已经填充过，原始列插到前面（净值日期只保存这一份）"""
+        features = compute_features_compact(df, output_columns, fused=self.fused_rolling)
+        for position, column in enumerate(df.columns):
+            values = df[column]
+            if values.hasnans:
+                values = values.ffill().bfill()
+            features.insert(position, column, values.values)
         return features
 
+    def cached_process(self, columns=None):
+        """
+        从 feature_cache 读取特征，原始数据或特征定义变化（缓存过期）时重新计算并写入缓存
+        columns：只返回这些列
+        """
+        code = self.code
+        if code is None:
+            if not isinstance(self.data_path_or_df, str):
+                raise ValueError("data_path_or_df 为DataFrame时需要指定 code")
+            code = os.path.splitext(os.path.basename(self.data_path_or_df))[0]
+        df, feature_columns = self.feature_cache.get_or_build(
+            code, self.load_raw_data(), lambda raw_df: self.create_fund_features(self.load_and_clean_data(raw_df)),
+            config=self.feature_config(), columns=columns)
+        self.feature_columns = feature_columns
+        return df, feature_columns
+
     def all_process(self):
-        df = self.load_and_clean_data()
-        df, feature_columns = self.create_fund_features(df)
-        df.to_csv(self.save_path)
+        if self.feature_cache is not None:
+            df, feature_columns = self.cached_process()
+        else:
+            df = self.load_and_clean_data()
+            df, feature_columns = self.create_fund_features(df)
+        # save_path 为 .parquet 时保存为列式存储，.csv 时保存为不带索引的csv
+        save_fund_frame(df, self.save_path)
+        return df, feature_columns
+
+    def incremental_process(self):
+        """
+        增量处理：data_path_or_df 只包含新的原始数据，save_path 为已处理过的历史数据
+        只取历史末尾 feature_lookback 行与新数据拼接计算特征，再把新行追加到历史数据
+        """
+        history_df = load_fund_frame(self.save_path)
+        new_df = self.load_and_clean_data()
+        new_df = new_df[new_df['净值日期'] > history_df['净值日期'].max()]
+        if new_df.empty:
+            return history_df, self.feature_columns
+
+        tail_df = history_df[RAW_COLUMNS].tail(self.feature_lookback)
+        combined_df = pd.concat([tail_df, new_df], ignore_index=True)
+        combined_df, feature_columns = self.create_fund_features(combined_df)
+
+        # 只保留新数据对应的特征行
+        new_features = combined_df.iloc[len(tail_df):]
+        df = pd.concat([history_df, new_features[history_df.columns]], ignore_index=True)
+        save_fund_frame(df, self.save_path)
+        return df, feature_columns
+
+    def streaming_process(self, state_path=None):
+        """
+        流式增量处理：data_path_or_df 只包含新的原始数据，save_path 为已处理过的历史数据
+        用 StreamingFeatureEngine 逐行推进，每条新数据只做常数次的状态更新；
+        state_path 保存引擎状态，状态的最后日期与历史数据一致时直接恢复，否则用历史数据末尾重新初始化
+        """
+        history_df = load_fund_frame(self.save_path)
+        new_df = self.load_and_clean_data()
+        new_df = new_df[new_df['净值日期'] > history_df['净值日期'].max()]
+        if new_df.empty:
+            return history_df, self.feature_columns
+
+        engine = None
+        if state_path is not None and os.path.exists(state_path):
+            engine = StreamingFeatureEngine.load_state(state_path)
+            # 窗口参数不同或旧版本引擎的状态（没有 columns）也重新初始化
+            if engine.last_date != history_df['净值日期'].max() or \
+                    getattr(engine, 'columns', None) != stored_feature_columns(self.price_rank_windows,
+                                                                               self.drawdown_windows):
+                engine = None
+        if engine is None:
+            engine = StreamingFeatureEngine(self.price_rank_windows, self.drawdown_windows).seed(history_df)
+
+        new_features = engine.process(new_df, columns=history_df.columns)
+        new_features = new_features.astype(history_df.dtypes.to_dict())
+        df = pd.concat([history_df, new_features], ignore_index=True)
+        save_fund_frame(df, self.save_path)
+        if state_path is not None:
+            engine.save_state(state_path)
+        feature_columns = [c for c in history_df.columns if c != '净值日期' and c not in TIME_COLUMNS]
+        self.feature_columns = feature_columns
         return df, feature_columns
@@ -0,0 +1,118 @@
+"""
+基金数据存储
+Data/Funds 下每只基金一个 Parquet 文件（列式存储，zstd 压缩，不保存pandas索引），读取时可以只读需要的列；
+兼容旧的 csv 文件（第一列是pandas索引），用 import_csv / export_csv / migrate_csv_dir 在两种格式之间转换
+"""
+import contextlib
+import os
+import threading
+import pandas as pd
+
+STORE_SUFFIX = '.parquet'
+DEFAULT_COMPRESSION = 'zstd'
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """path 上的独占文件锁（fcntl / msvcrt，都不可用时不加锁），多个进程读-改-写同一个文件时互斥"""
+    with open(path, 'a+b') as lock_file:
+        try:
+            import fcntl
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        except ImportError:
+            try:
+                import msvcrt
+                lock_file.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        # LK_LOCK 重试约 10 秒后失败，继续等待
+                        continue
+            except ImportError:
+                pass
+        # 关闭文件时释放文件锁
+        yield
+
+
+def fund_store_path(data_dir, code):
+    """基金的存储路径，优先使用 parquet，只有旧的 csv 时返回 csv 路径"""
+    store_path = os.path.join(data_dir, f'{code}{STORE_SUFFIX}')
+    csv_path = os.path.join(data_dir, f'{code}.csv')
+    if not os.path.exists(store_path) and os.path.exists(csv_path):
+        return csv_path
+    return store_path
+
+
+def list_fund_codes(data_dir):
+    """data_dir 下所有基金代码（parquet 或 csv）"""
+    codes = set()
+    for file in os.listdir(data_dir):
+        name, ext = os.path.splitext(file)
+        if ext in (STORE_SUFFIX, '.csv'):
+            codes.add(name)
+    return sorted(codes)
+
+
+def load_fund_frame(path, columns=None):
+    """
+    读取基金数据
+    columns：只读取这些列（列投影），None 表示全部列
+    """
+    path = str(path)
+    if path.endswith('.csv'):
+        if columns is None:
+            df = pd.read_csv(path)
+            # 旧文件保存了pandas索引
+            df = df.drop(columns=[c for c in df.columns if c.startswith('Unnamed:')])
+        else:
+            df = pd.read_csv(path, usecols=list(columns))[list(columns)]
+        if '净值日期' in df.columns:
+            df['净值日期'] = pd.to_datetime(df['净值日期'])
+        return df
+    return pd.read_parquet(path, columns=None if columns is None else list(columns))
+
+
+def save_fund_frame(df, path, compression=DEFAULT_COMPRESSION):
+    """按扩展名保存为 parquet 或 csv（都不保存索引），先写临时文件再替换，避免读到写了一半的文件"""
+    path = str(path)
+    # 临时文件名带上线程号，同一进程的多个线程（如网页会话和同步任务）写同一只基金时不会互相覆盖
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    if path.endswith('.csv'):
+        df.to_csv(tmp_path, index=False)
+    else:
+        df.to_parquet(tmp_path, index=False, compression=compression)
+    os.replace(tmp_path, path)
+    return path
+
+
+def import_csv(csv_path, store_path=None, compression=DEFAULT_COMPRESSION):
+    """把 csv 转成 parquet，默认保存在同目录下"""
+    if store_path is None:
+        store_path = os.path.splitext(csv_path)[0] + STORE_SUFFIX
+    return save_fund_frame(load_fund_frame(csv_path), store_path, compression)
+
+
+def export_csv(store_path, csv_path=None):
+    """把 parquet 导出为 csv（不带索引列）"""
+    if csv_path is None:
+        csv_path = os.path.splitext(store_path)[0] + '.csv'
+    return save_fund_frame(load_fund_frame(store_path), csv_path)
+
+
+def migrate_csv_dir(data_dir, remove_csv=False):
+    """把目录下还没有 parquet 的 csv 全部转换，返回转换的基金代码"""
+    migrated = []
+    for code in list_fund_codes(data_dir):
+        csv_path = os.path.join(data_dir, f'{code}.csv')
+        if os.path.exists(csv_path) and not os.path.exists(os.path.join(data_dir, f'{code}{STORE_SUFFIX}')):
+            import_csv(csv_path)
+            if remove_csv:
+                os.remove(csv_path)
+            migrated.append(code)
+    return migrated
+
+
+if __name__ == '__main__':
+    print(migrate_csv_dir(r"F:\PyCharm_Project\FundStock_Prediction_Website\Data\Funds"))
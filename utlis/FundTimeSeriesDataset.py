@@ -1,63 +1,362 @@
 from utlis.FundDataProcessor import FundDataProcessor
+from utlis.FundStore import load_fund_frame
+from utlis.FeatureRegistry import FEATURE_COLUMNS, RAW_COLUMNS, ensure_features
+import json
+import os
 import pandas as pd
 import torch
-from torch.utils.data import Dataset, DataLoader
+from torch.utils.data import Dataset, DataLoader, default_collate
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from sklearn.preprocessing import StandardScaler
+
+# 不做标准化的分类变量
+CATEGORICAL_COLUMNS = ['申购状态', '赎回状态', '分红送配', 'trading_status', 'abnormal_move']
+
+
 class FundTimeSeriesDataset(Dataset):
-    def __init__(self, features, targets, scale_factors=None):
-        self.features = features  # [num_samples, context_length, num_features]
-        self.targets = targets  # [num_samples, prediction_length]
+    """
+    两种模式：
+    1. features [num_samples, context_length, num_features]、targets [num_samples, prediction_length] 为已经切好的窗口
+    2. 指定 context_length 时，features [T, num_features]、targets [T] 为整段序列（可以是只读的 np.memmap），
+       window_starts 为每个样本窗口的起始行；样本是 sliding_window_view 的视图，取样本时只复制这一个窗口
+    __getitems__ 一次取出一个批次（DataLoader 使用 batch_collate 时不再逐个样本取出再拼接）
+    """
+    def __init__(self, features, targets, scale_factors=None, context_length=None, prediction_length=None,
+                 window_starts=None):
+        self.features = features
+        self.targets = targets
         self.scale_factors = scale_factors
+        self.context_length = context_length
+        self.prediction_length = prediction_length
+        self.window_starts = window_starts
+        if context_length is not None:
+            # [T - context_length + 1, num_features, context_length] 和 [T - prediction_length + 1, prediction_length]
+            self.feature_windows = sliding_window_view(features, context_length, axis=0)
+            self.target_windows = sliding_window_view(targets, prediction_length)
 
     def __len__(self):
+        if self.context_length is not None:
+            return len(self.window_starts)
         return len(self.features)
 
     def __getitem__(self, idx):
-        sample = {
-            'past_values': self.features[idx],
-            'future_values': self.targets[idx],
-        }
+        if self.context_length is not None:
+            start = self.window_starts[idx]
+            # memmap 是只读的，这里只复制一个窗口
+            sample = {
+                'past_values': torch.from_numpy(np.array(self.feature_windows[start].T, dtype=np.float32)),
+                'future_values': torch.from_numpy(
+                    np.array(self.target_windows[start + self.context_length], dtype=np.float32)),
+            }
+        else:
+            sample = {
+                'past_values': self.features[idx],
+                'future_values': self.targets[idx],
+            }
 
         if self.scale_factors is not None:
             sample['scale_factor'] = torch.FloatTensor([self.scale_factors[idx]])
 
         return sample
 
+    def __getitems__(self, indices):
+        """
+        一个批次的样本，返回已经按批次拼好的 dict（past_values [B, ...]、future_values [B, ...]）
+        窗口模式按起始行一次 gather 出 [B, context_length, 特征数]；切好的窗口模式下连续的下标直接切片
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        if self.context_length is not None:
+            starts = np.asarray(self.window_starts)[indices]
+            rows = starts[:, None] + np.arange(self.context_length)
+            target_rows = (starts + self.context_length)[:, None] + np.arange(self.prediction_length)
+            batch = {
+                'past_values': torch.from_numpy(np.asarray(self.features[rows], dtype=np.float32)),
+                'future_values': torch.from_numpy(np.asarray(self.targets[target_rows], dtype=np.float32)),
+            }
+        else:
+            if len(indices) and indices[-1] - indices[0] + 1 == len(indices) and np.all(np.diff(indices) == 1):
+                index = slice(int(indices[0]), int(indices[-1]) + 1)
+            else:
+                index = torch.from_numpy(indices) if torch.is_tensor(self.features) else indices
+            batch = {
+                'past_values': torch.as_tensor(self.features[index]),
+                'future_values': torch.as_tensor(self.targets[index]),
+            }
 
-def create_fund_dataloaders(training_data, batch_size=32):
-    """创建基金数据加载器"""
-    train_dataset = FundTimeSeriesDataset(
-        training_data['X_train'],
-        training_data['y_train']
-    )
+        if self.scale_factors is not None:
+            batch['scale_factor'] = torch.as_tensor(np.asarray(self.scale_factors)[indices],
+                                                    dtype=torch.float32).unsqueeze(1)
 
-    test_dataset = FundTimeSeriesDataset(
-        training_data['X_test'],
-        training_data['y_test']
-    )
+        return batch
+
+    @classmethod
+    def from_memmap(cls, manifest_path, context_length=60, prediction_length=10, window_starts=None):
+        """以只读 memmap 打开 export_fund_memmap 导出的数据，window_starts 默认为全部有效窗口"""
+        features, targets, manifest = open_fund_memmap(manifest_path)
+        if window_starts is None:
+            window_starts = valid_window_starts(features, targets, context_length, prediction_length)
+        return cls(features, targets, context_length=context_length, prediction_length=prediction_length,
+                   window_starts=window_starts)
+
+
+def batch_collate(batch):
+    """__getitems__ 返回的已经是一个批次，直接使用；逐个样本的列表按默认方式拼接"""
+    if isinstance(batch, dict):
+        return batch
+    return default_collate(batch)
+
+
+def create_window_loader(dataset, batch_size=32, shuffle=False, sampler=None, num_workers=0,
+                         persistent_workers=True, prefetch_factor=2, pin_memory=None, drop_last=False):
+    """
+    数据加载器
+    num_workers：加载进程数，大于0时 persistent_workers 让进程在 epoch 之间保留，prefetch_factor 为每个进程预取的批次数
+    pin_memory：默认有GPU时开启（锁页内存，拷贝到GPU更快）
+    """
+    if pin_memory is None:
+        pin_memory = torch.cuda.is_available()
+    options = {}
+    if num_workers > 0:
+        options = {'persistent_workers': persistent_workers, 'prefetch_factor': prefetch_factor}
+    return DataLoader(dataset, batch_size=batch_size, shuffle=shuffle if sampler is None else False, sampler=sampler,
+                      num_workers=num_workers, pin_memory=pin_memory, drop_last=drop_last,
+                      collate_fn=batch_collate, **options)
 
-    train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True)
-    test_loader = DataLoader(test_dataset, batch_size=batch_size, shuffle=False)
+
+def create_fund_dataloaders(training_data, batch_size=32, **loader_options):
+    """创建基金数据加载器（prepare_training_data 返回的窗口数据集），loader_options 见 create_window_loader"""
+    train_loader = create_window_loader(training_data['train_dataset'], batch_size=batch_size, shuffle=True,
+                                        **loader_options)
+    test_loader = create_window_loader(training_data['test_dataset'], batch_size=batch_size, shuffle=False,
+                                       **loader_options)
 
     return train_loader, test_loader
 
+
+def upload_series(datasets, device):
+    """
+    把窗口数据集的整段序列拷贝到 device，多个数据集共用同一份序列（例如同一只基金的训练/测试集）时只拷贝一次；
+    多只基金的序列首尾相接，返回 (features [N, F], targets [N], {id(序列): 在拼接后序列中的起始行})
+    """
+    features, targets, offsets, total = [], [], {}, 0
+    for dataset in datasets:
+        if id(dataset.features) in offsets:
+            continue
+        offsets[id(dataset.features)] = total
+        features.append(torch.as_tensor(np.asarray(dataset.features, dtype=np.float32)))
+        targets.append(torch.as_tensor(np.asarray(dataset.targets, dtype=np.float32)))
+        total += len(dataset.features)
+    return torch.cat(features).to(device), torch.cat(targets).to(device), offsets
+
+
+class DeviceWindowLoader:
+    """
+    序列常驻 device 的批次迭代器（替代 DataLoader）：整段序列在 upload_series 中只拷贝一次，
+    每个批次只在 device 上按起始行的下标张量 gather，没有逐个样本的Python开销和主机到设备的拷贝：
+    特征窗口按行 index_select（连续的行拷贝，比从 unfold 视图 gather 快约一倍），目标窗口从 unfold 视图中取
+    产生的批次与 FundTimeSeriesDataset 相同：{'past_values': [B, context_length, F], 'future_values': [B, prediction_length]}
+    rank / world_size：数据并行时每个全局批次（所有进程的打乱顺序相同）只 gather 第 rank 段，本进程的批次可能为空
+    """
+
+    def __init__(self, datasets, batch_size=32, shuffle=False, drop_last=False, device=None, series=None, seed=0,
+                 rank=0, world_size=1):
+        if isinstance(datasets, FundTimeSeriesDataset):
+            datasets = [datasets]
+        self.context_length = datasets[0].context_length
+        self.prediction_length = datasets[0].prediction_length
+        if any(d.context_length != self.context_length or d.prediction_length != self.prediction_length
+               for d in datasets):
+            raise ValueError("所有数据集的 context_length / prediction_length 必须相同")
+        self.device = torch.device(device) if device is not None else \
+            torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        features, targets, offsets = series if series is not None else upload_series(datasets, self.device)
+        self.features = features
+        # [N - prediction_length + 1, prediction_length]
+        self.target_windows = targets.unfold(0, self.prediction_length, 1)
+        self.context_offsets = torch.arange(self.context_length, device=self.device)
+        self.starts = torch.as_tensor(np.concatenate(
+            [np.asarray(d.window_starts, dtype=np.int64) + offsets[id(d.features)] for d in datasets]),
+            device=self.device)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.seed = seed
+        self.epoch = 0
+        self.rank = rank
+        self.world_size = world_size
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __len__(self):
+        if self.drop_last:
+            return len(self.starts) // self.batch_size
+        return (len(self.starts) + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        starts = self.starts
+        if self.shuffle:
+            generator = torch.Generator(device=self.device).manual_seed(self.seed + self.epoch)
+            starts = starts[torch.randperm(len(starts), generator=generator, device=self.device)]
+            self.epoch += 1
+        for i in range(len(self)):
+            index = starts[i * self.batch_size:(i + 1) * self.batch_size]
+            if self.world_size > 1:
+                count = len(index)
+                index = index[count * self.rank // self.world_size:count * (self.rank + 1) // self.world_size]
+            rows = (index[:, None] + self.context_offsets).reshape(-1)
+            # 数据并行时本进程的批次可能为空，特征维度不能用 -1
+            past_values = self.features.index_select(0, rows).view(len(index), self.context_length,
+                                                                   self.features.shape[1])
+            yield {
+                'past_values': past_values,
+                'future_values': self.target_windows[index + self.context_length],
+            }
+
+
+def create_device_dataloaders(training_data, batch_size=32, device=None, seed=0, rank=0, world_size=1):
+    """prepare_training_data / prepare_flowstate_data 的训练集和测试集共用一份常驻 device 的序列，rank / world_size 见 DeviceWindowLoader"""
+    datasets = [training_data['train_dataset'], training_data['test_dataset']]
+    device = torch.device(device) if device is not None else \
+        torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    series = upload_series(datasets, device)
+    train_loader = DeviceWindowLoader(datasets[0], batch_size, shuffle=True, device=device, series=series, seed=seed,
+                                      rank=rank, world_size=world_size)
+    test_loader = DeviceWindowLoader(datasets[1], batch_size, shuffle=False, device=device, series=series,
+                                     rank=rank, world_size=world_size)
+    return train_loader, test_loader
+
+
+def split_window_starts(window_starts, test_size=0.2):
+    """按时间顺序把窗口起始行划分为训练/测试两段，划分无效时全部作为训练集"""
+    split_idx = int(len(window_starts) * (1 - test_size))
+    if split_idx == 0 or split_idx == len(window_starts):
+        split_idx = len(window_starts)
+    return window_starts[:split_idx], window_starts[split_idx:]
+
+
 def prepare_training_data(df, feature_columns, target_column='单位净值',
                           context_length=60, prediction_length=10, test_size=0.2):
-    """准备训练数据 - 修复版本"""
+    """
+    准备训练数据
+    标准化后的特征 [T, F] 和目标 [T] 只保存一份（float32），样本是其上的滑动窗口视图，按窗口起始行取出；
+    含NaN的窗口由 valid_window_starts 一次向量化过滤，训练/测试按起始行的时间顺序划分
+    """
 
     # 确保有足够的数据
     if len(df) < context_length + prediction_length + 10:
         raise ValueError(
             f"数据量不足。需要至少 {context_length + prediction_length + 10} 行数据，当前只有 {len(df)} 行")
-    scaler = StandardScaler()
     # 选择特征和目标
     features = df[feature_columns].values
     targets = df[target_column].values
 
     # 标准化特征（除了分类变量）
-    numeric_columns = [col for col in feature_columns if col not in
-                       ['申购状态', '赎回状态', '分红送配', 'trading_status', 'abnormal_move']]
+    features_scaled, scaler, _ = scale_features(features.astype(np.float64), feature_columns)
+    features_scaled = features_scaled.astype(np.float32)
+    targets = targets.astype(np.float32)
+
+    window_starts = valid_window_starts(features_scaled, targets, context_length, prediction_length)
+    if not len(window_starts):
+        raise ValueError("无法创建有效的训练序列，请检查数据质量或调整参数")
+
+    print(f"成功创建 {len(window_starts)} 个序列")
+    print(f"每个序列特征形状: {(context_length, features_scaled.shape[1])}")
+    print(f"目标形状: {(prediction_length,)}")
+
+    # 划分训练测试集（按时间顺序）
+    train_starts, test_starts = split_window_starts(window_starts, test_size)
+    # 每个样本的日期为预测开始的那一天
+    dates = pd.to_datetime(df['净值日期']).values
+    dates_train = list(dates[train_starts + context_length])
+    dates_test = list(dates[test_starts + context_length])
+
+    def window_dataset(starts):
+        return FundTimeSeriesDataset(features_scaled, targets, context_length=context_length,
+                                     prediction_length=prediction_length, window_starts=starts)
+
+    return {
+        'features': features_scaled,
+        'targets': targets,
+        'train_starts': train_starts,
+        'test_starts': test_starts,
+        'train_dataset': window_dataset(train_starts),
+        'test_dataset': window_dataset(test_starts),
+        'dates_train': dates_train,
+        'dates_test': dates_test,
+        'feature_names': feature_columns,
+        "scaler":scaler
+    }
+
+
+def prepare_flowstate_data(df, context_length, prediction_length, target_column='单位净值', test_size=0.2):
+    """
+    FlowState 只接受单变量输入：过去值和目标都直接取自同一条 单位净值 序列（只保存一份，不标准化，FlowState 内部会归一化），
+    样本为 past_values [context_length, 1]、future_values [prediction_length]，批次为 [B, context_length, 1] / [B, prediction_length]
+    """
+    if len(df) < context_length + prediction_length + 10:
+        raise ValueError(
+            f"数据量不足。需要至少 {context_length + prediction_length + 10} 行数据，当前只有 {len(df)} 行")
+    series = np.ascontiguousarray(df[target_column].values, dtype=np.float32)
+    # [T, 1] 是同一块内存的视图
+    features = series.reshape(-1, 1)
+    window_starts = valid_window_starts(features, series, context_length, prediction_length)
+    if not len(window_starts):
+        raise ValueError("无法创建有效的训练序列，请检查数据质量或调整参数")
+    train_starts, test_starts = split_window_starts(window_starts, test_size)
+    dates = pd.to_datetime(df['净值日期']).values
+
+    def window_dataset(starts):
+        return FundTimeSeriesDataset(features, series, context_length=context_length,
+                                     prediction_length=prediction_length, window_starts=starts)
+
+    return {
+        'features': features,
+        'targets': series,
+        'train_starts': train_starts,
+        'test_starts': test_starts,
+        'train_dataset': window_dataset(train_starts),
+        'test_dataset': window_dataset(test_starts),
+        'dates_train': list(dates[train_starts + context_length]),
+        'dates_test': list(dates[test_starts + context_length]),
+        'feature_names': [target_column],
+        'scaler': None,
+    }
+
+
+def process_fund_data_for_flowstate(data_path, config, batch_size=32, test_size=0.2, target_column='单位净值',
+                                    device=None, seed=0, rank=0, world_size=1, **loader_options):
+    """
+    FlowState 的训练数据：窗口长度取自 FlowStateConfig 的 context_length / prediction_length，
+    只读取 净值日期 和 单位净值 两列，返回与 process_fund_data_for_training 相同结构的 dict
+    device：给定时序列常驻该设备，批次在设备上组装（create_device_dataloaders），否则使用 DataLoader
+    seed：常驻设备时训练集打乱顺序的随机种子（每个 epoch 为 seed + epoch）
+    rank / world_size：数据并行时本进程只取每个批次的第 rank 段（需要 device）
+    """
+    if isinstance(data_path, str):
+        df = load_fund_frame(data_path, columns=['净值日期', target_column])
+    else:
+        df = data_path
+    training_data = prepare_flowstate_data(df, config.context_length, config.prediction_length,
+                                           target_column=target_column, test_size=test_size)
+    if device is not None:
+        train_loader, test_loader = create_device_dataloaders(training_data, batch_size=batch_size, device=device,
+                                                              seed=seed, rank=rank, world_size=world_size)
+    else:
+        train_loader, test_loader = create_fund_dataloaders(training_data, batch_size=batch_size, **loader_options)
+    return {
+        'train_loader': train_loader,
+        'test_loader': test_loader,
+        'training_data': training_data,
+        'feature_names': training_data['feature_names'],
+    }
+
+
+def scale_features(features, feature_columns):
+    """标准化数值特征（分类变量不变），返回 (标准化后的特征, scaler, 数值列下标)"""
+    scaler = StandardScaler()
+    numeric_columns = [col for col in feature_columns if col not in CATEGORICAL_COLUMNS]
     numeric_indices = [feature_columns.index(col) for col in numeric_columns if col in feature_columns]
 
     if numeric_indices:
@@ -65,86 +364,119 @@ def prepare_training_data(df, feature_columns, target_column='单位净值',
         features_scaled[:, numeric_indices] = scaler.fit_transform(features[:, numeric_indices])
     else:
         features_scaled = features
+    return features_scaled, scaler, numeric_indices
 
-    # 创建序列数据 - 更安全的索引方式
-    sequences, sequence_targets = [], []
-    valid_dates = []
-
-    total_length = len(features_scaled)
-
-    for i in range(context_length, total_length - prediction_length):
-        # 检查索引有效性
-        if i - context_length < 0 or i + prediction_length > total_length:
-            continue
 
-        seq_features = features_scaled[i - context_length:i]
-        seq_target = targets[i:i + prediction_length]
+def valid_window_starts(features, targets, context_length, prediction_length):
+    """
+    所有不含NaN的窗口起始行（与 prepare_training_data 的窗口范围一致），一次向量化计算：
+    用NaN行数的前缀和判断 [start, start+context_length) 的特征和之后 prediction_length 个目标是否有NaN
+    """
+    total_length = len(features)
+    feature_nan = np.concatenate([[0], np.cumsum(np.isnan(features).any(axis=1))])
+    target_nan = np.concatenate([[0], np.cumsum(np.isnan(targets))])
+    starts = np.arange(0, max(total_length - prediction_length - context_length, 0))
+    ends = starts + context_length
+    valid = (feature_nan[ends] == feature_nan[starts]) & \
+            (target_nan[ends + prediction_length] == target_nan[ends])
+    return starts[valid]
 
-        # 检查是否有NaN值
-        if np.any(np.isnan(seq_features)) or np.any(np.isnan(seq_target)):
-            continue
 
-        sequences.append(seq_features)
-        sequence_targets.append(seq_target)
-        valid_dates.append(df['净值日期'].iloc[i])
+def export_fund_memmap(data_path_or_df, output_dir, code, feature_columns=FEATURE_COLUMNS, target_column='单位净值'):
+    """
+    导出一只基金标准化后的 float32 特征矩阵和目标向量为 .npy（可用 memmap 打开），
+    以及 <code>_manifest.json（形状、类型、日期范围、scaler参数），返回 manifest 路径
+    """
+    if isinstance(data_path_or_df, str):
+        df = load_fund_frame(data_path_or_df, columns=['净值日期'] + list(feature_columns))
+    else:
+        df = data_path_or_df
+    features_scaled, scaler, numeric_indices = scale_features(df[feature_columns].values.astype(np.float64),
+                                                              list(feature_columns))
+    os.makedirs(output_dir, exist_ok=True)
+    files = {
+        'features_file': f'{code}_features.npy',
+        'targets_file': f'{code}_targets.npy',
+        'dates_file': f'{code}_dates.npy',
+    }
+    features_mm = np.lib.format.open_memmap(os.path.join(output_dir, files['features_file']), mode='w+',
+                                            dtype=np.float32, shape=features_scaled.shape)
+    features_mm[:] = features_scaled
+    features_mm.flush()
+    np.save(os.path.join(output_dir, files['targets_file']), df[target_column].values.astype(np.float32))
+    dates = pd.to_datetime(df['净值日期']).values.astype('datetime64[D]')
+    np.save(os.path.join(output_dir, files['dates_file']), dates)
 
-    if not sequences:
-        raise ValueError("无法创建有效的训练序列，请检查数据质量或调整参数")
+    manifest = {
+        'code': code,
+        **files,
+        'shape': list(features_scaled.shape),
+        'dtype': 'float32',
+        'feature_names': list(feature_columns),
+        'target_column': target_column,
+        'first_date': str(dates[0]) if len(dates) else None,
+        'last_date': str(dates[-1]) if len(dates) else None,
+        'scaler': {
+            'columns': [feature_columns[i] for i in numeric_indices],
+            'mean': scaler.mean_.tolist() if numeric_indices else [],
+            'scale': scaler.scale_.tolist() if numeric_indices else [],
+        },
+    }
+    manifest_path = os.path.join(output_dir, f'{code}_manifest.json')
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest_path
 
-    sequences = np.array(sequences)
-    sequence_targets = np.array(sequence_targets)
 
-    print(f"成功创建 {len(sequences)} 个序列")
-    print(f"每个序列特征形状: {sequences[0].shape}")
-    print(f"目标形状: {sequence_targets[0].shape}")
+def open_fund_memmap(manifest_path):
+    """只读打开导出的数据，返回 (features memmap [T, F], targets memmap [T], manifest)"""
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    base_dir = os.path.dirname(manifest_path)
+    features = np.load(os.path.join(base_dir, manifest['features_file']), mmap_mode='r')
+    targets = np.load(os.path.join(base_dir, manifest['targets_file']), mmap_mode='r')
+    return features, targets, manifest
 
-    # 划分训练测试集（按时间顺序）
-    split_idx = int(len(sequences) * (1 - test_size))
 
-    if split_idx == 0 or split_idx == len(sequences):
-        # raise ValueError("训练/测试划分无效，请调整test_size参数")
-        X_train, X_test = sequences,[]
-        y_train, y_test = sequence_targets,[]
-        dates_train, dates_test = valid_dates, []
-    else:
-        X_train, X_test = sequences[:split_idx], sequences[split_idx:]
-        y_train, y_test = sequence_targets[:split_idx], sequence_targets[split_idx:]
-        dates_train, dates_test = valid_dates[:split_idx], valid_dates[split_idx:]
+def create_memmap_dataloaders(manifest_path, context_length=60, prediction_length=10, test_size=0.2,
+                              batch_size=32, **loader_options):
+    """从导出的 memmap 创建训练/测试数据加载器，按时间顺序划分窗口，loader_options 见 create_window_loader"""
+    features, targets, manifest = open_fund_memmap(manifest_path)
+    window_starts = valid_window_starts(features, targets, context_length, prediction_length)
+    train_starts, test_starts = split_window_starts(window_starts, test_size)
+    train_dataset = FundTimeSeriesDataset(features, targets, context_length=context_length,
+                                          prediction_length=prediction_length, window_starts=train_starts)
+    test_dataset = FundTimeSeriesDataset(features, targets, context_length=context_length,
+                                         prediction_length=prediction_length, window_starts=test_starts)
+    train_loader = create_window_loader(train_dataset, batch_size=batch_size, shuffle=True, **loader_options)
+    test_loader = create_window_loader(test_dataset, batch_size=batch_size, shuffle=False, **loader_options)
+    return train_loader, test_loader
 
-    # print(f"训练集大小: {X_train.shape}")
-    # print(f"测试集大小: {X_test.shape}")
-    # print(f"预测长度: {prediction_length}")
 
-    return {
-        'X_train': torch.FloatTensor(X_train),
-        'X_test': torch.FloatTensor(X_test),
-        'y_train': torch.FloatTensor(y_train),
-        'y_test': torch.FloatTensor(y_test),
-        'dates_train': dates_train,
-        'dates_test': dates_test,
-        'feature_names': feature_columns,
-        "scaler":scaler
-    }
-def process_fund_data_for_training(data_path, context_length=60, prediction_length=10):
-    """完整的基金数据处理流程"""
+def process_fund_data_for_training(data_path, context_length=60, prediction_length=10, feature_columns=None,
+                                   feature_cache=None):
+    """
+    完整的基金数据处理流程
+    feature_columns：训练使用的特征列，默认 FEATURE_COLUMNS；数据中没有的特征列从原始列计算
+    feature_cache：FeatureCache，给定时从原始列经特征缓存得到特征（只在原始数据或特征定义变化时重新计算）
+    """
 
     # # 1. 初始化处理器
     # processor = FundDataProcessor(data_path,save_path=save_path)
     #
     # # 2. 加载和清洗数据
     # df_with_features,feature_columns = processor.all_process()
-    if data_path.endswith('.csv'):
-        df_with_features = pd.read_csv(data_path)
+    feature_columns = list(feature_columns or FEATURE_COLUMNS)
+    if feature_cache is not None and isinstance(data_path, str):
+        processor = FundDataProcessor(load_fund_frame(data_path, columns=RAW_COLUMNS), None,
+                                      feature_cache=feature_cache,
+                                      code=os.path.splitext(os.path.basename(data_path))[0])
+        df_with_features, _ = processor.cached_process(columns=['净值日期'] + feature_columns)
+    elif isinstance(data_path, str):
+        # 只读取训练需要的列
+        df_with_features = load_fund_frame(data_path, columns=['净值日期'] + feature_columns)
     else:
-        df_with_features = data_path
-    feature_columns = [
-        '单位净值', '累计净值', '日增长率', '申购状态', '赎回状态', '分红送配',
-        'MA_5','MA_10', 'MA_20', 'MA_30', 'Volatility_5', 'Volatility_20', 'Momentum_5', 'Momentum_10',
-        'RSI_14', 'BB_Middle', 'BB_Upper', 'BB_Lower', 'BB_Position',
-        'Price_Rank_20', 'trading_status', 'abnormal_move',
-        'return_1d', 'return_5d', 'return_20d', 'volatility_5d', 'volatility_20d',
-        'max_drawdown_20',"day_sin","day_cos","month_sin","month_cos"
-    ]
+        df_with_features = ensure_features(data_path, feature_columns)
     # 4. 准备训练数据
     training_data = prepare_training_data(
         df_with_features,
@@ -164,5 +496,5 @@ def process_fund_data_for_training(data_path, context_length=60, prediction_leng
     }
 if __name__ == '__main__':
     data_processor = process_fund_data_for_training(
-        r"F:\PyCharm_Project\FundStock_Prediction_Website\Data\Funds\050026.csv")
+        r"F:\PyCharm_Project\FundStock_Prediction_Website\Data\Funds\050026.parquet")
     print(data_processor['training_data']['scaler'])
\ No newline at end of file
@@ -5,52 +5,56 @@ import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 # 或者直接添加当前目录的父目录
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-def Get_Lately_Data(data_path,Lately_time=None,start_date=None,end_date=None):
-    if str(data_path).endswith('.csv'):
-        df_origin = pd.read_csv(data_path)
+from utlis.FundStore import load_fund_frame
+from utlis.MultiFundStore import MultiFundStore
+
+# 最近时间对应的月数，成立以来为None
+LATELY_MONTHS = {
+    '成立以来': None,
+    "近1个月": 1,
+    "近3个月": 3,
+    "近6个月": 6,
+    "近1年": 12,
+    "近3年": 36,
+    "近5年": 60,
+    "近10年": 120,
+}
+
+
+def lately_start_date(last_date, Lately_time):
+    """最近时间的开始日期（相对最后一个净值日期），成立以来返回None"""
+    if Lately_time not in LATELY_MONTHS:
+        raise ValueError("没有这个值")
+    months = LATELY_MONTHS[Lately_time]
+    if months is None:
+        return None
+    return last_date - pd.DateOffset(months=months)
+
+
+def Get_Lately_Data(data_path,Lately_time=None,start_date=None,end_date=None,columns=None,code=None):
+    """
+    data_path：基金数据文件路径（parquet/csv）、DataFrame 或 MultiFundStore
+    columns：从文件/合并存储读取时只读取这些列（净值日期总会读取）
+    code：data_path 为 MultiFundStore 时的基金代码，只读取时间范围内的行
+    """
+    if isinstance(data_path, MultiFundStore):
+        if Lately_time:
+            start_date, end_date = lately_start_date(data_path.date_range(code)[1], Lately_time), None
+        return data_path.read_fund(code, start_date, end_date, columns)
+    if isinstance(data_path, (str, os.PathLike)):
+        if columns is not None and '净值日期' not in columns:
+            columns = ['净值日期'] + list(columns)
+        df_origin = load_fund_frame(data_path, columns=columns)
     else:
         df_origin = data_path
     df_origin['净值日期'] = pd.to_datetime(df_origin['净值日期'])
     if Lately_time:
-        if Lately_time == '成立以来':
+        one_month_ago = lately_start_date(df_origin['净值日期'].max(), Lately_time)
+        if one_month_ago is None:
             df = df_origin.copy()
-        elif Lately_time == "近1个月":
-            last_date = df_origin['净值日期'].max()
-            one_month_ago = last_date - pd.DateOffset(months=1)
-            # 筛选数据
-            df = df_origin[df_origin['净值日期'] >= one_month_ago]
-        elif Lately_time == "近3个月":
-            last_date = df_origin['净值日期'].max()
-            one_month_ago = last_date - pd.DateOffset(months=3)
-            # 筛选数据
-            df = df_origin[df_origin['净值日期'] >= one_month_ago]
-        elif Lately_time == "近6个月":
-            last_date = df_origin['净值日期'].max()
-            one_month_ago = last_date - pd.DateOffset(months=6)
-            # 筛选数据
-            df = df_origin[df_origin['净值日期'] >= one_month_ago]
-        elif Lately_time == "近1年":
-            last_date = df_origin['净值日期'].max()
-            one_month_ago = last_date - pd.DateOffset(months=12)
-            # 筛选数据
-            df = df_origin[df_origin['净值日期'] >= one_month_ago]
-        elif Lately_time == "近3年":
-            last_date = df_origin['净值日期'].max()
-            one_month_ago = last_date - pd.DateOffset(months=36)
-            # 筛选数据
-            df = df_origin[df_origin['净值日期'] >= one_month_ago]
-        elif Lately_time == "近5年":
-            last_date = df_origin['净值日期'].max()
-            one_month_ago = last_date - pd.DateOffset(months=60)
-            # 筛选数据
-            df = df_origin[df_origin['净值日期'] >= one_month_ago]
-        elif Lately_time == "近10年":
-            last_date = df_origin['净值日期'].max()
-            one_month_ago = last_date - pd.DateOffset(months=120)
+        else:
             # 筛选数据
             df = df_origin[df_origin['净值日期'] >= one_month_ago]
-        else:
-            raise ValueError("没有这个值")
     else:
         # 过滤数据
         mask = (df_origin['净值日期'] >= pd.Timestamp(start_date)) & \
@@ -59,4 +63,4 @@ def Get_Lately_Data(data_path,Lately_time=None,start_date=None,end_date=None):
     return df
 
 if __name__ == '__main__':
-    print(Get_Lately_Data(r"F:\PyCharm_Project\FundStock_Prediction_Website\Data\Funds\050026.csv", '近1年'))
\ No newline at end of file
+    print(Get_Lately_Data(r"F:\PyCharm_Project\FundStock_Prediction_Website\Data\Funds\050026.parquet", '近1年'))
@@ -1,5 +1,6 @@
 import os
 import efinance as ef
+from utlis.FundStore import list_fund_codes
 
 def get_fund_name_ef(fund_code):
     """使用efinance获取基金名称"""
@@ -11,9 +12,7 @@ def get_fund_name_ef(fund_code):
 def get_fund_code_name():
     base_path = r"F:\PyCharm_Project\FundStock_Prediction_Website\Data\Funds"
     fund_code_name_list = []
-    file_list = [f for f in os.listdir(base_path) if f.endswith('.csv')]
-    for file in file_list:
-        fund_code = file.split('.')[0]
+    for fund_code in list_fund_codes(base_path):
         fund_name = get_fund_name_ef(fund_code)
         fund_code_name_list.append(fund_name + f"(代码:{fund_code})")
     return fund_code_name_list
@@ -0,0 +1,217 @@
+"""
+多基金窗口数据集
+一个模型在整个基金池上训练时，不再把每只基金的窗口张量拼接在内存里：
+- 全局索引只保存每只基金的有效窗口起始行（int32）和累计窗口数，第 i 个样本用二分查找定位到 (基金, 起始行)，
+  内存与原始序列的长度成正比，与窗口数无关
+- 序列按需从基金存储（MultiFundStore 或每只基金一个文件的目录）只读取需要的列并标准化，最近使用的 max_cached_funds 只基金保存在内存中；
+  建立索引时不读取序列：标准化不改变NaN的位置，parquet 文件按每列的 null_count 统计只读取可能有NaN的列，没有NaN时只读文件尾
+- __getitems__ 按基金分组一次取出整个批次（与 FundTimeSeriesDataset 相同，配合 create_window_loader 使用）
+- FundBalancedSampler 按历史长度平衡各基金被抽到的概率，避免历史长的基金占满每个 epoch
+"""
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import torch
+from torch.utils.data import Dataset, Sampler
+from utlis.FundStore import fund_store_path, list_fund_codes, load_fund_frame
+from utlis.FeatureRegistry import FEATURE_COLUMNS, RAW_COLUMNS, ensure_features
+from utlis.FundTimeSeriesDataset import scale_features, split_window_starts, valid_window_starts
+
+
+def _columns_with_nulls(metadata, columns):
+    """parquet 文件尾的统计中可能有null的列（没有统计的列也算）"""
+    names = metadata.schema.names
+    result = []
+    for column in columns:
+        i = names.index(column)
+        for group in range(metadata.num_row_groups):
+            statistics = metadata.row_group(group).column(i).statistics
+            if statistics is None or not statistics.has_null_count or statistics.null_count:
+                result.append(column)
+                break
+    return result
+
+
+class MultiFundWindowDataset(Dataset):
+    """
+    store：MultiFundStore，或每只基金一个 parquet/csv 文件的目录
+    codes：基金代码列表，None 表示存储中的全部基金
+    split：'train' / 'test' 只使用每只基金按时间顺序划分的前/后一段窗口，None 使用全部窗口
+    样本为 {'past_values': [context_length, 特征数], 'future_values': [prediction_length], 'fund_index': 基金序号}
+    """
+
+    def __init__(self, store, codes=None, context_length=60, prediction_length=10, feature_columns=None,
+                 target_column='单位净值', split=None, test_size=0.2, max_cached_funds=64):
+        if split not in (None, 'train', 'test'):
+            raise ValueError(f"未知的 split: {split}")
+        self.store = store
+        self.context_length = context_length
+        self.prediction_length = prediction_length
+        self.feature_columns = list(feature_columns or FEATURE_COLUMNS)
+        self.target_column = target_column
+        self.max_cached_funds = max_cached_funds
+        self._cache = OrderedDict()
+
+        if codes is None:
+            codes = store.codes() if hasattr(store, 'read_fund') else list_fund_codes(store)
+        self.codes, self.window_starts = [], []
+        for code in codes:
+            feature_nan, target_nan = self._nan_rows(code)
+            # valid_window_starts 只看NaN的位置
+            starts = valid_window_starts(np.where(feature_nan, np.nan, 0.0)[:, None],
+                                         np.where(target_nan, np.nan, 0.0), context_length, prediction_length)
+            if split is not None:
+                starts = split_window_starts(starts, test_size)[0 if split == 'train' else 1]
+            if len(starts):
+                self.codes.append(code)
+                self.window_starts.append(starts.astype(np.int32))
+        # offsets[k] 为第 k 只基金之前的窗口总数
+        self.counts = np.array([len(starts) for starts in self.window_starts], dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(self.counts)])
+
+    def _fund_path(self, code):
+        if hasattr(self.store, 'read_fund'):
+            return self.store.fund_path(code)
+        return str(fund_store_path(self.store, code))
+
+    def _stored_columns(self, code):
+        """基金文件中已有的列（parquet 只读文件尾的 schema，csv 只读表头）"""
+        path = self._fund_path(code)
+        if path.endswith('.csv'):
+            return set(pd.read_csv(path, nrows=0).columns)
+        return set(pq.read_schema(path).names)
+
+    def _read_columns(self, code, columns):
+        if hasattr(self.store, 'read_fund'):
+            return self.store.read_fund(code, columns=columns)
+        return load_fund_frame(self._fund_path(code), columns=columns)
+
+    def _read(self, code):
+        columns = ['净值日期'] + list(dict.fromkeys(self.feature_columns + [self.target_column]))
+        stored = self._stored_columns(code)
+        read_columns = [column for column in columns if column in stored]
+        if len(read_columns) < len(columns):
+            # 存储中缺少的特征在这里从原始列补算，需要同时读取原始列
+            read_columns += [column for column in RAW_COLUMNS if column in stored and column not in read_columns]
+        return ensure_features(self._read_columns(code, read_columns), columns)[columns]
+
+    def _nan_rows(self, code):
+        """
+        (每行的特征是否有NaN, 目标是否为NaN)，用于建立窗口索引，不标准化、不保存序列
+        需要补算特征的基金读取并补算后判断；parquet 中 pandas 的NaN保存为null，null_count 为0的列不用读取
+        """
+        columns = list(dict.fromkeys(self.feature_columns + [self.target_column]))
+        if not set(columns) <= self._stored_columns(code):
+            df = self._read(code)
+        else:
+            path = self._fund_path(code)
+            if path.endswith('.csv'):
+                nan_columns = columns
+            else:
+                metadata = pq.read_metadata(path)
+                nan_columns = _columns_with_nulls(metadata, columns)
+                if not nan_columns:
+                    no_nan = np.zeros(metadata.num_rows, dtype=bool)
+                    return no_nan, no_nan
+            df = self._read_columns(code, nan_columns)
+        feature_nan = df[[c for c in self.feature_columns if c in df.columns]].isna().values.any(axis=1)
+        if self.target_column in df.columns:
+            target_nan = df[self.target_column].isna().values
+        else:
+            target_nan = np.zeros(len(df), dtype=bool)
+        return feature_nan, target_nan
+
+    def _load_series(self, code):
+        """读取并标准化一只基金，返回 (features [T, F] float32, targets [T] float32)，最近使用的基金保存在内存中"""
+        if code in self._cache:
+            self._cache.move_to_end(code)
+            return self._cache[code]
+        df = self._read(code)
+        features, _, _ = scale_features(df[self.feature_columns].values.astype(np.float64), self.feature_columns)
+        series = (features.astype(np.float32), df[self.target_column].values.astype(np.float32))
+        self._cache[code] = series
+        while len(self._cache) > self.max_cached_funds:
+            self._cache.popitem(last=False)
+        return series
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def locate(self, idx):
+        """全局样本序号 -> (基金序号, 窗口起始行)"""
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(f"样本序号越界: {idx}")
+        fund = int(np.searchsorted(self.offsets, idx, side='right')) - 1
+        return fund, int(self.window_starts[fund][idx - self.offsets[fund]])
+
+    def __getitems__(self, indices):
+        """一个批次的样本，按基金分组后每只基金一次 gather，结果与逐个 __getitem__ 再默认拼接相同"""
+        indices = np.asarray(indices, dtype=np.int64)
+        indices = np.where(indices < 0, indices + len(self), indices)
+        if len(indices) and (indices.min() < 0 or indices.max() >= len(self)):
+            raise IndexError(f"样本序号越界: {indices}")
+        funds = np.searchsorted(self.offsets, indices, side='right') - 1
+        past = np.empty((len(indices), self.context_length, len(self.feature_columns)), dtype=np.float32)
+        future = np.empty((len(indices), self.prediction_length), dtype=np.float32)
+        for fund in np.unique(funds):
+            selected = np.nonzero(funds == fund)[0]
+            features, targets = self._load_series(self.codes[fund])
+            starts = self.window_starts[fund][indices[selected] - self.offsets[fund]].astype(np.int64)
+            past[selected] = features[starts[:, None] + np.arange(self.context_length)]
+            future[selected] = targets[(starts + self.context_length)[:, None] + np.arange(self.prediction_length)]
+        return {
+            'past_values': torch.from_numpy(past),
+            'future_values': torch.from_numpy(future),
+            'fund_index': torch.from_numpy(funds.astype(np.int64)),
+        }
+
+    def __getitem__(self, idx):
+        fund, start = self.locate(idx)
+        features, targets = self._load_series(self.codes[fund])
+        end = start + self.context_length
+        return {
+            'past_values': torch.from_numpy(features[start:end].copy()),
+            'future_values': torch.from_numpy(targets[end:end + self.prediction_length].copy()),
+            'fund_index': fund,
+        }
+
+
+class FundBalancedSampler(Sampler):
+    """
+    按基金平衡的随机采样：先按权重 count ** alpha 抽基金，再在基金内均匀抽窗口
+    alpha=0 每只基金被抽到的概率相同，alpha=1 等同于对全部窗口均匀抽样，默认 0.5 介于两者之间
+    每个 epoch 抽 num_samples 个（默认为数据集大小），set_epoch 改变随机种子
+    """
+
+    def __init__(self, dataset, alpha=0.5, num_samples=None, seed=0):
+        self.counts = dataset.counts
+        self.offsets = dataset.offsets
+        self.num_samples = int(num_samples or len(dataset))
+        weights = self.counts.astype(np.float64) ** alpha
+        self.probabilities = weights / weights.sum()
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __len__(self):
+        return self.num_samples
+
+    def __iter__(self):
+        rng = np.random.default_rng((self.seed, self.epoch))
+        funds = rng.choice(len(self.counts), size=self.num_samples, p=self.probabilities)
+        local = (rng.random(self.num_samples) * self.counts[funds]).astype(np.int64)
+        return iter((self.offsets[funds] + local).tolist())
+
+
+if __name__ == '__main__':
+    from utlis.FundTimeSeriesDataset import create_window_loader
+    from utlis.MultiFundStore import MultiFundStore
+    store = MultiFundStore(r"F:\PyCharm_Project\FundStock_Prediction_Website\Data\FundStore")
+    dataset = MultiFundWindowDataset(store, split='train')
+    loader = create_window_loader(dataset, batch_size=32, sampler=FundBalancedSampler(dataset))
+    print(len(dataset), next(iter(loader))['past_values'].shape)
@@ -0,0 +1,158 @@
+"""
+多基金合并存储
+所有基金存放在一个目录下，按基金代码分区（<root>/code=<基金代码>/data.parquet），每个文件按日期升序、分成固定行数的 row group；
+<root>/_index.parquet 记录每只基金每个 row group 的起止日期，按 (基金代码, 开始日期, 结束日期, 列) 查询时
+先用索引二分查找出需要的 row group，只读取这些行和需要的列
+多个线程/进程可以同时写入：替换基金文件和更新索引时持有线程锁和 <root>/_index.lock 文件锁，索引在锁内重新读取后再修改
+"""
+import os
+import threading
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from utlis.FundStore import DEFAULT_COMPRESSION, file_lock, list_fund_codes, fund_store_path, load_fund_frame
+
+CODE_COLUMN = '基金代码'
+DATE_COLUMN = '净值日期'
+INDEX_FILE = '_index.parquet'
+LOCK_FILE = '_index.lock'
+
+
+class MultiFundStore:
+    def __init__(self, root, row_group_size=250, compression=DEFAULT_COMPRESSION):
+        self.root = root
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self._index = None
+        self._index_mtime = None
+        self._lock = threading.Lock()
+
+    def fund_path(self, code):
+        return os.path.join(self.root, f'code={code}', 'data.parquet')
+
+    @property
+    def index_path(self):
+        return os.path.join(self.root, INDEX_FILE)
+
+    # ---------------- 索引 ----------------
+    def _load_index(self, reload=False):
+        """
+        读取索引，返回 {基金代码: (每个row group的开始日期, 结束日期, 行数)}；索引文件更新后自动重新读取
+        reload：不使用内存中的索引（写入时在锁内使用，mtime 的精度可能发现不了其它进程刚写入的索引）
+        """
+        if not os.path.exists(self.index_path):
+            self._index, self._index_mtime = {}, None
+            return self._index
+        mtime = os.path.getmtime(self.index_path)
+        if reload or self._index is None or mtime != self._index_mtime:
+            index_df = pd.read_parquet(self.index_path).sort_values([CODE_COLUMN, 'row_group'])
+            self._index = {
+                code: (group['first_date'].values, group['last_date'].values, group['num_rows'].values)
+                for code, group in index_df.groupby(CODE_COLUMN, sort=False)
+            }
+            self._index_mtime = mtime
+        return self._index
+
+    def _save_index(self, index):
+        rows = []
+        for code, (first_dates, last_dates, num_rows) in index.items():
+            for i in range(len(first_dates)):
+                rows.append((code, i, first_dates[i], last_dates[i], num_rows[i]))
+        index_df = pd.DataFrame(rows, columns=[CODE_COLUMN, 'row_group', 'first_date', 'last_date', 'num_rows'])
+        tmp_path = f'{self.index_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        index_df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, self.index_path)
+        self._index, self._index_mtime = index, os.path.getmtime(self.index_path)
+
+    def codes(self):
+        return sorted(self._load_index())
+
+    def date_range(self, code):
+        """基金的 (第一个日期, 最后一个日期)，不在存储中时返回 None"""
+        entry = self._load_index().get(code)
+        if entry is None or not len(entry[0]):
+            return None
+        return pd.Timestamp(entry[0][0]), pd.Timestamp(entry[1][-1])
+
+    # ---------------- 写入 ----------------
+    def write_fund(self, code, df):
+        """写入（覆盖）一只基金的数据，并更新索引"""
+        df = df.drop(columns=[CODE_COLUMN], errors='ignore').sort_values(DATE_COLUMN).reset_index(drop=True)
+        df[DATE_COLUMN] = pd.to_datetime(df[DATE_COLUMN])
+        path = self.fund_path(code)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 临时文件在锁外写好，锁内只做替换和索引的读-改-写，基金文件与索引的更新顺序一致
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_path,
+                       row_group_size=self.row_group_size, compression=self.compression)
+
+        dates = df[DATE_COLUMN].values
+        starts = np.arange(0, len(df), self.row_group_size)
+        ends = np.minimum(starts + self.row_group_size, len(df)) - 1
+        with self._lock, file_lock(os.path.join(self.root, LOCK_FILE)):
+            os.replace(tmp_path, path)
+            index = dict(self._load_index(reload=True))
+            index[code] = (dates[starts], dates[ends], ends - starts + 1)
+            self._save_index(index)
+
+    def import_dir(self, data_dir, codes=None):
+        """把 Data/Funds 下每只基金的文件导入合并存储"""
+        for code in codes or list_fund_codes(data_dir):
+            self.write_fund(code, load_fund_frame(fund_store_path(data_dir, code)))
+
+    # ---------------- 查询 ----------------
+    def read_fund(self, code, start_date=None, end_date=None, columns=None):
+        """读取一只基金 [start_date, end_date] 之间的数据，只读取覆盖该区间的 row group 和需要的列"""
+        entry = self._load_index().get(code)
+        if entry is None:
+            raise KeyError(f"合并存储中没有基金 {code}")
+        first_dates, last_dates, _ = entry
+        start = np.datetime64(pd.Timestamp(start_date)) if start_date is not None else None
+        end = np.datetime64(pd.Timestamp(end_date)) if end_date is not None else None
+        # row group 按日期有序：第一个结束日期 >= start 的组 到 最后一个开始日期 <= end 的组
+        lo = int(np.searchsorted(last_dates, start, side='left')) if start is not None else 0
+        hi = int(np.searchsorted(first_dates, end, side='right')) if end is not None else len(first_dates)
+
+        read_columns = None
+        if columns is not None:
+            read_columns = list(dict.fromkeys([DATE_COLUMN] + [c for c in columns if c != CODE_COLUMN]))
+        if lo >= hi:
+            schema = pq.read_schema(self.fund_path(code))
+            names = read_columns or schema.names
+            return schema.empty_table().select(names).to_pandas()
+        table = pq.ParquetFile(self.fund_path(code)).read_row_groups(list(range(lo, hi)), columns=read_columns)
+        df = table.to_pandas()
+        mask = np.ones(len(df), dtype=bool)
+        if start is not None:
+            mask &= df[DATE_COLUMN].values >= start
+        if end is not None:
+            mask &= df[DATE_COLUMN].values <= end
+        return df[mask].reset_index(drop=True)
+
+    def query(self, codes=None, start_date=None, end_date=None, columns=None):
+        """
+        查询多只基金，返回长表（带 基金代码 列）
+        codes：None 表示全部基金
+        """
+        if codes is None:
+            codes = self.codes()
+        frames = []
+        for code in codes:
+            df = self.read_fund(code, start_date, end_date, columns)
+            df.insert(0, CODE_COLUMN, code)
+            frames.append(df)
+        if not frames:
+            return pd.DataFrame(columns=[CODE_COLUMN, DATE_COLUMN] + list(columns or []))
+        return pd.concat(frames, ignore_index=True)
+
+    def query_panel(self, column, codes=None, start_date=None, end_date=None):
+        """查询一列，返回 日期 x 基金代码 的宽表，用于跨基金比较"""
+        df = self.query(codes, start_date, end_date, columns=[column])
+        return df.pivot(index=DATE_COLUMN, columns=CODE_COLUMN, values=column)
+
+
+if __name__ == '__main__':
+    store = MultiFundStore(r"F:\PyCharm_Project\FundStock_Prediction_Website\Data\FundStore")
+    store.import_dir(r"F:\PyCharm_Project\FundStock_Prediction_Website\Data\Funds")
+    print(store.query(start_date='2024-01-01', columns=['单位净值', 'MA_20']))
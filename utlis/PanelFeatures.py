@@ -0,0 +1,187 @@
+"""
+多基金面板特征计算
+把多只基金堆成对齐的二维数组 [行, 基金]，每个特征列对整个面板做一次数组运算，不再逐只基金循环；
+特征的列、窗口和公式都来自 FeatureRegistry（与单只基金共用一份定义），输出类型与单只基金的结果相同：
+- 每只基金按自己的交易日右对齐（最后一行对齐），滚动窗口按每只基金自己的行数计算，结果与单只基金的 create_fund_features 一致；
+  历史较短的基金在面板顶部用NaN补齐，mask 标记哪些格子是真实数据
+- 滚动均值/标准差/求和把面板按列展平成一条序列，用 PanelWindowIndexer 让窗口不跨基金，一次 rolling 调用算完整个面板
+  （同一套Cython实现，每只基金的第一行重新开始累计，补齐的NaN不会改变结果），
+  依赖行顺序的其它特征（RSI、动量、Price_Rank、max_drawdown 等）使用注册表中声明的面板计算，逐行的特征展平后直接计算
+- 结果按 mask 取回为长表（带 基金代码 列），再按基金写出
+"""
+import os
+import numpy as np
+import pandas as pd
+from pandas.api.indexers import BaseIndexer
+from Scrapy_Data.fund_schema import normalize_fund_frame
+from utlis.FundStore import save_fund_frame
+from utlis.FeatureRegistry import RAW_COLUMNS, compute_features, default_feature_columns, find_feature, \
+    resolve_features, stored_feature_columns
+
+CODE_COLUMN = '基金代码'
+DATE_COLUMN = '净值日期'
+
+
+def build_panel(long_df):
+    """
+    长表（基金代码, 净值日期, 原始列...）转换为面板
+    返回 {'codes': 基金代码数组, 'mask': [行, 基金] bool, 'columns': {列名: [行, 基金]}}
+    每只基金右对齐，面板行数为最长的历史长度
+    """
+    df = normalize_fund_frame(long_df)
+    code_index, codes = pd.factorize(df[CODE_COLUMN].astype(str).values, sort=True)
+    order = np.lexsort((df[DATE_COLUMN].values, code_index))
+    code_index = code_index[order]
+    counts = np.bincount(code_index, minlength=len(codes))
+    length = int(counts.max()) if len(counts) else 0
+    # 每行在自己基金内的序号，右对齐后的面板行号
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    position = np.arange(len(order)) - starts[code_index]
+    rows = position + (length - counts)[code_index]
+
+    mask = np.zeros((length, len(codes)), dtype=bool)
+    mask[rows, code_index] = True
+    columns = {}
+    for column in RAW_COLUMNS:
+        values = df[column].values[order]
+        if column == DATE_COLUMN:
+            panel = np.full((length, len(codes)), np.datetime64('NaT'), dtype='datetime64[ns]')
+        else:
+            panel = np.full((length, len(codes)), np.nan)
+        panel[rows, code_index] = values
+        columns[column] = panel
+    return {'codes': codes, 'mask': mask, 'columns': columns}
+
+
+class PanelWindowIndexer(BaseIndexer):
+    """按列展平后的面板（每 length 行是一只基金）上的定长窗口，窗口开始位置不早于所在基金的第一行"""
+
+    def get_window_bounds(self, num_values=0, min_periods=None, center=None, closed=None, step=None):
+        index = np.arange(num_values, dtype=np.int64)
+        fund_start = index // self.length * self.length
+        start = np.maximum(index - self.window_size + 1, fund_start)
+        return start, index + 1
+
+
+def _rolling(panel, window, how):
+    """对面板的每一列做定长滚动计算（min_periods=window，与单只基金的 rolling 相同）"""
+    flat = pd.Series(panel.T.ravel())
+    indexer = PanelWindowIndexer(window_size=window, length=panel.shape[0])
+    result = getattr(flat.rolling(indexer, min_periods=window), how)().values
+    return result.reshape(panel.shape[1], panel.shape[0]).T
+
+
+def _ffill(panel):
+    return pd.DataFrame(panel, copy=False).ffill().values
+
+
+class PanelContext:
+    """注册表中面板计算函数（FeatureSpec.panel）使用的上下文"""
+
+    def __init__(self, mask):
+        self.mask = mask
+        # 每只基金内的行号，用于窗口不足时的默认值
+        self.position = np.cumsum(mask, axis=0) - 1
+
+    @staticmethod
+    def rolling(panel, window, how):
+        return _rolling(panel, window, how)
+
+
+def _compute_panel_feature(ctx, spec, params, inputs):
+    """按注册表的声明在面板上计算一个特征：panel 函数 > 滚动统计 > 逐行的 compute"""
+    if spec.panel is not None:
+        return spec.panel(ctx, *inputs, **params)
+    if spec.rolling is not None:
+        return ctx.rolling(inputs[0], params['w'], spec.rolling[1])
+    if spec.pointwise:
+        # 逐行计算与行的排列无关，展平后直接用单只基金的计算函数
+        result = spec.compute(*[pd.Series(values.ravel()) for values in inputs], **params)
+        return np.asarray(result).reshape(inputs[0].shape)
+    raise KeyError(f"特征 {spec.pattern} 没有声明面板计算")
+
+
+def compute_panel_features(panel, price_rank_windows=(20,), drawdown_windows=(20,), columns=None):
+    """
+    按 FeatureRegistry 的定义对整个面板计算特征，返回 {列名: [行, 基金]}（原始列 + columns，列顺序与单只基金一致）
+    columns：派生列，默认与 create_fund_features 保存的列相同
+    """
+    if columns is None:
+        columns = stored_feature_columns(price_rank_windows, drawdown_windows)
+    mask = panel['mask']
+    raw = panel['columns']
+    ctx = PanelContext(mask)
+
+    # load_and_clean_data 的前向填充（补齐的顶部没有可填充的值）
+    cache = {column: raw[column] if column == DATE_COLUMN else np.where(mask, _ffill(raw[column]), np.nan)
+             for column in RAW_COLUMNS}
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for name in resolve_features(columns, available=cache):
+            spec, params = find_feature(name)
+            cache[name] = _compute_panel_feature(ctx, spec, params, [cache[c] for c in spec.inputs_for(params)])
+
+    # 每只基金内部的 ffill().bfill()：补齐的顶部先置为NaN，向后填充不会跨基金
+    features = {}
+    for name in RAW_COLUMNS + [c for c in columns if c not in RAW_COLUMNS]:
+        if name == DATE_COLUMN:
+            features[name] = raw[name]
+            continue
+        values = np.where(mask, cache[name], np.nan)
+        features[name] = pd.DataFrame(values, copy=False).ffill().bfill().values
+    return features
+
+
+def feature_dtypes(panel, names):
+    """单只基金的 create_fund_features 输出中各列的类型（用面板中的一行原始数据计算得到）"""
+    sample = normalize_fund_frame(pd.DataFrame({column: panel['columns'][column][-1:, 0] for column in RAW_COLUMNS}))
+    features = compute_features(sample, [name for name in names if name not in RAW_COLUMNS], fill=False)
+    return {**sample.dtypes.to_dict(), **features.dtypes.to_dict()}
+
+
+def panel_to_frame(panel, features):
+    """按 mask 取回真实数据的格子，返回长表（基金代码, 净值日期, 特征...），按基金代码、日期排序"""
+    mask_t = panel['mask'].T
+    dtypes = feature_dtypes(panel, list(features))
+    frame = {CODE_COLUMN: np.repeat(panel['codes'], mask_t.sum(axis=1))}
+    for name, values in features.items():
+        frame[name] = values.T[mask_t].astype(dtypes[name], copy=False)
+    return pd.DataFrame(frame)
+
+
+def feature_columns_for(price_rank_windows=(20,), drawdown_windows=(20,)):
+    """与 create_fund_features 返回的 feature_columns 相同"""
+    return default_feature_columns(price_rank_windows, drawdown_windows)
+
+
+def process_panel(long_df, price_rank_windows=(20,), drawdown_windows=(20,), chunk_size=2000):
+    """
+    多只基金的原始数据（长表，带 基金代码 列）一次计算全部特征，返回 (特征长表, feature_columns)
+    chunk_size：每次放进面板的基金数，限制内存
+    """
+    codes = long_df[CODE_COLUMN].astype(str)
+    unique_codes = codes.unique()
+    frames = []
+    for i in range(0, len(unique_codes), chunk_size):
+        chunk = long_df[codes.isin(unique_codes[i:i + chunk_size])]
+        panel = build_panel(chunk)
+        features = compute_panel_features(panel, price_rank_windows, drawdown_windows)
+        frames.append(panel_to_frame(panel, features))
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=[CODE_COLUMN] + RAW_COLUMNS)
+    return df, feature_columns_for(price_rank_windows, drawdown_windows)
+
+
+def save_panel_features(df, output_dir=None, store=None, suffix='.parquet'):
+    """把特征长表按基金写出：output_dir 下每只基金一个文件，或写入 MultiFundStore"""
+    for code, group in df.groupby(CODE_COLUMN, sort=False):
+        group = group.drop(columns=[CODE_COLUMN]).reset_index(drop=True)
+        if output_dir is not None:
+            save_fund_frame(group, os.path.join(output_dir, f'{code}{suffix}'))
+        if store is not None:
+            store.write_fund(code, group)
+
+
+if __name__ == '__main__':
+    from utlis.MultiFundStore import MultiFundStore
+    store = MultiFundStore(r"F:\PyCharm_Project\FundStock_Prediction_Website\Data\FundStore")
+    df, feature_columns = process_panel(store.query(columns=RAW_COLUMNS))
+    save_panel_features(df, output_dir=r"F:\PyCharm_Project\FundStock_Prediction_Website\Data\Funds")
@@ -0,0 +1,93 @@
+"""
+分位数预测的损失和评估指标
+predictions 直接使用模型输出的 (batch, quantiles, horizon, 1) 或 (batch, quantiles, horizon)，
+targets 为 (batch, horizon) 或 (batch, horizon, 1)；targets 用 reshape 成可广播的视图，不做 squeeze 拷贝，
+所有分位数在一次广播运算中完成，不再逐个分位数循环
+"""
+import torch
+
+
+def _broadcast(predictions, targets, quantiles):
+    """返回 (predictions, 与 predictions 可广播的 targets 视图, 分位数张量 [1, Q, 1(, 1)])"""
+    batch, num_quantiles = predictions.shape[:2]
+    horizon = predictions.shape[2]
+    trailing = (1,) * (predictions.dim() - 3)
+    targets = targets.reshape(batch, 1, horizon, *trailing)
+    if not torch.is_tensor(quantiles):
+        quantiles = torch.tensor(quantiles, dtype=predictions.dtype, device=predictions.device)
+    if len(quantiles) != num_quantiles:
+        raise ValueError(f"分位数个数 {len(quantiles)} 与预测的第1维 {num_quantiles} 不一致")
+    quantiles = quantiles.to(dtype=predictions.dtype, device=predictions.device).view(1, -1, 1, *trailing)
+    return predictions, targets, quantiles
+
+
+def pinball_loss(predictions, targets, quantiles, reduction='mean'):
+    """
+    分位数（pinball）损失，所有分位数一次计算
+    reduction：'mean' 为全部元素的平均（与逐个分位数求平均再平均相同），'none' 返回逐元素损失 [B, Q, H(, 1)]
+    """
+    predictions, targets, quantiles = _broadcast(predictions, targets, quantiles)
+    error = targets - predictions
+    # 等价于 max(q * error, (q - 1) * error)，只需要一次乘法，比 torch.maximum 少两个中间张量
+    loss = error * (quantiles - (error < 0).to(error.dtype))
+    if reduction == 'mean':
+        return loss.mean()
+    if reduction == 'none':
+        return loss
+    raise ValueError(f"未知的 reduction: {reduction}")
+
+
+def weighted_quantile_loss(predictions, targets, quantiles):
+    """加权分位数损失 wQL：2 * 各分位数 pinball 损失之和 / |targets| 之和，再对分位数平均（与量纲无关）"""
+    loss = pinball_loss(predictions, targets, quantiles, reduction='none')
+    per_quantile = 2 * loss.transpose(0, 1).reshape(loss.shape[1], -1).sum(dim=1)
+    return (per_quantile / targets.abs().sum().clamp_min(1e-8)).mean()
+
+
+def crps(predictions, targets, quantiles):
+    """CRPS 的分位数近似：2 * 各分位数 pinball 损失的平均（分位数越密越接近真实的 CRPS）"""
+    return 2 * pinball_loss(predictions, targets, quantiles)
+
+
+def quantile_coverage(predictions, targets, quantiles):
+    """每个分位数的覆盖率：targets 不超过该分位数预测值的比例，校准良好时约等于分位数本身，返回 [Q]"""
+    predictions, targets, _ = _broadcast(predictions, targets, quantiles)
+    below = (targets <= predictions).to(predictions.dtype)
+    return below.transpose(0, 1).reshape(predictions.shape[1], -1).mean(dim=1)
+
+
+def _quantile_index(quantiles, q):
+    # 分位数可能来自 float32 张量，按误差匹配
+    index = min(range(len(quantiles)), key=lambda i: abs(quantiles[i] - q))
+    if abs(quantiles[index] - q) > 1e-6:
+        raise ValueError(f"分位数 {q} 不在 {quantiles} 中")
+    return index
+
+
+def interval_coverage(predictions, targets, quantiles, lower=0.1, upper=0.9):
+    """
+    预测区间 [lower 分位数, upper 分位数] 的覆盖率和平均宽度，返回 (覆盖率, 平均宽度)
+    lower / upper 必须在 quantiles 中
+    """
+    quantiles = [float(q) for q in quantiles]
+    predictions, targets, _ = _broadcast(predictions, targets, quantiles)
+    low = predictions[:, _quantile_index(quantiles, lower)]
+    high = predictions[:, _quantile_index(quantiles, upper)]
+    targets = targets[:, 0]
+    inside = ((targets >= low) & (targets <= high)).to(predictions.dtype)
+    return inside.mean(), (high - low).mean()
+
+
+def evaluate_quantiles(predictions, targets, quantiles, lower=0.1, upper=0.9):
+    """评估用的全部指标，返回 {指标名: float}"""
+    coverage, width = interval_coverage(predictions, targets, quantiles, lower, upper)
+    metrics = {
+        'pinball': pinball_loss(predictions, targets, quantiles).item(),
+        'wql': weighted_quantile_loss(predictions, targets, quantiles).item(),
+        'crps': crps(predictions, targets, quantiles).item(),
+        f'coverage_{lower:g}_{upper:g}': coverage.item(),
+        f'width_{lower:g}_{upper:g}': width.item(),
+    }
+    for q, value in zip(quantiles, quantile_coverage(predictions, targets, quantiles).tolist()):
+        metrics[f'coverage_q{float(q):g}'] = value
+    return metrics
@@ -0,0 +1,107 @@
+"""
+滚动窗口的 O(n) 向量化计算：滚动最小/最大值、价格排名（Price_Rank）和滚动最大回撤（max_drawdown）
+把序列按窗口长度 w 分块，块内做前缀/后缀累计（np.fmin/fmax.accumulate，忽略NaN），
+任意长度为 w 的窗口最多跨两个相邻块，由左块的后缀结果和右块的前缀结果合并得到（van Herk/Gil-Werman），
+效果与单调队列相同，但整列一次计算，与窗口长度无关
+所有函数沿第0维（时间）计算，也可以直接传入 [日期, 基金] 的二维面板
+"""
+import numpy as np
+
+# 窗口不足时的默认值，与原来逐行计算的结果一致
+RANK_FILL = 0.5
+DRAWDOWN_FILL = 0.0
+
+
+def _blocks(values, window):
+    """按窗口长度沿第0维分块，末尾用NaN补齐，返回 [块数, window, ...]"""
+    values = np.asarray(values, dtype=np.float64)
+    n_blocks = -(-len(values) // window)
+    padded = np.full((n_blocks * window,) + values.shape[1:], np.nan)
+    padded[:len(values)] = values
+    return padded.reshape((n_blocks, window) + values.shape[1:])
+
+
+def _flat(blocks):
+    """[块数, window, ...] -> [块数*window, ...]"""
+    return blocks.reshape((-1,) + blocks.shape[2:])
+
+
+def _window_bounds(n, window):
+    """所有完整窗口的 (结束行, 开始行, 开始行是否在块首)"""
+    ends = np.arange(window - 1, n)
+    starts = ends - window + 1
+    return ends, starts, starts % window == 0
+
+
+def _prefix(ufunc, blocks):
+    return _flat(ufunc.accumulate(blocks, axis=1))
+
+
+def _suffix(ufunc, blocks):
+    return _flat(ufunc.accumulate(blocks[:, ::-1], axis=1)[:, ::-1])
+
+
+def rolling_min_max(values, window):
+    """滚动窗口最小值和最大值（忽略NaN），窗口不足的行为NaN"""
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    rolling_min = np.full(values.shape, np.nan)
+    rolling_max = np.full(values.shape, np.nan)
+    if n < window:
+        return rolling_min, rolling_max
+    blocks = _blocks(values, window)
+    ends, starts, _ = _window_bounds(n, window)
+    # 开始行在块首时，后缀就是整块，与前缀在结束行的值相同，合并结果不变
+    rolling_min[ends] = np.fmin(_suffix(np.fmin, blocks)[starts], _prefix(np.fmin, blocks)[ends])
+    rolling_max[ends] = np.fmax(_suffix(np.fmax, blocks)[starts], _prefix(np.fmax, blocks)[ends])
+    return rolling_min, rolling_max
+
+
+def price_rank(values, window=20):
+    """价格在滚动窗口 [min, max] 中的相对位置，窗口不足或 max == min 时为0.5"""
+    values = np.asarray(values, dtype=np.float64)
+    rolling_min, rolling_max = rolling_min_max(values, window)
+    value_range = rolling_max - rolling_min
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rank = (values - rolling_min) / value_range
+    rank = np.where(value_range == 0, RANK_FILL, rank)
+    rank[:window - 1] = RANK_FILL
+    return rank
+
+
+def max_drawdown(values, window=20):
+    """
+    滚动最大回撤：窗口内以运行峰值计算的回撤 (x - peak) / peak 的最小值，窗口不足的行为0
+    即窗口内所有 p <= q 的 x[q] / x[p] 的最小值减1，按块拆成三部分：
+    左块后缀内部、右块前缀内部、以及峰值在左块且谷值在右块（右块前缀最小值 / 左块后缀最大值）
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    drawdown = np.full(values.shape, DRAWDOWN_FILL)
+    if n < window:
+        return drawdown
+    blocks = _blocks(values, window)
+    ends, starts, aligned = _window_bounds(n, window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # 右块前缀：运行峰值下的最低比值
+        prefix_ratio = _flat(np.fmin.accumulate(blocks / np.fmax.accumulate(blocks, axis=1), axis=1))
+        # 左块后缀：对每个起点 p，之后的最小值 / x[p]，再取后缀最小
+        suffix_min = np.fmin.accumulate(blocks[:, ::-1], axis=1)[:, ::-1]
+        suffix_ratio = _suffix(np.fmin, suffix_min / blocks)
+        cross_ratio = _prefix(np.fmin, blocks)[ends] / _suffix(np.fmax, blocks)[starts]
+    # 开始行在块首时窗口就是一整块，没有跨块部分
+    aligned = aligned.reshape((-1,) + (1,) * (values.ndim - 1))
+    cross_ratio = np.where(aligned, np.nan, cross_ratio)
+    ratio = np.fmin(np.fmin(suffix_ratio[starts], prefix_ratio[ends]), cross_ratio)
+    drawdown[ends] = ratio - 1
+    return drawdown
+
+
+def price_ranks(values, windows=(20,)):
+    """多个窗口的价格排名，返回 {'Price_Rank_<w>': 数组}"""
+    return {f'Price_Rank_{window}': price_rank(values, window) for window in windows}
+
+
+def max_drawdowns(values, windows=(20,)):
+    """多个窗口的最大回撤，返回 {'max_drawdown_<w>': 数组}"""
+    return {f'max_drawdown_{window}': max_drawdown(values, window) for window in windows}
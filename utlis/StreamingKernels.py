@@ -0,0 +1,315 @@
+"""
+流式特征计算的状态对象：每个对象保存一个指标在滚动窗口内的状态，来一条新数据只更新一次（均摊 O(1)）
+- RollingMean / RollingSum / RollingStd：与 pandas rolling 相同的 Kahan 补偿求和 / Welford 方差的加入和移出，
+  结果与批量计算逐位一致
+- Lag / Diff：shift 和 diff
+- RollingMinMax：单调队列求窗口最小/最大值，用于 PriceRank
+- RollingDrawdown：两个栈实现的滑动窗口聚合求最大回撤
+- Pointwise：没有状态的逐行计算
+FeatureRegistry 中每个特征用这些对象声明自己的流式计算（见 FeatureSpec.stream_state），
+StreamingFeatures.StreamingFeatureEngine 按注册表组合
+"""
+import math
+from collections import deque
+from utlis.RollingKernels import RANK_FILL, DRAWDOWN_FILL
+
+
+def _is_nan(value):
+    return value != value
+
+
+class RollingMean:
+    """滚动均值（窗口内有NaN或不足 window 个值时为NaN）"""
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.nobs = 0
+        self.neg_ct = 0
+        self.sum_x = 0.0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+        self.consecutive_same = 0
+        self.prev_value = math.nan
+
+    def _add(self, value):
+        if _is_nan(value):
+            return
+        self.nobs += 1
+        y = value - self.compensation_add
+        t = self.sum_x + y
+        self.compensation_add = t - self.sum_x - y
+        self.sum_x = t
+        if math.copysign(1.0, value) < 0:
+            self.neg_ct += 1
+        if value == self.prev_value:
+            self.consecutive_same += 1
+        else:
+            self.consecutive_same = 1
+        self.prev_value = value
+
+    def _remove(self, value):
+        if _is_nan(value):
+            return
+        self.nobs -= 1
+        y = -value - self.compensation_remove
+        t = self.sum_x + y
+        self.compensation_remove = t - self.sum_x - y
+        self.sum_x = t
+        if math.copysign(1.0, value) < 0:
+            self.neg_ct -= 1
+
+    def update(self, value):
+        value = float(value)
+        self.values.append(value)
+        if len(self.values) > self.window:
+            self._remove(self.values.popleft())
+        self._add(value)
+        return self.result()
+
+    def result(self):
+        if self.nobs < self.window:
+            return math.nan
+        if self.consecutive_same >= self.nobs:
+            return self.prev_value
+        result = self.sum_x / self.nobs
+        if self.neg_ct == 0 and result < 0:
+            return 0.0
+        if self.neg_ct == self.nobs and result > 0:
+            return 0.0
+        return result
+
+
+class RollingSum(RollingMean):
+    """滚动求和"""
+
+    def result(self):
+        if self.nobs < self.window:
+            return math.nan
+        if self.consecutive_same >= self.nobs:
+            return self.prev_value * self.nobs
+        return self.sum_x
+
+
+class RollingStd:
+    """滚动标准差（ddof=1），Welford 方差的加入和移出"""
+
+    def __init__(self, window, ddof=1):
+        self.window = window
+        self.ddof = ddof
+        self.values = deque()
+        self.nobs = 0
+        self.mean_x = 0.0
+        self.ssqdm_x = 0.0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+        self.consecutive_same = 0
+        self.prev_value = math.nan
+
+    def _add(self, value):
+        if _is_nan(value):
+            return
+        if value == self.prev_value:
+            self.consecutive_same += 1
+        else:
+            self.consecutive_same = 1
+        self.prev_value = value
+        self.nobs += 1
+        prev_mean = self.mean_x - self.compensation_add
+        y = value - self.compensation_add
+        t = y - self.mean_x
+        self.compensation_add = t + self.mean_x - y
+        self.mean_x = self.mean_x + t / self.nobs
+        self.ssqdm_x = self.ssqdm_x + (value - prev_mean) * (value - self.mean_x)
+
+    def _remove(self, value):
+        if _is_nan(value):
+            return
+        self.nobs -= 1
+        if self.nobs:
+            prev_mean = self.mean_x - self.compensation_remove
+            y = value - self.compensation_remove
+            t = y - self.mean_x
+            self.compensation_remove = t + self.mean_x - y
+            self.mean_x = self.mean_x - t / self.nobs
+            self.ssqdm_x = self.ssqdm_x - (value - prev_mean) * (value - self.mean_x)
+        else:
+            self.mean_x = 0.0
+            self.ssqdm_x = 0.0
+
+    def update(self, value):
+        value = float(value)
+        self.values.append(value)
+        if len(self.values) > self.window:
+            self._remove(self.values.popleft())
+        self._add(value)
+        return self.result()
+
+    def result(self):
+        if self.nobs < self.window or self.nobs <= self.ddof:
+            return math.nan
+        if self.nobs == 1 or self.consecutive_same >= self.nobs:
+            return 0.0
+        variance = self.ssqdm_x / (self.nobs - self.ddof)
+        return math.sqrt(variance) if variance > 0 else 0.0
+
+
+class Lag:
+    """lag 步之前的值（shift），不足时为NaN"""
+
+    def __init__(self, lag):
+        self.values = deque(maxlen=lag + 1)
+
+    def update(self, value):
+        self.values.append(float(value))
+        return self.values[0] if len(self.values) == self.values.maxlen else math.nan
+
+
+class Diff:
+    """与上一个值的差（diff），第一行为NaN"""
+
+    def __init__(self):
+        self.prev = math.nan
+
+    def update(self, value):
+        value = float(value)
+        delta = value - self.prev
+        self.prev = value
+        return delta
+
+
+class RollingMinMax:
+    """单调队列求窗口最小值和最大值（忽略NaN），每次更新均摊O(1)"""
+
+    def __init__(self, window):
+        self.window = window
+        self.count = 0
+        self.min_queue = deque()  # (行号, 值)，值递增
+        self.max_queue = deque()  # (行号, 值)，值递减
+
+    def update(self, value):
+        value = float(value)
+        position = self.count
+        self.count += 1
+        if not _is_nan(value):
+            while self.min_queue and self.min_queue[-1][1] >= value:
+                self.min_queue.pop()
+            self.min_queue.append((position, value))
+            while self.max_queue and self.max_queue[-1][1] <= value:
+                self.max_queue.pop()
+            self.max_queue.append((position, value))
+        oldest = position - self.window + 1
+        while self.min_queue and self.min_queue[0][0] < oldest:
+            self.min_queue.popleft()
+        while self.max_queue and self.max_queue[0][0] < oldest:
+            self.max_queue.popleft()
+        if not self.min_queue:
+            return math.nan, math.nan
+        return self.min_queue[0][1], self.max_queue[0][1]
+
+
+class PriceRank:
+    """价格在滚动窗口中的相对位置，与 RollingKernels.price_rank 一致"""
+
+    def __init__(self, window):
+        self.window = window
+        self.min_max = RollingMinMax(window)
+
+    def update(self, value):
+        min_val, max_val = self.min_max.update(value)
+        if self.min_max.count < self.window:
+            return RANK_FILL
+        value_range = max_val - min_val
+        if value_range == 0:
+            return RANK_FILL
+        if _is_nan(value_range):
+            return math.nan
+        return (float(value) - min_val) / value_range
+
+
+def _fmin(a, b):
+    """忽略NaN的最小值（同 np.fmin）"""
+    if a != a:
+        return b
+    if b != b:
+        return a
+    return a if a <= b else b
+
+
+def _fmax(a, b):
+    if a != a:
+        return b
+    if b != b:
+        return a
+    return a if a >= b else b
+
+
+def _ratio(value, peak):
+    """value / peak，与 numpy 在 errstate(ignore) 下相同：除以0得到 inf 或 NaN"""
+    if peak == 0:
+        return math.nan if value == 0 or value != value else math.copysign(math.inf, value)
+    return value / peak
+
+
+class RollingDrawdown:
+    """
+    窗口内按运行峰值计算的最大回撤，与 RollingKernels.max_drawdown 一致
+    一段序列的摘要为 (最大值, 最小值, 段内最低的 x[q] / x[p]（p <= q）)，两段按先后合并：
+    (fmax(max), fmin(min), fmin(左段比值, 右段比值, 右段最小值 / 左段最大值))，合并满足结合律；
+    用两个栈实现滑动窗口（front 栈保存从栈顶到栈底的后缀摘要，back 栈只保存整体摘要），
+    每个值最多进出各一次，每次更新均摊 O(1)；各个候选比值都是同样的一次除法，结果与批量计算逐位一致
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.count = 0
+        self.front = []  # 后缀摘要，栈顶为窗口中最旧的值
+        self.back = []  # 新加入的值
+        self.back_summary = None
+
+    @staticmethod
+    def _summary(value):
+        return value, value, _ratio(value, value)
+
+    @staticmethod
+    def _combine(older, newer):
+        if older is None:
+            return newer
+        if newer is None:
+            return older
+        cross = _ratio(newer[1], older[0])
+        return _fmax(older[0], newer[0]), _fmin(older[1], newer[1]), _fmin(_fmin(older[2], newer[2]), cross)
+
+    def update(self, value):
+        value = float(value)
+        self.count += 1
+        self.back.append(value)
+        self.back_summary = self._combine(self.back_summary, self._summary(value))
+        if len(self.front) + len(self.back) > self.window:
+            if not self.front:
+                # back 栈整体倒入 front 栈，从最新的值开始累计后缀摘要
+                summary = None
+                while self.back:
+                    summary = self._combine(self._summary(self.back.pop()), summary)
+                    self.front.append(summary)
+                self.back_summary = None
+            self.front.pop()
+        if self.count < self.window:
+            return DRAWDOWN_FILL
+        summary = self._combine(self.front[-1] if self.front else None, self.back_summary)
+        return summary[2] - 1
+
+
+class Pointwise:
+    """没有状态的特征：每行调用 compute(*输入, **参数)"""
+
+    def __init__(self, compute, **params):
+        self.compute = compute
+        self.params = params
+
+    def update(self, *values):
+        return self.compute(*values, **self.params)
+
+
+# 声明了 rolling=(源序列, 统计量, 系数) 的特征默认的流式状态（输入为特征自己的输入列，与非合并的批量计算相同）
+ROLLING_STATES = {'mean': RollingMean, 'sum': RollingSum, 'std': RollingStd}
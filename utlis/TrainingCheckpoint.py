@@ -0,0 +1,166 @@
+"""
+训练的检查点、早停和逐 epoch 指标日志
+<checkpoint_dir>/last.pt   最近一次的完整训练状态：模型、优化器、学习率调度器、epoch、早停状态和随机数状态，用于断点续训
+<checkpoint_dir>/best.pt   验证损失最好的模型参数（早停后恢复到这个模型）
+<checkpoint_dir>/metrics.csv  每个 epoch 一行的训练指标，续训时截掉检查点之后的行，便于比较不同的训练
+检查点先写临时文件再 os.replace，中途中断不会留下损坏的文件
+"""
+import csv
+import os
+import random
+import numpy as np
+import torch
+
+LAST_CHECKPOINT = 'last.pt'
+BEST_CHECKPOINT = 'best.pt'
+METRICS_FILE = 'metrics.csv'
+
+
+def capture_rng_state():
+    """Python / numpy / torch（以及 CUDA）的随机数状态"""
+    state = {
+        'python': random.getstate(),
+        'numpy': np.random.get_state(),
+        'torch': torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def restore_rng_state(state):
+    random.setstate(state['python'])
+    np.random.set_state(state['numpy'])
+    torch.set_rng_state(state['torch'])
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+
+def _atomic_save(obj, path):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    torch.save(obj, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def save_checkpoint(checkpoint_dir, model, optimizer, scheduler, epoch, early_stopping=None, history=None):
+    """epoch 为已经完成的 epoch 数，续训从这个 epoch 开始"""
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    path = os.path.join(checkpoint_dir, LAST_CHECKPOINT)
+    _atomic_save({
+        'epoch': epoch,
+        'model': model.state_dict(),
+        'optimizer': optimizer.state_dict(),
+        'scheduler': scheduler.state_dict() if scheduler is not None else None,
+        'early_stopping': early_stopping.state_dict() if early_stopping is not None else None,
+        'history': history or {},
+        'rng_state': capture_rng_state(),
+    }, path)
+    return path
+
+
+def load_checkpoint(checkpoint_dir, model, optimizer=None, scheduler=None, early_stopping=None, map_location=None):
+    """
+    恢复 last.pt 中的训练状态，返回 (已完成的 epoch 数, history)；没有检查点时返回 (0, {})
+    """
+    path = os.path.join(checkpoint_dir, LAST_CHECKPOINT)
+    if not os.path.exists(path):
+        return 0, {}
+    # 检查点中有 numpy 的随机数状态，不能用 weights_only
+    checkpoint = torch.load(path, map_location=map_location, weights_only=False)
+    model.load_state_dict(checkpoint['model'])
+    if optimizer is not None:
+        optimizer.load_state_dict(checkpoint['optimizer'])
+    if scheduler is not None and checkpoint['scheduler'] is not None:
+        scheduler.load_state_dict(checkpoint['scheduler'])
+    if early_stopping is not None and checkpoint['early_stopping'] is not None:
+        early_stopping.load_state_dict(checkpoint['early_stopping'])
+    restore_rng_state(checkpoint['rng_state'])
+    print(f"从 {path} 恢复训练，已完成 {checkpoint['epoch']} 个 epoch")
+    return checkpoint['epoch'], checkpoint['history']
+
+
+def save_best_model(checkpoint_dir, model, epoch, val_loss):
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    path = os.path.join(checkpoint_dir, BEST_CHECKPOINT)
+    _atomic_save({'epoch': epoch, 'val_loss': val_loss, 'model': model.state_dict()}, path)
+    return path
+
+
+def load_best_model(checkpoint_dir, model, map_location=None):
+    """把 best.pt 的参数载入 model，返回 best.pt 的 epoch 和验证损失；没有时返回 None"""
+    path = os.path.join(checkpoint_dir, BEST_CHECKPOINT)
+    if not os.path.exists(path):
+        return None
+    checkpoint = torch.load(path, map_location=map_location)
+    model.load_state_dict(checkpoint['model'])
+    return checkpoint['epoch'], checkpoint['val_loss']
+
+
+class EarlyStopping:
+    """
+    验证损失连续 patience 个 epoch 没有比最好值低 min_delta 以上时停止
+    patience=None 表示不早停（仍记录最好的 epoch）
+    """
+
+    def __init__(self, patience=10, min_delta=0.0):
+        self.patience = patience
+        self.min_delta = min_delta
+        self.best_loss = float('inf')
+        self.best_epoch = -1
+        self.bad_epochs = 0
+
+    def step(self, val_loss, epoch):
+        """返回本 epoch 是否为新的最好值"""
+        if val_loss < self.best_loss - self.min_delta:
+            self.best_loss = val_loss
+            self.best_epoch = epoch
+            self.bad_epochs = 0
+            return True
+        self.bad_epochs += 1
+        return False
+
+    @property
+    def should_stop(self):
+        return self.patience is not None and self.bad_epochs >= self.patience
+
+    def state_dict(self):
+        return {'best_loss': self.best_loss, 'best_epoch': self.best_epoch, 'bad_epochs': self.bad_epochs}
+
+    def load_state_dict(self, state):
+        self.best_loss = state['best_loss']
+        self.best_epoch = state['best_epoch']
+        self.bad_epochs = state['bad_epochs']
+
+
+class MetricsLogger:
+    """每个 epoch 向 csv 追加一行，列在第一次写入时确定"""
+
+    def __init__(self, path):
+        self.path = path
+        self.fieldnames = None
+
+    def truncate(self, epochs):
+        """只保留前 epochs 个 epoch 的行（续训时丢弃检查点之后、中断前写入的行）"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.DictReader(f)
+            self.fieldnames = reader.fieldnames
+            rows = [row for row in reader if int(row['epoch']) <= epochs]
+        with open(self.path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=self.fieldnames)
+            writer.writeheader()
+            writer.writerows(rows)
+
+    def log(self, row):
+        write_header = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        if self.fieldnames is None:
+            self.fieldnames = list(row)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=self.fieldnames)
+            if write_header:
+                writer.writeheader()
+            writer.writerow(row)
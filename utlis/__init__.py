@@ -1,4 +1,6 @@
 from utlis.FundDataProcessor import FundDataProcessor
 from utlis.FundTimeSeriesDataset import FundTimeSeriesDataset
 from utlis.Get_Lately_Data import Get_Lately_Data
-from utlis.Get_fund_code_name import get_fund_code_name
\ No newline at end of file
+from utlis.Get_fund_code_name import get_fund_code_name
+from utlis.FundStore import load_fund_frame, save_fund_frame, fund_store_path
+from utlis.MultiFundStore import MultiFundStore
\ No newline at end of file